@@ -1,9 +1,12 @@
 import os
 import sys
 import json
+import time
 import asyncio
-from typing import AsyncGenerator, Optional, List
+import hashlib
+from typing import AsyncGenerator, Dict, Optional, List
 from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
@@ -13,8 +16,15 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.agent.multi_agent_system_enhanced import (
     EnhancedMultiAgentSystem,
+    AgentOutput,
+    AgentRole,
     AnalystTeamReport
 )
+from src.agent.llm_limiter import get_limiter_stats
+from src.agent.prompt_budget import TokenUsage
+from src.agent.pipeline import NodeEvent
+from src.config import get_settings
+from src.tools import warm_market_context
 
 app = FastAPI(title="AI Stock Analysis API", version="2.0.0")
 
@@ -27,6 +37,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class RoleModelConfig(BaseModel):
+    """单个角色（或分组）的模型配置，未给出的字段沿用默认值"""
+    model: Optional[str] = None
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+
 class AnalyzeRequest(BaseModel):
     symbol: str
     api_key: Optional[str] = None
@@ -34,6 +50,15 @@ class AnalyzeRequest(BaseModel):
     model: str = "Qwen/Qwen2.5-7B-Instruct"
     debate_threshold: float = 3.0
     max_rounds: int = 2
+    use_cache: bool = True  # 为 False 时本次请求不使用LLM响应缓存和分析师结果缓存
+    stream_tokens: bool = True  # 逐段推送LLM生成的文本（agent_delta 事件）
+    role_models: Optional[Dict[str, RoleModelConfig]] = None  # 角色或分组(analysts/researchers/risk_managers) -> 模型配置
+    structured_output: Optional[bool] = None  # 评分/决策以 JSON 结构化输出（默认取服务端配置）
+
+class RerunRequest(AnalyzeRequest):
+    """基于已有分析师报告重跑第2-4层（report_id 与 analyst_team 二选一）"""
+    report_id: Optional[str] = None
+    analyst_team: Optional[dict] = None  # AnalystTeamReport.to_dict() 格式的内联报告
 
 class CompareRequest(BaseModel):
     """多股对比分析请求"""
@@ -43,6 +68,9 @@ class CompareRequest(BaseModel):
     model: str = "Qwen/Qwen2.5-7B-Instruct"
     debate_threshold: float = 3.0
     max_rounds: int = 1  # 对比分析默认仅1轮辩论，节省时间
+    use_cache: bool = True  # 为 False 时本次请求不使用LLM响应缓存和分析师结果缓存
+    role_models: Optional[Dict[str, RoleModelConfig]] = None  # 同 AnalyzeRequest.role_models
+    structured_output: Optional[bool] = None  # 同 AnalyzeRequest.structured_output
 
 @app.get("/api/health")
 async def health_check():
@@ -52,8 +80,151 @@ async def health_check():
 async def root():
     return {"message": "AI Stock Analysis API", "docs": "/docs"}
 
-async def analysis_generator(request: AnalyzeRequest) -> AsyncGenerator[str, None]:
-    """生成器，流式返回增强版分析进度"""
+@app.get("/api/llm/limits")
+async def llm_limits():
+    """各 API地址+模型 的LLM并发窗口、排队数和等待时间"""
+    return {"limiters": get_limiter_stats()}
+
+def _role_models(request) -> Optional[dict]:
+    """请求中的模型路由表（转为 EnhancedMultiAgentSystem 的 role_models 格式）"""
+    if not request.role_models:
+        return None
+    return {
+        name: {key: value for key, value in vars(config).items() if value is not None}
+        for name, config in request.role_models.items()
+    }
+
+# 各层开始时推送的事件: 层级 -> (名称, 层级消息, 状态步骤, 状态消息)
+PIPELINE_LAYERS = {
+    1: ("Analyst Team", "📊 第1层: 分析师团队并行分析",
+        "fundamentals_analyst", "⚡ 5大分析师正在并行深度研究..."),
+    2: ("Researcher Team", "🗣️ 第2层: 研究员团队辩论",
+        "researcher_debate", "⚔️ 多空研究员正在辩论..."),
+    3: ("Trader", "💼 第3层: 交易员决策",
+        "trader", "🎯 交易员正在制定交易策略..."),
+    4: ("Risk Management + Portfolio Manager", "⚖️ 第4层: 风险评估与最终决策",
+        "risk_assessment", "🛡️ 风险管理团队正在评估..."),
+}
+
+# 各角色所在层级（agent_delta 事件）
+ROLE_LAYERS = {
+    AgentRole.FUNDAMENTALS_ANALYST: 1,
+    AgentRole.SENTIMENT_ANALYST: 1,
+    AgentRole.NEWS_ANALYST: 1,
+    AgentRole.TECHNICAL_ANALYST: 1,
+    AgentRole.QUANT_ANALYST: 1,
+    AgentRole.BULLISH_RESEARCHER: 2,
+    AgentRole.BEARISH_RESEARCHER: 2,
+    AgentRole.TRADER: 3,
+    AgentRole.RISK_MANAGER_AGGRESSIVE: 4,
+    AgentRole.RISK_MANAGER_NEUTRAL: 4,
+    AgentRole.RISK_MANAGER_CONSERVATIVE: 4,
+    AgentRole.PORTFOLIO_MANAGER: 4,
+}
+
+# 输出单个Agent观点的节点（按 agent_output 推送）
+AGENT_OUTPUT_NODES = {
+    AgentRole.FUNDAMENTALS_ANALYST.value,
+    AgentRole.SENTIMENT_ANALYST.value,
+    AgentRole.NEWS_ANALYST.value,
+    AgentRole.TECHNICAL_ANALYST.value,
+    AgentRole.QUANT_ANALYST.value,
+    AgentRole.BULLISH_RESEARCHER.value,
+    AgentRole.BEARISH_RESEARCHER.value,
+    AgentRole.RISK_MANAGER_AGGRESSIVE.value,
+    AgentRole.RISK_MANAGER_NEUTRAL.value,
+    AgentRole.RISK_MANAGER_CONSERVATIVE.value,
+}
+
+
+def _agent_output_message(role: str, layer: int, output: AgentOutput) -> dict:
+    data = {
+        "content": output.content,
+        "timestamp": output.timestamp
+    }
+    if output.score is not None:
+        data["score"] = output.score
+    return {"type": "agent_output", "role": role, "layer": layer, "data": data}
+
+
+def _node_event_messages(event: NodeEvent, started_layers: set) -> List[dict]:
+    """把流水线节点事件转换为前端使用的 NDJSON 事件"""
+    messages = []
+
+    if event.layer not in started_layers:
+        started_layers.add(event.layer)
+        name, layer_message, step, status_message = PIPELINE_LAYERS[event.layer]
+        messages.append({
+            "type": "layer_start",
+            "layer": event.layer,
+            "name": name,
+            "message": layer_message
+        })
+        messages.append({
+            "type": "status",
+            "message": status_message,
+            "step": step,
+            "layer": event.layer
+        })
+
+    if event.type == "node_start":
+        if event.node == AgentRole.PORTFOLIO_MANAGER.value:
+            messages.append({
+                "type": "status",
+                "message": "👔 投资组合经理正在做出最终决策...",
+                "step": "portfolio_manager",
+                "layer": 4
+            })
+        return messages
+
+    messages.append({
+        "type": "node_timing",
+        "node": event.node,
+        "layer": event.layer,
+        "status": "done" if event.type == "node_done" else "error",
+        "elapsed": round(event.elapsed, 3),
+        "cached": event.cached
+    })
+    if event.type != "node_done":
+        return messages
+
+    result = event.result
+    if event.node in AGENT_OUTPUT_NODES:
+        messages.append(_agent_output_message(event.node, event.layer, result))
+    elif event.node == "researcher_debate" and result.debate_occurred:
+        # 辩论后多空观点已更新，覆盖之前推送的初始观点
+        messages.append(_agent_output_message(AgentRole.BULLISH_RESEARCHER.value, 2, result.bullish))
+        messages.append(_agent_output_message(AgentRole.BEARISH_RESEARCHER.value, 2, result.bearish))
+    elif event.node == AgentRole.TRADER.value:
+        messages.append({
+            "type": "agent_output",
+            "role": "trader",
+            "layer": 3,
+            "data": {
+                "content": result.decision.content,
+                "recommendation": result.recommendation,
+                "position": result.suggested_position,
+                "timestamp": result.decision.timestamp
+            }
+        })
+    elif event.node == "risk_assessment":
+        messages.append({
+            "type": "risk_assessment",
+            "data": {
+                "aggressive": result.aggressive.content,
+                "neutral": result.neutral.content,
+                "conservative": result.conservative.content
+            }
+        })
+    return messages
+
+
+async def analysis_generator(
+    request: AnalyzeRequest,
+    analyst_team: Optional[AnalystTeamReport] = None,
+    report_id: Optional[str] = None
+) -> AsyncGenerator[str, None]:
+    """生成器，流式返回增强版分析进度（给出 analyst_team 时只重跑第2-4层）"""
     
     # ─── 立即发送第一个事件，让前端立即知道请求被接受 ─────────────
     # 注意：第一个 yield 必须在任何网络调用之前，否则异步生成器会阻塞
@@ -122,7 +293,11 @@ async def analysis_generator(request: AnalyzeRequest) -> AsyncGenerator[str, Non
             api_key=effective_api_key,
             base_url=effective_base_url,
             debate_threshold=request.debate_threshold,
-            max_debate_rounds=request.max_rounds
+            max_debate_rounds=request.max_rounds,
+            use_llm_cache=request.use_cache,
+            use_analyst_cache=request.use_cache,
+            role_models=_role_models(request),
+            structured_output=request.structured_output
         )
 
         yield json.dumps({
@@ -133,208 +308,104 @@ async def analysis_generator(request: AnalyzeRequest) -> AsyncGenerator[str, Non
             "stock_name": stock_name
         }) + "\n"
         
-        # ========== Layer 1: Analyst Team ==========
-        yield json.dumps({
-            "type": "layer_start",
-            "layer": 1,
-            "name": "Analyst Team",
-            "message": "📊 第1层: 分析师团队并行分析"
-        }) + "\n"
-        
-        yield json.dumps({
-            "type": "status",
-            "message": "⚡ 5大分析师正在并行深度研究...",
-            "step": "fundamentals_analyst",
-            "role": "fundamentals_analyst",
-            "layer": 1
-        }) + "\n"
-
-        async def run_analyst(role_name, func):
-            res = await asyncio.to_thread(func, request.symbol, verbose=False)
-            return role_name, res
-
-        tasks = [
-            run_analyst("fundamentals_analyst", system._run_fundamentals_analyst),
-            run_analyst("sentiment_analyst", system._run_sentiment_analyst),
-            run_analyst("news_analyst", system._run_news_analyst),
-            run_analyst("technical_analyst", system._run_technical_analyst),
-            run_analyst("quant_analyst", system._run_quant_analyst),
-        ]
-
-        results = {}
-        for completed_task in asyncio.as_completed(tasks):
-            role_name, res = await completed_task
-            results[role_name] = res
-            
-            data_dict = {
-                "content": res.content,
-                "timestamp": res.timestamp
-            }
-            if hasattr(res, 'score'):
-                data_dict["score"] = res.score
-                
-            yield json.dumps({
-                "type": "agent_output",
-                "role": role_name,
-                "layer": 1,
-                "data": data_dict
-            }) + "\n"
+        # ─── 分析流水线在事件循环中按依赖关系异步执行，节点事件经队列转为 NDJSON ───
+        events: asyncio.Queue = asyncio.Queue()
+
+        def on_event(event: NodeEvent) -> None:
+            events.put_nowait(event)
+
+        def on_delta(role: AgentRole, text: str) -> None:
+            events.put_nowait({
+                "type": "agent_delta",
+                "role": role.value,
+                "layer": ROLE_LAYERS.get(role, 0),
+                "delta": text
+            })
+
+        usage = TokenUsage()
+
+        def on_llm_event(role: AgentRole, info: dict) -> None:
+            if info["event"] == "token_usage":
+                usage.add(role.value, info)
+                print(
+                    f"[TOKENS] {role.value} {info['model']} prompt={info['prompt_tokens']} "
+                    f"completion={info['completion_tokens']}{' (估算)' if info['estimated'] else ''}"
+                )
+                events.put_nowait({
+                    "type": "token_usage",
+                    "role": role.value,
+                    "layer": ROLE_LAYERS.get(role, 0),
+                    **{key: value for key, value in info.items() if key != "event"}
+                })
+                return
+            if info["event"] == "prompt_trimmed":
+                print(
+                    f"[WARN] {role.value} 提示词约 {info['original_tokens']} tokens 超出预算 {info['budget']}，"
+                    f"已裁剪: {', '.join(info['sections'])}"
+                )
+            # 对冲请求 / 超时 / 改用备用模型 / 提示词裁剪
+            events.put_nowait({
+                "type": "llm_event",
+                "role": role.value,
+                "layer": ROLE_LAYERS.get(role, 0),
+                **info
+            })
+
+        async def run_pipeline():
+            try:
+                return await system.arun_pipeline(
+                    request.symbol, on_event,
+                    analyst_team=analyst_team, report_id=report_id,
+                    on_delta=on_delta if request.stream_tokens else None,
+                    on_llm_event=on_llm_event
+                )
+            finally:
+                events.put_nowait(None)
+
+        pipeline_task = asyncio.create_task(run_pipeline())
+        started_layers = set()
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                if isinstance(event, dict):
+                    # agent_delta / llm_event / token_usage: 直接转发
+                    yield json.dumps(event) + "\n"
+                    continue
+                for message in _node_event_messages(event, started_layers):
+                    yield json.dumps(message) + "\n"
+
+            result = await pipeline_task
+        finally:
+            # 客户端断开时生成器在 yield 处被关闭：取消流水线，不再继续消耗LLM调用
+            if not pipeline_task.done():
+                pipeline_task.cancel()
+                try:
+                    await pipeline_task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        analyst_team = result.analyst_team
+        researcher_debate = result.researcher_debate
+        final_decision = result.final_decision
 
-        fundamentals = results["fundamentals_analyst"]
-        sentiment = results["sentiment_analyst"]
-        news = results["news_analyst"]
-        technical = results["technical_analyst"]
-        quant = results["quant_analyst"]
-        
-        # ========== Layer 2: Researcher Team ==========
-        yield json.dumps({
-            "type": "layer_start",
-            "layer": 2,
-            "name": "Researcher Team",
-            "message": "🗣️ 第2层: 研究员团队辩论"
-        }) + "\n"
-        
-        analyst_team = AnalystTeamReport(
-            fundamentals=fundamentals,
-            sentiment=sentiment,
-            news=news,
-            technical=technical,
-            quant=quant
-        )
-        
-        yield json.dumps({
-            "type": "status",
-            "message": "⚔️ 多空研究员正在辩论...",
-            "step": "researcher_debate",
-            "layer": 2
-        }) + "\n"
-        
-        researcher_debate = await asyncio.to_thread(
-            system._run_researcher_team,
-            request.symbol,
-            analyst_team,
-            verbose=False
-        )
-        
-        yield json.dumps({
-            "type": "agent_output",
-            "role": "bullish_researcher",
-            "layer": 2,
-            "data": {
-                "content": researcher_debate.bullish.content,
-                "score": researcher_debate.bullish.score,
-                "timestamp": researcher_debate.bullish.timestamp
-            }
-        }) + "\n"
-        
-        yield json.dumps({
-            "type": "agent_output",
-            "role": "bearish_researcher",
-            "layer": 2,
-            "data": {
-                "content": researcher_debate.bearish.content,
-                "score": researcher_debate.bearish.score,
-                "timestamp": researcher_debate.bearish.timestamp
-            }
-        }) + "\n"
-        
-        # ========== Layer 3: Trader ==========
-        yield json.dumps({
-            "type": "layer_start",
-            "layer": 3,
-            "name": "Trader",
-            "message": "💼 第3层: 交易员决策"
-        }) + "\n"
-        
-        yield json.dumps({
-            "type": "status",
-            "message": "🎯 交易员正在制定交易策略...",
-            "step": "trader",
-            "layer": 3
-        }) + "\n"
-        
-        trader_decision = await asyncio.to_thread(
-            system._run_trader,
-            request.symbol,
-            analyst_team,
-            researcher_debate,
-            verbose=False
-        )
-        
-        yield json.dumps({
-            "type": "agent_output",
-            "role": "trader",
-            "layer": 3,
-            "data": {
-                "content": trader_decision.decision.content,
-                "recommendation": trader_decision.recommendation,
-                "position": trader_decision.suggested_position,
-                "timestamp": trader_decision.decision.timestamp
-            }
-        }) + "\n"
-        
-        # ========== Layer 4: Risk + Portfolio ==========
-        yield json.dumps({
-            "type": "layer_start",
-            "layer": 4,
-            "name": "Risk Management + Portfolio Manager",
-            "message": "⚖️ 第4层: 风险评估与最终决策"
-        }) + "\n"
-        
-        yield json.dumps({
-            "type": "status",
-            "message": "🛡️ 风险管理团队正在评估...",
-            "step": "risk_assessment",
-            "layer": 4
-        }) + "\n"
-        
-        risk_assessment = await asyncio.to_thread(
-            system._run_risk_management,
-            trader_decision,
-            verbose=False
-        )
-        
-        yield json.dumps({
-            "type": "risk_assessment",
-            "data": {
-                "aggressive": risk_assessment.aggressive.content,
-                "neutral": risk_assessment.neutral.content,
-                "conservative": risk_assessment.conservative.content
-            }
-        }) + "\n"
-        
-        yield json.dumps({
-            "type": "status",
-            "message": "👔 投资组合经理正在做出最终决策...",
-            "step": "portfolio_manager",
-            "layer": 4
-        }) + "\n"
-        
-        final_decision = await asyncio.to_thread(
-            system._run_portfolio_manager,
-            request.symbol,
-            analyst_team,
-            researcher_debate,
-            trader_decision,
-            risk_assessment,
-            verbose=False
-        )
-        
         yield json.dumps({
             "type": "final_result",
             "data": {
+                "report_id": result.report_id,
                 "recommendation": final_decision.recommendation,
                 "confidence": final_decision.confidence,
                 "content": final_decision.decision.content,
                 "position_suggestions": final_decision.position_suggestions,
                 "scores": {
-                    "fundamentals": fundamentals.score,
-                    "technical": technical.score,
-                    "quant": quant.score,
+                    "fundamentals": analyst_team.fundamentals.score,
+                    "technical": analyst_team.technical.score,
+                    "quant": analyst_team.quant.score if analyst_team.quant else None,
                     "bullish": researcher_debate.bullish.score,
                     "bearish": researcher_debate.bearish.score,
                     "score_diff": researcher_debate.score_diff
-                }
+                },
+                "token_usage": usage.to_dict()
             }
         }) + "\n"
         
@@ -352,18 +423,176 @@ async def analysis_generator(request: AnalyzeRequest) -> AsyncGenerator[str, Non
             "traceback": traceback.format_exc()
         }) + "\n"
 
+# ─── 进行中的分析：参数相同的请求共享同一次流水线运行 ─────────────────
+
+class _AnalysisJob:
+    """
+    一次进行中的分析
+    
+    analysis_generator 在后台任务中运行，产生的 NDJSON 行按顺序记录在 lines 中；
+    每个观看者从第一行开始回放，追上后等待新行。
+    所有观看者都断开且 analysis_abandon_grace 秒内没有人重新加入（如刷新页面）时取消分析，
+    不再为没人看的结果继续调用LLM。
+    """
+
+    def __init__(self, key: str, request: AnalyzeRequest):
+        self.key = key
+        self.symbol = request.symbol
+        self.model = request.model
+        self.started = time.time()
+        self.lines: List[str] = []
+        self.done = False
+        self.viewers = 0
+        self._changed = asyncio.Event()
+        self._idle_checks = 0  # 每次开始无人观看时加 1，只有最近一次检查有效
+        self.task: Optional[asyncio.Task] = None
+
+    def _notify(self) -> None:
+        # 唤醒所有等待中的观看者，之后等待的观看者使用新的 Event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def run(self, source: AsyncGenerator[str, None]) -> None:
+        try:
+            async for line in source:
+                self.lines.append(line)
+                self._notify()
+        finally:
+            self.done = True
+            self._notify()
+            if _inflight_analyses.get(self.key) is self:
+                del _inflight_analyses[self.key]
+
+    def watch_idle(self) -> None:
+        """analysis_abandon_grace 秒后若仍无人观看则取消分析（启动时和最后一个观看者离开时调用）"""
+        self._idle_checks += 1
+        check = self._idle_checks
+        asyncio.get_running_loop().call_later(
+            get_settings().analysis_abandon_grace, self._cancel_if_idle, check
+        )
+
+    def _cancel_if_idle(self, check: int) -> None:
+        if check != self._idle_checks or self.viewers > 0 or self.done or self.task is None:
+            return
+        print(f"[DEDUP] {self.symbol} 的分析已无观看者，取消")
+        if _inflight_analyses.get(self.key) is self:
+            del _inflight_analyses[self.key]
+        self.task.cancel()
+
+    async def stream(self, joined: bool) -> AsyncGenerator[str, None]:
+        """回放已有的事件，然后推送新事件直到分析结束"""
+        self.viewers += 1
+        try:
+            if joined:
+                yield json.dumps({
+                    "type": "status",
+                    "message": "🔗 相同的分析正在进行，已加入并回放此前的进度",
+                    "step": "joined",
+                    "layer": 0
+                }) + "\n"
+            index = 0
+            while True:
+                if index < len(self.lines):
+                    yield self.lines[index]
+                    index += 1
+                    continue
+                if self.done:
+                    return
+                await self._changed.wait()
+        finally:
+            self.viewers -= 1
+            if self.viewers == 0 and not self.done:
+                self.watch_idle()
+
+    def to_dict(self) -> dict:
+        return {
+            "symbol": self.symbol,
+            "model": self.model,
+            "elapsed": round(time.time() - self.started, 1),
+            "events": len(self.lines),
+            "viewers": self.viewers
+        }
+
+
+# 请求指纹 -> 进行中的分析（分析结束时移除）
+_inflight_analyses: Dict[str, _AnalysisJob] = {}
+
+
+def _request_fingerprint(request: AnalyzeRequest) -> str:
+    """请求指纹：股票、模型和全部分析参数（API Key 只参与哈希，不同密钥的请求不共享）"""
+    fields = jsonable_encoder(request)
+    effective_api_key = request.api_key or os.getenv("api-key") or os.getenv("OPENAI_API_KEY") or ""
+    fields["api_key"] = hashlib.sha256(effective_api_key.encode()).hexdigest()
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+def _shared_analysis(request: AnalyzeRequest) -> AsyncGenerator[str, None]:
+    """加入参数相同的进行中分析，没有时启动一个新的"""
+    key = _request_fingerprint(request)
+    job = _inflight_analyses.get(key)
+    joined = job is not None
+    if job is None:
+        job = _AnalysisJob(key, request)
+        _inflight_analyses[key] = job
+        job.task = asyncio.create_task(job.run(analysis_generator(request)))
+        # 响应流没有开始（客户端在此之前断开）时同样按无人观看处理
+        job.watch_idle()
+    else:
+        print(f"[DEDUP] {request.symbol} 加入进行中的分析（已运行 {time.time() - job.started:.1f}s，"
+              f"{len(job.lines)} 条事件）")
+    return job.stream(joined)
+
+
 @app.post("/api/analyze")
 async def analyze(request: AnalyzeRequest):
+    if not get_settings().analysis_dedup_enabled:
+        return StreamingResponse(
+            analysis_generator(request),
+            media_type="application/x-ndjson"
+        )
+    return StreamingResponse(
+        _shared_analysis(request),
+        media_type="application/x-ndjson"
+    )
+
+
+@app.get("/api/analyze/inflight")
+async def inflight_analyses():
+    """进行中的分析及各自的观看者数"""
+    return {"analyses": [job.to_dict() for job in _inflight_analyses.values()]}
+
+
+@app.post("/api/rerun")
+async def rerun(request: RerunRequest):
+    """What-if 重跑：复用已有分析师报告，只用新的辩论参数重跑研究员、交易员和风险决策层"""
+    try:
+        if request.report_id:
+            analyst_team = EnhancedMultiAgentSystem.load_analyst_report(request.report_id, request.symbol)
+        elif request.analyst_team:
+            analyst_team = AnalystTeamReport.from_dict(request.analyst_team)
+        else:
+            return JSONResponse(status_code=400, content={"error": "请提供 report_id 或 analyst_team"})
+    except FileNotFoundError as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    except (KeyError, TypeError, ValueError) as e:
+        return JSONResponse(status_code=400, content={"error": f"分析师报告无效: {e}"})
+
     return StreamingResponse(
-        analysis_generator(request),
+        analysis_generator(request, analyst_team=analyst_team, report_id=request.report_id),
         media_type="application/x-ndjson"
     )
 
 
-def _run_single_analysis_for_compare(symbol: str, system: EnhancedMultiAgentSystem) -> dict:
+async def _run_single_analysis_for_compare(symbol: str, system: EnhancedMultiAgentSystem) -> dict:
     """为对比分析运行单股的完整分析，返回可序列化的结果摘要"""
     try:
-        result = system.run_analysis(symbol, verbose=False)
+        usage = TokenUsage()
+
+        def on_llm_event(role: AgentRole, info: dict) -> None:
+            if info["event"] == "token_usage":
+                usage.add(role.value, info)
+
+        result = await system.arun_pipeline(symbol, on_llm_event=on_llm_event)
         # 获取阴阳归因字段（从Portfolio Manager输出中提取）
         import re
         strategy_type = "未能识别"
@@ -394,6 +623,8 @@ def _run_single_analysis_for_compare(symbol: str, system: EnhancedMultiAgentSyst
             "final_content": result.final_decision.decision.content,
             "trader_recommendation": result.trader_decision.recommendation,
             "debate_occurred": result.researcher_debate.debate_occurred,
+            "report_id": result.report_id,
+            "token_usage": usage.to_dict(),
         }
     except Exception as e:
         import traceback
@@ -429,7 +660,11 @@ async def compare_generator(request: CompareRequest):
             api_key=effective_api_key,
             base_url=effective_base_url,
             debate_threshold=request.debate_threshold,
-            max_debate_rounds=request.max_rounds
+            max_debate_rounds=request.max_rounds,
+            use_llm_cache=request.use_cache,
+            use_analyst_cache=request.use_cache,
+            role_models=_role_models(request),
+            structured_output=request.structured_output
         )
 
     def calc_composite(r: dict) -> float:
@@ -446,12 +681,12 @@ async def compare_generator(request: CompareRequest):
 
     # 并行启动所有分析任务，用 as_completed 逐个收结果
     try:
-        coros = [asyncio.to_thread(_run_single_analysis_for_compare, sym, make_system()) for sym in symbols]
-        
-        # We need a way to map futures back to symbols.
-        # However, asyncio.to_thread doesn't return the symbol, so we wrap it.
+        # 宏观、全球新闻、大盘情绪、基准指数与个股无关，先计算一次，各股票直接复用
+        await asyncio.to_thread(warm_market_context)
+
+        # as_completed 不返回对应的股票代码，包装一层一并返回
         async def run_with_sym(sym, sys):
-            res = await asyncio.to_thread(_run_single_analysis_for_compare, sym, sys)
+            res = await _run_single_analysis_for_compare(sym, sys)
             return sym, res
 
         tasks = [run_with_sym(sym, make_system()) for sym in symbols]
@@ -61,6 +61,8 @@ def print_result(result):
     print(f"{'='*80}")
     print(f"基本面评分: {result.analyst_team.fundamentals.score}/10")
     print(f"技术面评分: {result.analyst_team.technical.score}/10")
+    if result.report_id:
+        print(f"报告ID: {result.report_id} (可用 --report 换参数重跑第2-4层)")
     
     # ========== 研究员辩论 ==========
     print(f"\n{'='*80}")
@@ -156,6 +158,10 @@ def main():
                        help='最大辩论轮次 (默认: 2)')
     parser.add_argument('--no-verbose', action='store_true',
                        help='不显示详细过程')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='不使用LLM响应缓存和分析师结果缓存')
+    parser.add_argument('--report', type=str,
+                       help='复用已保存的分析师报告ID，只重跑第2-4层 (需同时指定 --symbol)')
     
     args = parser.parse_args()
     
@@ -179,14 +185,20 @@ def main():
             base_url=base_url,
             debate_threshold=args.threshold,
             max_debate_rounds=args.max_rounds,
-            temperature=0.7
+            temperature=0.7,
+            use_llm_cache=not args.no_cache,
+            use_analyst_cache=not args.no_cache
         )
         print("✅ 系统初始化成功!\n")
         
         # 如果命令行指定了股票代码，直接分析
         if args.symbol:
             print(f"开始增强版分析: {args.symbol}\n")
-            result = system.run_analysis(args.symbol, verbose=not args.no_verbose)
+            result = system.run_analysis(
+                args.symbol,
+                verbose=not args.no_verbose,
+                analyst_report=args.report
+            )
             print_result(result)
             return
         
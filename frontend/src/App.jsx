@@ -379,6 +379,23 @@ const DebateBar = ({ bullScore, bearScore }) => {
   );
 };
 
+// agent_delta 事件: 角色 -> [结果层, 字段]，流式文本追加到对应字段
+// （辩论每轮开始时收到 debate_round 事件，清空研究员字段后接收该轮的反驳）
+const DELTA_FIELDS = {
+  fundamentals_analyst: ['layer1', 'fundamental'],
+  sentiment_analyst: ['layer1', 'sentiment'],
+  news_analyst: ['layer1', 'news'],
+  technical_analyst: ['layer1', 'technical'],
+  quant_analyst: ['layer1', 'quant'],
+  bullish_researcher: ['layer2', 'bullView'],
+  bearish_researcher: ['layer2', 'bearView'],
+  trader: ['layer3', 'reasoning'],
+  risk_manager_aggressive: ['layer4', 'aggressive'],
+  risk_manager_neutral: ['layer4', 'balanced'],
+  risk_manager_conservative: ['layer4', 'conservative'],
+  portfolio_manager: ['layer4', 'decision'],
+};
+
 export default function App() {
   const [stockCode, setStockCode] = useState('600519');
   const [stockName, setStockName] = useState('');
@@ -554,11 +571,21 @@ export default function App() {
       case 'agent_output':
         updateAgentOutput(data.role, data.data);
         break;
+      case 'agent_delta':
+        appendAgentDelta(data.role, data.delta);
+        break;
+      case 'llm_event':
+        // 主模型超时改用备用模型时丢弃已推送的半截文本；辩论新一轮开始时清空上一轮的文本
+        if (data.event === 'fallback' || data.event === 'debate_round') {
+          resetAgentDelta(data.role);
+        }
+        break;
       case 'risk_assessment':
         setStage(4);
         setResult(prev => ({
           ...prev,
           layer4: {
+            ...(prev?.layer4 || {}),
             aggressive: data.data.aggressive,
             balanced: data.data.neutral,
             conservative: data.data.conservative
@@ -572,6 +599,10 @@ export default function App() {
             ...(prev?.layer3 || {}),
             action: data.data.recommendation,
             confidence: data.data.confidence
+          },
+          layer4: {
+            ...(prev?.layer4 || {}),
+            decision: data.data.content
           }
         }));
         break;
@@ -595,6 +626,32 @@ export default function App() {
     }
   };
 
+  const appendAgentDelta = (role, delta) => {
+    const target = DELTA_FIELDS[role];
+    if (!target) return;
+    const [layer, key] = target;
+    setResult(prev => ({
+      ...prev,
+      [layer]: {
+        ...(prev?.[layer] || {}),
+        [key]: (prev?.[layer]?.[key] || '') + delta
+      }
+    }));
+  };
+
+  const resetAgentDelta = (role) => {
+    const target = DELTA_FIELDS[role];
+    if (!target) return;
+    const [layer, key] = target;
+    setResult(prev => ({
+      ...prev,
+      [layer]: {
+        ...(prev?.[layer] || {}),
+        [key]: ''
+      }
+    }));
+  };
+
   const updateAgentOutput = (role, data) => {
     switch (role) {
       case 'fundamentals_analyst':
@@ -1255,6 +1312,15 @@ export default function App() {
                       </div>
                     ))}
                   </div>
+
+                  {result?.layer4?.decision && (
+                    <div className="mt-6 bg-white p-7 rounded-[28px] border border-gray-100/80 shadow-[0_4px_20px_rgba(0,0,0,0.02)] animate-slideUp">
+                      <h4 className="text-lg font-bold text-gray-900 mb-3 tracking-tight">Portfolio Decision</h4>
+                      <div className="text-[14px] text-gray-500 leading-relaxed font-medium">
+                        <TypewriterText text={result.layer4.decision} />
+                      </div>
+                    </div>
+                  )}
                 </section>
               )}
             </div>
@@ -0,0 +1,94 @@
+"""
+Analyst Output Cache
+分析师结果缓存
+
+第1层（5位分析师）是整个流程中最耗时的一层，而同一只股票的分析师结论在一个交易时段内基本不变。
+热门股票往往在几分钟内被许多用户反复分析，/api/analyze、/api/compare 和 CLI 每次都从头计算。
+
+本模块在进程内缓存分析师的 AgentOutput，所有入口共享：
+- 缓存键: 股票代码 + 角色 + 配置摘要 + 交易日 + 数据指纹
+- 配置摘要: 影响输出的模型路由（API地址、模型、温度、max_tokens）和提示词设置的哈希，
+  不同配置的请求互不命中
+- 数据指纹: 最新K线日期 + 最新一条新闻的发布时间和标题，出现新K线或新新闻时自动失效
+- 分析失败的输出不缓存
+"""
+
+import datetime
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from src.tools import get_stock_hist
+from src.tools.cache import TTLCache
+from src.tools.news_cache import fetch_stock_news
+
+
+_analyst_cache: Optional[TTLCache] = None
+_analyst_cache_lock = threading.Lock()
+
+
+def get_analyst_cache() -> Optional[TTLCache]:
+    """
+    获取全局分析师结果缓存（单例模式）
+
+    Returns:
+        TTLCache对象；配置中关闭缓存时返回 None
+    """
+    global _analyst_cache
+    if _analyst_cache is None:
+        from src.config import get_settings
+
+        settings = get_settings()
+        if not settings.analyst_cache_enabled:
+            return None
+        with _analyst_cache_lock:
+            if _analyst_cache is None:
+                _analyst_cache = TTLCache(
+                    ttl=settings.analyst_cache_ttl,
+                    maxsize=settings.analyst_cache_size
+                )
+    return _analyst_cache
+
+
+def analyst_data_fingerprint(symbol: str) -> Optional[Tuple[str, str]]:
+    """
+    计算分析师输入数据的指纹
+
+    Returns:
+        (最新K线日期, 最新新闻标识)；数据获取失败时返回 None（此时不使用缓存）
+    """
+    try:
+        bars = get_stock_hist(symbol, days=30)
+        last_bar = str(bars['日期'].max()) if not bars.empty else ""
+
+        news = fetch_stock_news(symbol)
+        latest_news = ""
+        if news is not None and not news.empty and '发布时间' in news.columns:
+            row = news.sort_values('发布时间').iloc[-1]
+            latest_news = f"{row['发布时间']}|{row.get('新闻标题', '')}"
+        return last_bar, latest_news
+    except Exception:
+        return None
+
+
+def analyst_cache_key(
+    symbol: str,
+    role: str,
+    config: Dict[str, Any],
+    fingerprint: Tuple[str, str]
+) -> Hashable:
+    """
+    分析师结果的缓存键（按交易日区分）
+
+    Args:
+        symbol: 股票代码
+        role: 分析师角色
+        config: 影响输出的配置（模型路由、结构化输出、提示词预算等），取其哈希
+        fingerprint: 输入数据指纹
+    """
+    session = datetime.date.today().isoformat()
+    digest = hashlib.sha256(
+        json.dumps(config, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:16]
+    return (symbol, role, digest, session) + tuple(fingerprint)
@@ -0,0 +1,134 @@
+"""
+Analyst Report Digest
+分析师报告摘要
+
+研究员、辩论和交易员原先各自使用分析师报告：研究员和每轮辩论粘贴五份报告全文，
+交易员则把每份报告生硬地截断为前 200 字（经常截掉评分）。
+
+第1层结束后，每份报告只提炼一次，得到固定大小的结构化摘要：
+评分、要点和风险。后续各层复用同一份摘要，不再各自处理全文。
+摘要按规则抽取，不额外调用LLM。
+"""
+
+import re
+from dataclasses import dataclass, field
+from itertools import zip_longest
+from typing import Any, Dict, List, Optional
+
+from src.agent.debate_memory import estimate_tokens, truncate_to_tokens
+
+
+# 每份摘要的要点/风险条数上限
+_MAX_BULLETS = 4
+_MAX_RISKS = 2
+# 每条至少保留的 token 数（预算不足时减少条数而不是把每条都截得过短）
+_MIN_ITEM_TOKENS = 12
+
+# 列表行（编号或项目符号）
+_LIST_ITEM = re.compile(r"^\s*(?:\d+[.、)）]\s*|[-*•·]\s+)")
+# 标题行（【...】、Markdown 标题、以冒号结尾的短行）
+_HEADING = re.compile(r"^\s*(?:【[^】]+】\s*$|#+\s|[^，。,.]{1,16}[：:]\s*$)")
+_RISK_WORDS = ("风险", "隐患", "不确定", "警惕", "压力", "下行", "利空")
+_MARKDOWN = re.compile(r"\*\*|__|`|^#+\s*")
+_SENTENCE_END = re.compile(r"(?<=[。！？；])")
+
+
+def _clean(line: str) -> str:
+    return _MARKDOWN.sub("", _LIST_ITEM.sub("", line)).strip()
+
+
+def _is_risk(text: str) -> bool:
+    return any(word in text for word in _RISK_WORDS)
+
+
+@dataclass
+class AnalystDigest:
+    """单份分析师报告的摘要"""
+    title: str  # 如 "基本面分析"
+    score: Optional[float] = None
+    bullets: List[str] = field(default_factory=list)
+    risks: List[str] = field(default_factory=list)
+
+    def render(self) -> str:
+        header = f"【{self.title}】" + (f"评分: {self.score}/10" if self.score is not None else "")
+        lines = [header]
+        if self.bullets:
+            lines.append("要点:")
+            lines.extend(f"- {bullet}" for bullet in self.bullets)
+        if self.risks:
+            lines.append("风险:")
+            lines.extend(f"- {risk}" for risk in self.risks)
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"title": self.title, "score": self.score, "bullets": self.bullets, "risks": self.risks}
+
+
+def digest_report(title: str, content: str, score: Optional[float], max_tokens: int) -> AnalystDigest:
+    """
+    提炼一份分析师报告
+
+    列表行作为候选要点，位于"风险"小节内或含风险类词语的归入风险；
+    报告没有列表时按句子提取。每条按剩余预算截断，整份摘要不超过 max_tokens。
+
+    Args:
+        title: 报告标题
+        content: 报告全文
+        score: 分析师评分（不打分的分析师为 None）
+        max_tokens: 摘要的 token 上限
+    """
+    bullets: List[str] = []
+    risks: List[str] = []
+    in_risk_section = False
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        if _HEADING.match(line):
+            in_risk_section = _is_risk(line)
+            continue
+        if not _LIST_ITEM.match(line):
+            continue
+        text = _clean(line)
+        if text:
+            (risks if in_risk_section or _is_risk(text) else bullets).append(text)
+
+    if not bullets:
+        for line in content.splitlines():
+            if _HEADING.match(line):
+                continue
+            for sentence in _SENTENCE_END.split(line):
+                text = _clean(sentence)
+                if text:
+                    (risks if _is_risk(text) else bullets).append(text)
+
+    digest = AnalystDigest(title=title, score=score)
+    # 标题、小节名和每条的 "- " 前缀
+    remaining = max_tokens - estimate_tokens(digest.render()) - 8
+    # 预算不足时按优先级保留：要点和风险交替，各自靠前的优先
+    bullets, risks = bullets[:_MAX_BULLETS], risks[:_MAX_RISKS]
+    ranked = [
+        item for pair in zip_longest(
+            [(digest.bullets, b) for b in bullets], [(digest.risks, r) for r in risks]
+        ) for item in pair if item is not None
+    ]
+    items = ranked[:max(remaining, 0) // _MIN_ITEM_TOKENS]
+    # 从短到长分配预算，短条目用不完的部分留给长条目
+    allowed: Dict[int, int] = {}
+    for n, i in enumerate(sorted(range(len(items)), key=lambda i: estimate_tokens(items[i][1]))):
+        allowed[i] = min(estimate_tokens(items[i][1]), remaining // (len(items) - n))
+        remaining -= allowed[i] + 1
+    for i, (target, text) in enumerate(items):
+        target.append(truncate_to_tokens(text, allowed[i]))
+    return digest
+
+
+@dataclass
+class AnalystTeamDigest:
+    """分析师团队摘要（第1层输出的压缩版本，供第2、3层复用）"""
+    digests: List[AnalystDigest]
+
+    def render(self) -> str:
+        return "\n\n".join(digest.render() for digest in self.digests)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"digests": [digest.to_dict() for digest in self.digests]}
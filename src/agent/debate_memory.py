@@ -0,0 +1,153 @@
+"""
+Bounded Debate Memory
+辩论记忆（有上限）
+
+原先每轮辩论都把新的反驳拼接到多空观点末尾，下一轮把对方越来越长的全文连同
+分析报告再发一遍，交易员最后也收到全部内容，提示词长度随轮次平方增长。
+
+DebateState 为多空双方各保留：
+- 初始观点的要点摘要
+- 此前各轮反驳的要点（越早的越先被省略）
+- 最近一轮反驳的全文（超出预算时截断）
+渲染结果不超过给定的 token 预算，轮次再多，每次提示词的长度也有上限。
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+
+# 【反驳要点】 等小节标题
+_SECTION = re.compile(r"【([^】]+)】")
+# 要点行：编号、项目符号或小节标题开头，或包含评分
+_POINT_LINE = re.compile(r"^\s*(?:\d+[.、)）]|[-*•·]|【)|评分")
+
+_TRUNCATED = "…（已截断）"
+# 渲染结果中小节之间的分隔符
+_SEPARATOR = "\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计 token 数：中日韩字符约 1 个/字，其他字符约 4 个/token"""
+    cjk = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截断到约 max_tokens 个 token（保留开头）"""
+    if max_tokens <= 0:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - estimate_tokens(_TRUNCATED)
+    if budget <= 0:
+        return ""
+    used = 0.0
+    for i, ch in enumerate(text):
+        used += 1.0 if ord(ch) >= 0x2E80 else 0.25
+        if used > budget:
+            return text[:i].rstrip() + _TRUNCATED
+    return text
+
+
+def key_points(text: str, max_tokens: Optional[int] = None) -> str:
+    """
+    提取要点：优先取【反驳要点】/【核心观点】等小节，其次取编号和项目符号行，
+    都没有时退回全文；给出 max_tokens 时结果截断到该长度以内
+    """
+    points = text.strip()
+    sections = list(_SECTION.finditer(text))
+    for i, match in enumerate(sections):
+        if "要点" in match.group(1) or "观点" in match.group(1) or "理由" in match.group(1):
+            end = sections[i + 1].start() if i + 1 < len(sections) else len(text)
+            body = text[match.end():end].strip()
+            if body:
+                points = body
+                break
+    else:
+        lines = [line.strip() for line in text.splitlines() if _POINT_LINE.match(line)]
+        if lines:
+            points = "\n".join(lines)
+    return points if max_tokens is None else truncate_to_tokens(points, max_tokens)
+
+
+def _block(heading: str, body: str, max_tokens: int) -> str:
+    """"【标题】\n正文"，正文截断使整块不超过 max_tokens；放不下任何正文时返回空字符串"""
+    heading = f"{heading}\n"
+    body = truncate_to_tokens(body, max_tokens - estimate_tokens(heading))
+    return heading + body if body else ""
+
+
+@dataclass
+class DebateSide:
+    """一方的辩论记忆"""
+    opening: str  # 初始观点
+    earlier: List[Tuple[int, str]] = field(default_factory=list)  # (轮次, 要点)
+    latest: Optional[Tuple[int, str]] = None  # (轮次, 反驳全文)
+
+    def add(self, round_num: int, rebuttal: str) -> None:
+        if self.latest is not None:
+            self.earlier.append((self.latest[0], key_points(self.latest[1])))
+        self.latest = (round_num, rebuttal)
+
+    def render(self, max_tokens: int) -> str:
+        """
+        在 max_tokens 内渲染：最近一轮全文最多占一半，其余依次给初始观点和较近的轮次
+
+        小节标题、分隔符和"更早的轮次已省略"的提示都计入预算，结果不超过 max_tokens。
+        """
+        if self.latest is None:
+            return truncate_to_tokens(self.opening, max_tokens)
+        # 预留分隔符和省略提示（按最多的情况：所有更早的轮次都被省略）；预算极小时不显示省略提示
+        omitted_note = f"（更早的 {len(self.earlier)} 轮要点已省略）" if self.earlier else ""
+        separators = estimate_tokens(_SEPARATOR * (len(self.earlier) + 2))
+        if estimate_tokens(omitted_note) + separators >= max_tokens // 2:
+            omitted_note = ""
+        reserved = estimate_tokens(omitted_note) + separators
+
+        round_num, text = self.latest
+        latest = _block(f"【第{round_num}轮反驳】", text, min(max_tokens // 2, max_tokens - reserved))
+        remaining = max_tokens - estimate_tokens(latest) - reserved
+
+        opening_budget = remaining // 2 if self.earlier else remaining
+        opening = _block("【初始观点要点】", key_points(self.opening, opening_budget), opening_budget)
+        remaining -= estimate_tokens(opening)
+
+        earlier: List[str] = []
+        for round_num, points in reversed(self.earlier):
+            block = _block(f"【第{round_num}轮要点】", points, remaining)
+            if not block:
+                break
+            earlier.append(block)
+            remaining -= estimate_tokens(block)
+        omitted = len(self.earlier) - len(earlier)
+        if omitted and omitted_note:
+            earlier.append(f"（更早的 {omitted} 轮要点已省略）")
+
+        return _SEPARATOR.join(part for part in [opening, *reversed(earlier), latest] if part)
+
+
+class DebateState:
+    """多空双方的辩论记忆"""
+
+    def __init__(self, bullish: str, bearish: str, max_tokens: int):
+        """
+        Args:
+            bullish: 多头初始观点
+            bearish: 空头初始观点
+            max_tokens: 每一方渲染结果的 token 上限
+        """
+        self.bullish = DebateSide(opening=bullish)
+        self.bearish = DebateSide(opening=bearish)
+        self.max_tokens = max_tokens
+
+    def record(self, round_num: int, bullish_rebuttal: str, bearish_rebuttal: str) -> None:
+        """记录一轮反驳"""
+        self.bullish.add(round_num, bullish_rebuttal)
+        self.bearish.add(round_num, bearish_rebuttal)
+
+    def bullish_view(self) -> str:
+        return self.bullish.render(self.max_tokens)
+
+    def bearish_view(self) -> str:
+        return self.bearish.render(self.max_tokens)
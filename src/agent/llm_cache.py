@@ -0,0 +1,208 @@
+"""
+LLM Response Cache
+LLM 响应磁盘缓存
+
+同一交易日内重复分析同一只股票时，很多提示词与之前完全相同，
+每次都重新调用大模型既慢又花钱。本模块实现 LangChain 的 BaseCache，
+将响应持久化到本地 SQLite，作为 ChatOpenAI(cache=...) 挂在 self.llm 之下：
+- 缓存键: base_url + 模型参数（llm_string，含模型名和温度）+ 完整提示词 的哈希
+- 过期: 写入超过 llm_cache_ttl 秒的条目视为未命中
+- 容量: 超过 llm_cache_max_entries 条时淘汰最久未命中的条目
+
+LangChain 只在 invoke 中使用模型的 cache，stream/astream 总是直接请求服务商；
+流式调用（API 默认逐段推送文本）通过 lookup_message / update_message 显式读写，
+与 invoke 使用相同的键，两条路径的缓存互通。
+
+默认关闭（Settings.llm_cache_enabled），API 可按请求绕过缓存。
+"""
+
+import copy
+import hashlib
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.messages import BaseMessage, message_chunk_to_message
+from langchain_core.outputs import ChatGeneration
+
+
+# 每写入多少条检查一次过期和容量
+_PRUNE_INTERVAL = 50
+
+
+class LLMResponseCache(BaseCache):
+    """SQLite LLM 响应缓存（TTL + 容量上限）"""
+
+    def __init__(self, path: str, ttl: float, max_entries: int, namespace: str = ""):
+        """
+        Args:
+            path: SQLite 文件路径
+            ttl: 条目有效期（秒）
+            max_entries: 最多保留的条目数
+            namespace: 缓存命名空间（API 地址），不同服务商的同名模型互不命中
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.namespace = namespace
+        self._write_counter = itertools.count(1)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL, accessed_at REAL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)"
+            )
+
+    def with_namespace(self, namespace: str) -> "LLMResponseCache":
+        """共享同一个存储文件、使用另一个命名空间的缓存"""
+        cache = copy.copy(self)
+        cache.namespace = namespace
+        return cache
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """打开连接，正常退出时提交事务，最后关闭连接"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _key(self, prompt: str, llm_string: str) -> str:
+        digest = hashlib.sha256()
+        for part in (self.namespace, llm_string, prompt):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """读取未过期的响应，未命中时返回 None"""
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        try:
+            return loads(value)
+        except Exception:
+            # 不同 langchain 版本序列化格式不兼容时视为未命中
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """写入响应"""
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, dumps(list(return_val)), now, now),
+            )
+        if next(self._write_counter) % _PRUNE_INTERVAL == 0:
+            self.prune()
+
+    def prune(self) -> None:
+        """删除过期条目，并按最近命中时间淘汰超出容量的条目"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,))
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self, **kwargs: Any) -> None:
+        """清空缓存（所有命名空间）"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+def _response_cache(llm: Any) -> Optional[LLMResponseCache]:
+    cache = getattr(llm, "cache", None)
+    return cache if isinstance(cache, LLMResponseCache) else None
+
+
+def lookup_message(llm: Any, messages: List[BaseMessage]) -> Optional[BaseMessage]:
+    """
+    流式调用前查询模型挂载的响应缓存
+
+    Args:
+        llm: ChatOpenAI（cache 为 LLMResponseCache 时才查询）
+        messages: 提示词消息
+
+    Returns:
+        缓存的响应消息；未启用缓存或未命中时返回 None
+    """
+    cache = _response_cache(llm)
+    if cache is None:
+        return None
+    generations = cache.lookup(dumps(messages), llm._get_llm_string())
+    if not generations:
+        return None
+    return getattr(generations[0], "message", None)
+
+
+def update_message(llm: Any, messages: List[BaseMessage], message: BaseMessage) -> None:
+    """流式调用完成后把拼接好的完整响应写入模型挂载的响应缓存"""
+    cache = _response_cache(llm)
+    if cache is None or message is None:
+        return
+    message = message_chunk_to_message(message)
+    cache.update(dumps(messages), llm._get_llm_string(), [ChatGeneration(message=message)])
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache(base_url: Optional[str] = None) -> Optional[LLMResponseCache]:
+    """
+    获取 LLM 响应缓存（存储为单例，按 API 地址区分命名空间）
+
+    Args:
+        base_url: LLM API 地址
+
+    Returns:
+        LLMResponseCache对象；配置中未启用缓存时返回 None
+    """
+    global _llm_cache
+    from src.config import get_settings
+
+    settings = get_settings()
+    if not settings.llm_cache_enabled:
+        return None
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                path = settings.llm_cache_path or os.path.join(settings.data_dir, "llm_cache.sqlite")
+                _llm_cache = LLMResponseCache(
+                    path,
+                    ttl=settings.llm_cache_ttl,
+                    max_entries=settings.llm_cache_max_entries
+                )
+    return _llm_cache.with_namespace(base_url or "")
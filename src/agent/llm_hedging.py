@@ -0,0 +1,272 @@
+"""
+Hedged, Deadline-Aware LLM Calls
+LLM 调用的对冲请求与超时
+
+单次慢调用（例如负载高时的投资组合经理）会拖住整个分析。本模块提供：
+- 超时: 调用超过给定时间即放弃，抛出 TimeoutError（调用方可换用备用模型）
+- 对冲: 调用在最近调用耗时的某个分位数（如 P95）内仍无输出时，再发一份相同请求，
+  先产生输出的一份胜出，另一份被取消
+- LatencyTracker: 按 API地址+模型 记录最近的调用耗时，用于计算对冲延迟
+
+"输出"对普通调用是完整响应，对流式调用是第一段文本：流式调用一旦开始输出，
+另一份请求立即退出，增量文本只来自胜出的一份。
+
+超时和对冲延迟从第一份请求占到并发位置（见 llm_limiter）后才开始计时，排队时间不计入；
+占到位置时调用已超时或另一份请求已胜出的请求不再发送。
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+# 每个 LatencyTracker 保留的样本数
+_LATENCY_SAMPLES = 200
+
+# 同步调用的请求线程池：所有 hedged_call 共用（每次调用最多占两个线程）
+_call_executor: Optional[ThreadPoolExecutor] = None
+_call_executor_lock = threading.Lock()
+
+
+def _get_call_executor() -> ThreadPoolExecutor:
+    """获取全局LLM请求线程池（大小与每个API地址的最大HTTP连接数 llm_max_connections 相同）"""
+    global _call_executor
+    if _call_executor is None:
+        with _call_executor_lock:
+            if _call_executor is None:
+                from src.config import get_settings
+
+                _call_executor = ThreadPoolExecutor(
+                    max_workers=get_settings().llm_max_connections,
+                    thread_name_prefix="llm-call"
+                )
+    return _call_executor
+
+
+class HedgeLost(Exception):
+    """对冲的另一份请求已先产生输出，本请求退出"""
+
+
+class LatencyTracker:
+    """最近调用耗时的滑动窗口"""
+
+    def __init__(self, maxlen: int = _LATENCY_SAMPLES):
+        self._samples: Deque[float] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float, min_samples: int = 20) -> Optional[float]:
+        """
+        第 p 分位的耗时（p 取 0-1）
+
+        Returns:
+            秒数；样本不足 min_samples 时返回 None
+        """
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(p * len(ordered)))
+        return ordered[index]
+
+
+_trackers: Dict[Tuple[str, str, bool], LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_latency_tracker(base_url: Optional[str], model: str, streaming: bool) -> LatencyTracker:
+    """
+    获取某个 API地址+模型 的耗时记录（流式调用记录首段文本耗时，与普通调用分开）
+    """
+    key = (base_url or "", model, streaming)
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = _trackers[key] = LatencyTracker()
+        return tracker
+
+
+class _Gate:
+    """决定多份请求中哪一份胜出"""
+
+    def __init__(self, on_start: Callable[[], None]):
+        """
+        Args:
+            on_start: 第一份请求占到并发位置时调用（开始计时）
+        """
+        self._lock = threading.Lock()
+        self._on_start = on_start
+        self.winner: Optional[int] = None
+        self.closed = False
+
+    def start(self, index: int) -> bool:
+        """第 index 份请求占到并发位置、即将发送时调用，返回是否仍应发送"""
+        with self._lock:
+            if self.closed or (self.winner is not None and self.winner != index):
+                return False
+        self._on_start()
+        return True
+
+    def claim(self, index: int) -> bool:
+        """第 index 份请求产生输出时调用，返回它是否（仍）是胜出者"""
+        with self._lock:
+            if self.closed:
+                return False
+            if self.winner is None:
+                self.winner = index
+            return self.winner == index
+
+    def close(self) -> None:
+        """调用结束（成功、失败或超时），之后所有请求都应退出"""
+        with self._lock:
+            self.closed = True
+
+
+def _deadline_error(timeout: float) -> TimeoutError:
+    return TimeoutError(f"LLM调用超过 {timeout:.1f} 秒未完成")
+
+
+def hedged_call(
+    attempt: Callable[[int, Callable[[], bool], Callable[[], bool]], T],
+    timeout: Optional[float] = None,
+    hedge_delay: Optional[float] = None,
+    on_hedge: Optional[Callable[[], None]] = None
+) -> T:
+    """
+    带超时和对冲的同步调用
+
+    Args:
+        attempt: 发起一份请求 attempt(序号, claim, started)；占到并发位置后、发送前先调用 started()，
+            流式请求每收到一段输出先调用 claim()，二者返回 False 时应抛出 HedgeLost 退出
+        timeout: 超时秒数，从第一份请求调用 started() 起计时（None 表示不限）
+        hedge_delay: 第一份请求开始后超过该秒数仍无输出时发起第二份（None 表示不对冲）
+        on_hedge: 发起第二份请求时回调
+
+    Raises:
+        TimeoutError: 超时（已发出的请求在后台线程中继续运行至结束，结果被丢弃）
+    """
+    if timeout is None and hedge_delay is None:
+        return attempt(0, lambda: True, lambda: True)
+    if timeout is not None and timeout <= 0:
+        raise _deadline_error(0)
+
+    started = threading.Event()
+    gate = _Gate(on_start=started.set)
+    executor = _get_call_executor()
+    first = executor.submit(attempt, 0, partial(gate.claim, 0), partial(gate.start, 0))
+    first.add_done_callback(lambda _: started.set())
+    futures = {first: 0}
+    try:
+        # 排队等待并发位置的时间不计入超时
+        started.wait()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if hedge_delay is not None and (timeout is None or hedge_delay < timeout):
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done and gate.winner is None:
+                if on_hedge is not None:
+                    on_hedge()
+                futures[executor.submit(attempt, 1, partial(gate.claim, 1), partial(gate.start, 1))] = 1
+
+        errors = []
+        pending = set(futures)
+        while pending:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise _deadline_error(timeout)
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                raise _deadline_error(timeout)
+            for future in done:
+                error = future.exception()
+                if error is None and gate.claim(futures[future]):
+                    return future.result()
+                if error is not None and not isinstance(error, HedgeLost):
+                    errors.append(error)
+        raise errors[0]
+    finally:
+        gate.close()
+        # 尚未开始执行的请求直接取消
+        for future in futures:
+            future.cancel()
+
+
+def _consume_exception(task: "asyncio.Task") -> None:
+    """被放弃的任务的异常不再有人读取，避免 "exception was never retrieved" 警告"""
+    if not task.cancelled():
+        task.exception()
+
+
+async def ahedged_call(
+    attempt: Callable[[int, Callable[[], bool], Callable[[], bool]], Awaitable[T]],
+    timeout: Optional[float] = None,
+    hedge_delay: Optional[float] = None,
+    on_hedge: Optional[Callable[[], None]] = None
+) -> T:
+    """
+    hedged_call 的异步版本（超时或落败的请求会被取消）
+
+    Raises:
+        TimeoutError: 超时
+    """
+    if timeout is None and hedge_delay is None:
+        return await attempt(0, lambda: True, lambda: True)
+    if timeout is not None and timeout <= 0:
+        raise _deadline_error(0)
+
+    started = asyncio.Event()
+    gate = _Gate(on_start=started.set)
+    tasks: Dict[asyncio.Task, int] = {}
+
+    def start(index: int) -> None:
+        task = asyncio.ensure_future(attempt(index, partial(gate.claim, index), partial(gate.start, index)))
+        task.add_done_callback(_consume_exception)
+        tasks[task] = index
+
+    start(0)
+    try:
+        # 排队等待并发位置的时间不计入超时
+        waiter = asyncio.ensure_future(started.wait())
+        try:
+            await asyncio.wait([waiter, *tasks], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if hedge_delay is not None and (timeout is None or hedge_delay < timeout):
+            done, _ = await asyncio.wait(list(tasks), timeout=hedge_delay)
+            if not done and gate.winner is None:
+                if on_hedge is not None:
+                    on_hedge()
+                start(1)
+
+        errors = []
+        pending = set(tasks)
+        while pending:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise _deadline_error(timeout)
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                raise _deadline_error(timeout)
+            for task in done:
+                error = task.exception()
+                if error is None and gate.claim(tasks[task]):
+                    return task.result()
+                if error is not None and not isinstance(error, HedgeLost):
+                    errors.append(error)
+        raise errors[0]
+    finally:
+        gate.close()
+        for task in tasks:
+            if not task.done():
+                task.cancel()
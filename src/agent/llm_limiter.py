@@ -0,0 +1,295 @@
+"""
+Adaptive LLM Concurrency Limiter
+LLM 并发自适应限流
+
+对比分析会同时对同一个API地址发起 5只股票 × 5位分析师 的请求，
+服务商限流（429）后重试又会拉长尾延迟。本模块在每次LLM调用外加一个并发窗口，
+按 (API地址, 模型) 区分，窗口大小按 AIMD 规则自适应：
+- 调用成功且耗时不超过 llm_latency_target: 窗口加性增长（每个窗口的调用完成后约 +1）
+- 收到 429: 窗口减半
+- 耗时超过 llm_latency_target: 窗口缩小 10%
+两次缩小之间至少间隔一次平均调用耗时，避免同一波拥塞被重复惩罚。
+
+超出窗口的调用按先来先服务排队，同步（线程）和异步（事件循环）调用共用同一个队列。
+LLM客户端关闭了 SDK 的内部重试（见 llm_pool），429 直接到达限流器；
+调用方用 is_retryable / retry_delay 判断是否重试，重试时重新排队。
+get_limiter_stats() 报告每个限流器的窗口、在途数、排队数和等待时间。
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+
+# 延迟和等待时间的指数移动平均系数
+_EWMA_ALPHA = 0.2
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _is_rate_limited(error: BaseException) -> bool:
+    """是否为服务商限流错误（openai.RateLimitError 或 HTTP 429）"""
+    return _status_code(error) == 429
+
+
+def is_retryable(error: BaseException) -> bool:
+    """是否值得重试：限流、请求超时/冲突、服务端错误（5xx）和连接错误（openai.APIConnectionError，含超时）"""
+    status = _status_code(error)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    return any(cls.__name__ == "APIConnectionError" for cls in type(error).__mro__)
+
+
+def retry_delay(error: BaseException, retry: int) -> float:
+    """重试前等待的秒数：优先使用服务商给出的 Retry-After，否则指数退避（0.5 秒起，最多 8 秒）"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return min(max(float(headers.get("retry-after")), 0.0), 60.0)
+    except (AttributeError, TypeError, ValueError):
+        return min(0.5 * 2 ** retry, 8.0)
+
+
+class _Waiter:
+    """排队中的调用（同步调用等待 threading.Event，异步调用等待 Future）"""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.granted = False
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._set_future)
+
+    def _set_future(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdaptiveLimiter:
+    """AIMD 并发窗口"""
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 32,
+        latency_target: float = 60.0
+    ):
+        """
+        Args:
+            name: 限流器名称（API地址 + 模型），用于状态报告
+            initial: 初始并发窗口
+            minimum: 窗口下限
+            maximum: 窗口上限
+            latency_target: 单次调用耗时超过该秒数视为拥塞
+        """
+        self.name = name
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.window = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_target = latency_target
+
+        self._lock = threading.Lock()
+        self._waiters: Deque[_Waiter] = deque()
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._latency_ewma = 0.0
+        self._wait_ewma = 0.0
+        self._max_wait = 0.0
+        self._completed = 0
+        self._queued = 0
+        self._rate_limited = 0
+
+    @property
+    def _capacity(self) -> int:
+        return max(1, int(self.window))
+
+    @property
+    def queue_depth(self) -> int:
+        """正在排队等待的调用数"""
+        return len(self._waiters)
+
+    # ==================== 获取 / 释放 ====================
+
+    def _enqueue_locked(self, waiter: _Waiter) -> bool:
+        """有空位且无人排队时直接占用，返回 True；否则加入队列"""
+        if not self._waiters and self._in_flight < self._capacity:
+            self._in_flight += 1
+            return True
+        self._waiters.append(waiter)
+        self._queued += 1
+        return False
+
+    def _wake_locked(self) -> None:
+        """按先来先服务把空出的位置交给排队的调用"""
+        while self._waiters and self._in_flight < self._capacity:
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self._in_flight += 1
+            waiter.wake()
+
+    def _record_wait_locked(self, waited: float) -> None:
+        self._wait_ewma += _EWMA_ALPHA * (waited - self._wait_ewma)
+        self._max_wait = max(self._max_wait, waited)
+
+    def acquire(self) -> None:
+        """占用一个并发位置（同步，必要时阻塞等待）"""
+        waiter = _Waiter()
+        start = time.monotonic()
+        with self._lock:
+            if self._enqueue_locked(waiter):
+                return
+        waiter.event.wait()
+        with self._lock:
+            self._record_wait_locked(time.monotonic() - start)
+
+    async def aacquire(self) -> None:
+        """占用一个并发位置（异步，必要时在事件循环中等待）"""
+        waiter = _Waiter(asyncio.get_running_loop())
+        start = time.monotonic()
+        with self._lock:
+            if self._enqueue_locked(waiter):
+                return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    # 已分到位置但调用方被取消，交还给下一个排队者
+                    self._in_flight -= 1
+                    self._wake_locked()
+                else:
+                    self._waiters.remove(waiter)
+            raise
+        with self._lock:
+            self._record_wait_locked(time.monotonic() - start)
+
+    def release(self, latency: float, error: Optional[BaseException] = None) -> None:
+        """
+        释放位置并根据本次调用的结果调整窗口
+
+        Args:
+            latency: 本次调用耗时（秒）
+            error: 调用抛出的异常（无异常时为 None）
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._in_flight -= 1
+            if error is not None and _is_rate_limited(error):
+                self._rate_limited += 1
+                self._decrease_locked(0.5, now)
+            elif error is None:
+                self._completed += 1
+                self._latency_ewma += _EWMA_ALPHA * (latency - self._latency_ewma)
+                if self.latency_target and latency > self.latency_target:
+                    self._decrease_locked(0.9, now)
+                else:
+                    self.window = min(self.maximum, self.window + 1.0 / self.window)
+            self._wake_locked()
+
+    def _decrease_locked(self, factor: float, now: float) -> None:
+        if now - self._last_decrease < max(1.0, self._latency_ewma):
+            return
+        self.window = max(float(self.minimum), self.window * factor)
+        self._last_decrease = now
+
+    @contextmanager
+    def limit(self) -> Iterator[None]:
+        """在并发窗口内执行一次调用（同步）"""
+        self.acquire()
+        start = time.monotonic()
+        error: Optional[BaseException] = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.release(time.monotonic() - start, error)
+
+    @asynccontextmanager
+    async def alimit(self) -> AsyncIterator[None]:
+        """在并发窗口内执行一次调用（异步）"""
+        await self.aacquire()
+        start = time.monotonic()
+        error: Optional[BaseException] = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.release(time.monotonic() - start, error)
+
+    # ==================== 状态 ====================
+
+    def stats(self) -> Dict[str, Any]:
+        """当前窗口、在途数、排队数和等待/耗时统计"""
+        with self._lock:
+            return {
+                "name": self.name,
+                "window": round(self.window, 2),
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "avg_wait": round(self._wait_ewma, 3),
+                "max_wait": round(self._max_wait, 3),
+                "avg_latency": round(self._latency_ewma, 3),
+                "completed": self._completed,
+                "queued": self._queued,
+                "rate_limited": self._rate_limited,
+            }
+
+
+_limiters: Dict[Tuple[str, str], AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_llm_limiter(base_url: Optional[str], model: str) -> AdaptiveLimiter:
+    """
+    获取某个API地址 + 模型的限流器（进程内共享）
+
+    Args:
+        base_url: LLM API 地址
+        model: 模型名称
+
+    Returns:
+        AdaptiveLimiter对象
+    """
+    key = (base_url or "", model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            from src.config import get_settings
+
+            settings = get_settings()
+            limiter = AdaptiveLimiter(
+                name=f"{key[0]} | {model}",
+                initial=settings.llm_limit_initial,
+                minimum=settings.llm_limit_min,
+                maximum=settings.llm_limit_max,
+                latency_target=settings.llm_latency_target
+            )
+            _limiters[key] = limiter
+        return limiter
+
+
+def get_limiter_stats() -> List[Dict[str, Any]]:
+    """所有限流器的状态"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.stats() for limiter in limiters]
@@ -0,0 +1,104 @@
+"""
+Pooled LLM Clients
+LLM 客户端池
+
+API 为每个请求（对比分析为每只股票）新建 EnhancedMultiAgentSystem，
+如果每次都新建 ChatOpenAI，每个实例都会带一个新的 HTTP 客户端，
+之前建立的长连接和 TLS 会话全部丢弃，每次调用都要重新握手。
+
+本模块在进程内共享：
+- HTTP 客户端: 按 API 地址共享一对 httpx.Client / httpx.AsyncClient，
+  连接数有上限并保持长连接（Settings.llm_max_connections 等）
+- ChatOpenAI: 按 (API地址, 密钥, 模型, 温度, 最大输出长度, 是否缓存) 复用，
+  最近最少使用的实例超过 llm_pool_size 时淘汰（HTTP 客户端不随之关闭）
+
+ChatOpenAI 关闭 SDK 的内部重试（max_retries=0）：429 要直接交给并发限流器
+（llm_limiter）缩小窗口，由调用方重新排队重试，而不是在 SDK 里悄悄退避。
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from src.agent.llm_cache import get_llm_cache
+
+
+_http_clients: Dict[str, Tuple[httpx.Client, httpx.AsyncClient]] = {}
+_chat_models: "OrderedDict[Hashable, ChatOpenAI]" = OrderedDict()
+_pool_lock = threading.Lock()
+
+
+def _http_client_pair(base_url: str) -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """某个API地址共享的同步/异步 HTTP 客户端（调用方持有 _pool_lock）"""
+    pair = _http_clients.get(base_url)
+    if pair is None:
+        from src.config import get_settings
+
+        settings = get_settings()
+        limits = httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive,
+            keepalive_expiry=settings.llm_keepalive_expiry
+        )
+        # LLM 响应可能很慢，只限制建立连接的时间
+        timeout = httpx.Timeout(None, connect=10.0)
+        pair = (
+            httpx.Client(limits=limits, timeout=timeout),
+            httpx.AsyncClient(limits=limits, timeout=timeout)
+        )
+        _http_clients[base_url] = pair
+    return pair
+
+
+def get_chat_model(
+    model: str,
+    api_key: Optional[str],
+    base_url: Optional[str],
+    temperature: float,
+    use_cache: bool = True,
+    max_tokens: Optional[int] = None
+) -> ChatOpenAI:
+    """
+    获取共享的 ChatOpenAI 实例
+
+    Args:
+        model: 模型名称
+        api_key: API密钥
+        base_url: API地址
+        temperature: 温度参数
+        use_cache: 是否使用LLM响应缓存（需在配置中启用 llm_cache_enabled）
+        max_tokens: 最大输出token数（None 表示使用服务商默认值）
+
+    Returns:
+        ChatOpenAI对象（多个请求、多个线程共用，不要修改其属性）
+    """
+    from src.config import get_settings
+
+    key = (base_url or "", api_key or "", model, temperature, max_tokens, use_cache)
+    with _pool_lock:
+        llm = _chat_models.get(key)
+        if llm is not None:
+            _chat_models.move_to_end(key)
+            return llm
+
+        http_client, http_async_client = _http_client_pair(base_url or "")
+        llm_cache = get_llm_cache(base_url) if use_cache else None
+        llm = ChatOpenAI(
+            model=model,
+            api_key=api_key,
+            base_url=base_url,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            max_retries=0,
+            # 未启用缓存时显式关闭，不使用任何全局缓存
+            cache=llm_cache if llm_cache is not None else False
+        )
+        _chat_models[key] = llm
+        while len(_chat_models) > get_settings().llm_pool_size:
+            _chat_models.popitem(last=False)
+        return llm
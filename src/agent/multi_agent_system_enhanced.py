@@ -7,18 +7,26 @@ Enhanced Multi-Agent Trading System
 - Layer 2: Researcher Team (多空辩论)
 - Layer 3: Trader Agent (交易决策)
 - Layer 4: Risk Management + Portfolio Manager (风险评估和最终决策)
+
+各层Agent声明为依赖图（见 src.agent.pipeline），节点的输入一就绪即开始执行。
 """
 
+import asyncio
+import json
 import os
-from typing import Dict, List, Optional, Any, Tuple
+import re
+import sys
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Any, Tuple, Union
 from dataclasses import dataclass, field
 from enum import Enum
 from datetime import datetime
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.tools import BaseTool
 
 from src.tools import (
     # Technical Analyst tools
@@ -50,9 +58,89 @@ from src.tools import (
     # A股特色数据工具
     get_northbound_flow,
     get_dragon_tiger_board,
+    # 共享行情快照
+    market_data_session,
+    # 工具输出渲染
+    render_for_llm,
 )
 
 from src.agent.agent_prompts_enhanced import get_prompt_by_role
+from src.agent.analyst_cache import analyst_cache_key, analyst_data_fingerprint, get_analyst_cache
+from src.agent.llm_cache import lookup_message, update_message
+from src.agent.llm_hedging import HedgeLost, ahedged_call, get_latency_tracker, hedged_call
+from src.agent.llm_limiter import AdaptiveLimiter, get_llm_limiter, is_retryable, retry_delay
+from src.agent.llm_pool import get_chat_model
+from src.agent.pipeline import (
+    AsyncPipelineExecutor,
+    NodeEvent,
+    PipelineExecutor,
+    PipelineGraph,
+    PipelineNode,
+)
+from src.agent.analyst_digest import AnalystTeamDigest, digest_report
+from src.agent.debate_memory import DebateState, estimate_tokens, truncate_to_tokens
+from src.agent.prompt_budget import TokenUsage, fit_sections, message_tokens, prompt_tokens
+from src.agent.report_store import load_report, save_report
+from src.agent.structured_output import ROLE_SCHEMAS, parse_structured, repair_prompt, with_format_instructions
+from src.config import get_settings
+
+
+# 全局工具I/O线程池：所有分析（包括并发请求）的数据获取共用，限制同时进行的外部请求数
+_tool_executor: Optional[ThreadPoolExecutor] = None
+_tool_executor_lock = threading.Lock()
+
+
+def _get_tool_executor() -> ThreadPoolExecutor:
+    """获取全局工具I/O线程池（大小由 Settings.tool_io_concurrency 决定）"""
+    global _tool_executor
+    if _tool_executor is None:
+        with _tool_executor_lock:
+            if _tool_executor is None:
+                _tool_executor = ThreadPoolExecutor(
+                    max_workers=get_settings().tool_io_concurrency,
+                    thread_name_prefix="tool-io"
+                )
+    return _tool_executor
+
+
+def invoke_tools_concurrently(calls: Dict[str, Tuple[BaseTool, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    并发调用多个相互独立的工具
+
+    Args:
+        calls: {名称: (工具, 参数)}
+
+    Returns:
+        {名称: 工具输出}；任一工具抛出异常时向上传递
+    """
+    executor = _get_tool_executor()
+    futures = {
+        name: executor.submit(tool.invoke, args)
+        for name, (tool, args) in calls.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+
+async def ainvoke_tools_concurrently(calls: Dict[str, Tuple[BaseTool, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    invoke_tools_concurrently 的异步版本
+
+    工具本身是同步的，仍在全局工具I/O线程池中执行（并发上限不变），
+    事件循环只等待结果，不占用额外的线程。
+    """
+    loop = asyncio.get_running_loop()
+    executor = _get_tool_executor()
+    names = list(calls)
+    outputs = await asyncio.gather(*(
+        loop.run_in_executor(executor, tool.invoke, args)
+        for tool, args in calls.values()
+    ))
+    return dict(zip(names, outputs))
+
+
+def _render_tool_data(data: Dict[str, Any]) -> Dict[str, str]:
+    """工具输出 -> 提示词中的紧凑文本（ToolReport 取 compact()，不含 emoji 和说明性套话）"""
+    return {name: render_for_llm(output) for name, output in data.items()}
 
 
 class AgentRole(Enum):
@@ -79,6 +167,170 @@ class AgentRole(Enum):
     DEBATE_MODERATOR = "debate_moderator"
 
 
+# LLM调用所处的阶段（按时间先后），用于把剩余时间预算分给之后的各阶段
+_LLM_STAGES = {
+    AgentRole.FUNDAMENTALS_ANALYST: 1,
+    AgentRole.SENTIMENT_ANALYST: 1,
+    AgentRole.NEWS_ANALYST: 1,
+    AgentRole.TECHNICAL_ANALYST: 1,
+    AgentRole.QUANT_ANALYST: 1,
+    AgentRole.BULLISH_RESEARCHER: 2,
+    AgentRole.BEARISH_RESEARCHER: 2,
+    AgentRole.TRADER: 3,
+    AgentRole.RISK_MANAGER_AGGRESSIVE: 4,
+    AgentRole.RISK_MANAGER_NEUTRAL: 4,
+    AgentRole.RISK_MANAGER_CONSERVATIVE: 4,
+    AgentRole.PORTFOLIO_MANAGER: 5,
+}
+_LLM_STAGE_COUNT = 5
+
+# 单份LLM请求遇到限流、服务端错误或连接错误时的重试次数（LLM客户端已关闭 SDK 内部重试）
+_LLM_RETRIES = 2
+
+
+# 模型路由表中可以用分组名一次配置多个角色
+ROLE_GROUPS = {
+    "analysts": [
+        AgentRole.FUNDAMENTALS_ANALYST,
+        AgentRole.SENTIMENT_ANALYST,
+        AgentRole.NEWS_ANALYST,
+        AgentRole.TECHNICAL_ANALYST,
+        AgentRole.QUANT_ANALYST,
+    ],
+    "researchers": [AgentRole.BULLISH_RESEARCHER, AgentRole.BEARISH_RESEARCHER],
+    "risk_managers": [
+        AgentRole.RISK_MANAGER_AGGRESSIVE,
+        AgentRole.RISK_MANAGER_NEUTRAL,
+        AgentRole.RISK_MANAGER_CONSERVATIVE,
+    ],
+}
+
+_ROUTE_FIELDS = {"model", "temperature", "max_tokens"}
+
+
+def _expand_role_name(name: str) -> List[AgentRole]:
+    """配置表中的角色或分组名 -> 角色列表"""
+    if name in ROLE_GROUPS:
+        return ROLE_GROUPS[name]
+    try:
+        return [AgentRole(name)]
+    except ValueError:
+        raise ValueError(f"未知的角色或分组: {name}") from None
+
+
+def resolve_role_models(*tables: Optional[Dict[str, Dict[str, Any]]]) -> Dict[AgentRole, Dict[str, Any]]:
+    """
+    合并模型路由表
+    
+    路由表格式: {角色或分组: {"model": ..., "temperature": ..., "max_tokens": ...}}，各字段均可省略，
+    例如 {"analysts": {"model": "Qwen/Qwen2.5-7B-Instruct"}, "trader": {"model": "deepseek-ai/DeepSeek-V3"}}。
+    后面的表覆盖前面的表；同一张表中具体角色覆盖分组。
+    
+    Returns:
+        {角色: 配置}，只包含被配置的角色
+        
+    Raises:
+        ValueError: 未知的角色、分组或字段
+    """
+    routes: Dict[AgentRole, Dict[str, Any]] = {}
+    for table in tables:
+        if not table:
+            continue
+        # 分组先于具体角色应用
+        for name in sorted(table, key=lambda name: name not in ROLE_GROUPS):
+            config = table[name] or {}
+            unknown = set(config) - _ROUTE_FIELDS
+            if unknown:
+                raise ValueError(f"角色 {name} 的模型配置包含未知字段: {sorted(unknown)}")
+            for role in _expand_role_name(name):
+                routes.setdefault(role, {}).update(
+                    {key: value for key, value in config.items() if value is not None}
+                )
+    return routes
+
+
+def resolve_role_prompt_tokens(table: Optional[Dict[str, int]]) -> Dict[AgentRole, int]:
+    """
+    解析按角色的提示词 token 预算表
+
+    格式: {角色或分组: token数}，例如 {"analysts": 4000, "portfolio_manager": 6000}；
+    具体角色覆盖分组，0 表示该角色不限。
+
+    Returns:
+        {角色: token数}，只包含被配置的角色
+
+    Raises:
+        ValueError: 未知的角色或分组
+    """
+    budgets: Dict[AgentRole, int] = {}
+    for name in sorted(table or {}, key=lambda name: name not in ROLE_GROUPS):
+        for role in _expand_role_name(name):
+            budgets[role] = int(table[name])
+    return budgets
+
+
+# 从正文中提取结论的正则（未启用结构化输出或解析失败时使用）
+_SCORE_PATTERNS = [re.compile(p) for p in (
+    r'评分[：:]\s*(\d+(?:\.\d+)?)\s*/\s*10',
+    r'(\d+(?:\.\d+)?)\s*/\s*10\s*分',
+    r'综合评分[：:]\s*(\d+(?:\.\d+)?)',
+    r'评分[：:]\s*(\d+(?:\.\d+)?)',
+    r'(\d+(?:\.\d+)?)\s*分',
+    r'(?:得分|打分)[：:]\s*(\d+(?:\.\d+)?)',
+)]
+_RECOMMENDATION_PATTERNS = [re.compile(p) for p in (
+    r'综合建议[：:]\s*(买入|持有|卖出|观望|规避)',
+    r'最终.*?建议[：:]\s*(买入|持有|卖出|观望|规避)',
+    r'交易决策[：:]\s*(买入|持有|卖出|观望|规避)',
+    r'决策[：:]\s*(买入|持有|卖出|观望|规避)',
+    r'投资建议[：:]\s*(买入|持有|卖出|观望|规避)',
+)]
+_POSITION_PATTERNS = [re.compile(p) for p in (
+    r'建议仓位[：:]\s*(轻仓|半仓|重仓|空仓|观望)',
+    r'仓位建议[：:]\s*(轻仓|半仓|重仓|空仓|观望)',
+    r'(轻仓|半仓|重仓|空仓).*?(?:买入|持有)',
+)]
+_POSITION_PCT_PATTERN = re.compile(r'(\d+)[-–]?(\d*)%.*?仓位')
+_CONFIDENCE_PATTERNS = [re.compile(p) for p in (
+    r'信心水平[：:]\s*(高|中|低)',
+    r'信心[：:]\s*(高|中|低)',
+    r'把握[：:]\s*(高|中|低|大|小)',
+    r'确定性[：:]\s*(高|中|低)',
+)]
+_POSITION_SUGGESTION_PATTERNS = {
+    label: [
+        re.compile(rf'{word}[型派].*?[：:]\s*(\d+[-–]\d+%|\d+%)'),
+        re.compile(rf'{word}.*?仓位.*?(\d+[-–]\d+%|\d+%)'),
+    ]
+    for label, word in (("激进型", "激进"), ("稳健型", "稳健"), ("保守型", "保守"))
+}
+
+
+# 各层标题（CLI 进度输出）
+LAYER_TITLES = {
+    1: "📊 第1层: 分析师团队并行分析 (5位分析师)",
+    2: "🗣️  第2层: 研究员团队辩论",
+    3: "💼 第3层: 交易员决策",
+    4: "⚖️  第4层: 风险评估与最终决策",
+}
+
+# 流水线中产出Agent观点的节点及其中文名称
+NODE_TITLES = {
+    AgentRole.FUNDAMENTALS_ANALYST.value: "基本面分析师",
+    AgentRole.SENTIMENT_ANALYST.value: "情绪分析师",
+    AgentRole.NEWS_ANALYST.value: "新闻分析师",
+    AgentRole.TECHNICAL_ANALYST.value: "技术分析师",
+    AgentRole.QUANT_ANALYST.value: "量化分析师",
+    AgentRole.BULLISH_RESEARCHER.value: "多头研究员",
+    AgentRole.BEARISH_RESEARCHER.value: "空头研究员",
+    AgentRole.TRADER.value: "交易员",
+    AgentRole.RISK_MANAGER_AGGRESSIVE.value: "激进派风险经理",
+    AgentRole.RISK_MANAGER_NEUTRAL.value: "中立派风险经理",
+    AgentRole.RISK_MANAGER_CONSERVATIVE.value: "保守派风险经理",
+    AgentRole.PORTFOLIO_MANAGER.value: "投资组合经理",
+}
+
+
 @dataclass
 class AgentOutput:
     """单个Agent的输出"""
@@ -87,6 +339,27 @@ class AgentOutput:
     score: Optional[float] = None
     timestamp: str = field(default_factory=lambda: datetime.now().strftime("%H:%M:%S"))
     metadata: Dict[str, Any] = field(default_factory=dict)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        return {
+            "role": self.role.value,
+            "content": self.content,
+            "score": self.score,
+            "timestamp": self.timestamp,
+            "metadata": self.metadata,
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AgentOutput':
+        """从 to_dict 的结果还原"""
+        return cls(
+            role=AgentRole(data["role"]),
+            content=data["content"],
+            score=data.get("score"),
+            timestamp=data.get("timestamp") or datetime.now().strftime("%H:%M:%S"),
+            metadata=data.get("metadata") or {}
+        )
 
 
 @dataclass
@@ -98,6 +371,29 @@ class AnalystTeamReport:
     technical: AgentOutput
     quant: Optional[AgentOutput] = None  # NEW: 量化分析师
     timestamp: str = field(default_factory=lambda: datetime.now().strftime("%H:%M:%S"))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        return {
+            "fundamentals": self.fundamentals.to_dict(),
+            "sentiment": self.sentiment.to_dict(),
+            "news": self.news.to_dict(),
+            "technical": self.technical.to_dict(),
+            "quant": self.quant.to_dict() if self.quant else None,
+            "timestamp": self.timestamp,
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AnalystTeamReport':
+        """从 to_dict 的结果还原"""
+        return cls(
+            fundamentals=AgentOutput.from_dict(data["fundamentals"]),
+            sentiment=AgentOutput.from_dict(data["sentiment"]),
+            news=AgentOutput.from_dict(data["news"]),
+            technical=AgentOutput.from_dict(data["technical"]),
+            quant=AgentOutput.from_dict(data["quant"]) if data.get("quant") else None,
+            timestamp=data.get("timestamp") or datetime.now().strftime("%H:%M:%S")
+        )
 
 
 @dataclass
@@ -139,6 +435,35 @@ class FinalDecision:
     timestamp: str = field(default_factory=lambda: datetime.now().strftime("%H:%M:%S"))
 
 
+@dataclass
+class _AnalystSpec:
+    """分析师定义：数据工具和提示词"""
+    label: str  # 失败信息中的名称，如"基本面"
+    scored: bool  # 是否从输出中提取评分
+    tool_calls: Callable[[str], Dict[str, Tuple[BaseTool, Dict[str, Any]]]]
+    prompt: Callable[[str, Dict[str, Any]], ChatPromptTemplate]
+    trim_order: Tuple[str, ...] = ()  # 超出提示词预算时依次裁剪的工具输出（优先级低的在前）
+
+
+@dataclass
+class _LLMReply:
+    """一次LLM调用的结果"""
+    content: str  # 正文（结构化模式下已去掉 JSON 代码块）
+    data: Any = None  # 校验后的结构化数据（pydantic 模型），未启用或解析失败时为 None
+    structured: Optional[str] = None  # 结构化解析结果: parsed / repaired / failed
+    
+    def metadata(self) -> Dict[str, Any]:
+        return {"structured": self.structured} if self.structured else {}
+
+
+@dataclass
+class _LLMRoute:
+    """某个角色使用的模型（同一模型共用并发窗口）"""
+    model: str
+    llm: Any
+    limiter: AdaptiveLimiter
+
+
 @dataclass
 class EnhancedAnalysisResult:
     """完整的增强版分析结果"""
@@ -153,6 +478,7 @@ class EnhancedAnalysisResult:
     risk_assessment: RiskAssessment
     final_decision: FinalDecision
     # Metadata
+    report_id: Optional[str] = None  # 分析师报告ID，可用于只重跑第2-4层
     timestamp: str = field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
 
@@ -174,7 +500,11 @@ class EnhancedMultiAgentSystem:
         base_url: Optional[str] = None,
         debate_threshold: float = 3.0,
         max_debate_rounds: int = 2,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        use_llm_cache: bool = True,
+        use_analyst_cache: bool = True,
+        role_models: Optional[Dict[str, Dict[str, Any]]] = None,
+        structured_output: Optional[bool] = None
     ):
         """
         初始化增强版多Agent系统
@@ -186,436 +516,870 @@ class EnhancedMultiAgentSystem:
             debate_threshold: 触发辩论的评分差异阈值
             max_debate_rounds: 最大辩论轮次
             temperature: LLM温度参数
+            use_llm_cache: 是否使用LLM响应缓存（需在配置中启用 llm_cache_enabled）
+            use_analyst_cache: 是否复用/写入共享的分析师结果缓存
+            role_models: 按角色的模型路由表（格式见 resolve_role_models），覆盖 Settings.llm_role_models；
+                未配置的角色使用 model 和 temperature
+            structured_output: 是否要求评分/决策类角色附带 JSON 结构化结论（默认取 Settings.llm_structured_output）
         """
         load_dotenv()
         
         # LLM配置
-        self.llm = ChatOpenAI(
-            model=model,
-            api_key=api_key or os.getenv("api-key"),
-            base_url=base_url or os.getenv("base-url"),
-            temperature=temperature
+        settings = get_settings()
+        base_url = base_url or os.getenv("base-url")
+        api_key = api_key or os.getenv("api-key")
+        self.base_url = base_url
+        
+        def make_route(route_model: str, route_temperature: float, max_tokens: Optional[int] = None) -> _LLMRoute:
+            # 同一配置的请求共享客户端和HTTP长连接；同一API地址+模型的所有调用共用一个自适应并发窗口
+            return _LLMRoute(
+                model=route_model,
+                llm=get_chat_model(
+                    model=route_model,
+                    api_key=api_key,
+                    base_url=base_url,
+                    temperature=route_temperature,
+                    use_cache=use_llm_cache,
+                    max_tokens=max_tokens
+                ),
+                limiter=get_llm_limiter(base_url, route_model)
+            )
+        
+        self._default_route = make_route(model, temperature)
+        self.llm = self._default_route.llm
+        
+        # 按角色路由模型：摘要类的分析师用快速便宜的模型，交易员和投资组合经理用更强的模型
+        settings_routes = json.loads(settings.llm_role_models) if settings.llm_role_models else None
+        self._routes: Dict[AgentRole, _LLMRoute] = {
+            role: make_route(
+                config.get("model", model),
+                config.get("temperature", temperature),
+                config.get("max_tokens")
+            )
+            for role, config in resolve_role_models(settings_routes, role_models).items()
+        }
+        
+        # 按角色的提示词 token 预算（未配置的角色使用 llm_prompt_tokens）
+        self._prompt_budgets = resolve_role_prompt_tokens(
+            json.loads(settings.llm_role_prompt_tokens) if settings.llm_role_prompt_tokens else None
         )
         
+        # 主模型超时后改用的备用模型
+        self._fallback_route = None
+        if settings.llm_fallback_model:
+            self._fallback_route = make_route(settings.llm_fallback_model, temperature)
+        
+        # 分析师结果缓存（所有请求和入口共享）
+        self.model = model
+        self.analyst_cache = get_analyst_cache() if use_analyst_cache else None
+        
         # 参数配置
+        self.structured_output = (
+            settings.llm_structured_output if structured_output is None else structured_output
+        )
         self.debate_threshold = debate_threshold
         self.max_debate_rounds = max_debate_rounds
+        
+        # 分析师定义（流水线按此顺序构建第1层）
+        self._analysts = self._build_analysts()
+        
+        # 以下仅在 run_pipeline 执行期间设置：LLM增量输出回调、LLM调用事件回调、时间预算截止时刻
+        self._on_delta: Optional[Callable[[AgentRole, str], None]] = None
+        self._on_llm_event: Optional[Callable[[AgentRole, Dict[str, Any]], None]] = None
+        self._deadline: Optional[float] = None
     
     def run_analysis(
         self,
         symbol: str,
-        verbose: bool = True
+        verbose: bool = True,
+        analyst_report: Union[None, str, AnalystTeamReport] = None
     ) -> EnhancedAnalysisResult:
         """
         运行完整的增强版多Agent分析流程
-        
+
         Args:
             symbol: 股票代码
             verbose: 是否打印详细信息
-            
+            analyst_report: 已有的分析师报告（报告ID或 AnalystTeamReport），
+                给出时跳过第1层，只用新的参数重跑研究员、交易员、风险和投资组合经理
+
         Returns:
             EnhancedAnalysisResult对象
         """
-        # ========== Layer 1: Analyst Team ==========
+        on_event = None
         if verbose:
-            print(f"\n{'='*70}")
-            print("📊 第1层: 分析师团队并行分析 (5位分析师)")
-            print(f"{'='*70}")
-        
-        analyst_team = self._run_analyst_team(symbol, verbose)
-        
-        # ========== Layer 2: Researcher Team ==========
+            started_layers = set()
+
+            def on_event(event: NodeEvent) -> None:
+                if event.layer not in started_layers:
+                    started_layers.add(event.layer)
+                    print(f"\n{'='*70}")
+                    print(LAYER_TITLES[event.layer])
+                    print(f"{'='*70}")
+                if event.type == "node_done" and event.node in NODE_TITLES:
+                    score = getattr(event.result, "score", None)
+                    score_str = f" | 评分: {score}/10" if score else ""
+                    timing = "缓存" if event.cached else f"{event.elapsed:.1f}s"
+                    print(f"  ✅ [{NODE_TITLES[event.node]}] 完成{score_str} ({timing})")
+                elif event.type == "node_error":
+                    print(f"  ❌ [{NODE_TITLES.get(event.node, event.node)}] 失败: {event.error}")
+
+        on_llm_event = None
+        usage = TokenUsage()
         if verbose:
-            print(f"\n{'='*70}")
-            print("🗣️  第2层: 研究员团队辩论")
-            print(f"{'='*70}")
-        
-        researcher_debate = self._run_researcher_team(symbol, analyst_team, verbose)
-        
-        # ========== Layer 3: Trader ==========
+            def on_llm_event(role: AgentRole, info: Dict[str, Any]) -> None:
+                title = NODE_TITLES.get(role.value, role.value)
+                if info["event"] == "token_usage":
+                    usage.add(role.value, info)
+                elif info["event"] == "prompt_trimmed":
+                    print(
+                        f"  ✂ [{title}] 提示词约 {info['original_tokens']} tokens 超出预算 {info['budget']}，"
+                        f"已裁剪: {', '.join(info['sections'])}"
+                    )
+                elif info["event"] == "hedge":
+                    print(f"  ⏱ [{title}] {info['delay']:.1f}s 无响应，发出对冲请求")
+                elif info["event"] == "fallback":
+                    print(f"  ⏱ [{title}] 超过 {info['timeout']:.0f}s，改用备用模型 {info['model']}")
+                elif info["event"] == "timeout":
+                    print(f"  ⏱ [{title}] 超过 {info['timeout']:.0f}s 未完成")
+
+        report_id = None
+        if isinstance(analyst_report, str):
+            report_id = analyst_report
+            analyst_report = self.load_analyst_report(report_id, symbol)
+
+        result = self.run_pipeline(
+            symbol, on_event=on_event, verbose=verbose,
+            analyst_team=analyst_report, report_id=report_id,
+            on_llm_event=on_llm_event
+        )
+
         if verbose:
             print(f"\n{'='*70}")
-            print("💼 第3层: 交易员决策")
+            print("✅ 完整分析流程结束")
+            if usage.calls:
+                estimated = f"，其中 {usage.estimated_calls} 次为估算" if usage.estimated_calls else ""
+                print(
+                    f"🔢 LLM调用 {usage.calls} 次{estimated}: "
+                    f"提示词 {usage.prompt_tokens} tokens，回答 {usage.completion_tokens} tokens"
+                )
             print(f"{'='*70}")
-        
-        trader_decision = self._run_trader(symbol, analyst_team, researcher_debate, verbose)
-        
+
+        return result
+
+    def run_pipeline(
+        self,
+        symbol: str,
+        on_event: Optional[Callable[[NodeEvent], None]] = None,
+        verbose: bool = False,
+        analyst_team: Optional[AnalystTeamReport] = None,
+        report_id: Optional[str] = None,
+        on_delta: Optional[Callable[[AgentRole, str], None]] = None,
+        on_llm_event: Optional[Callable[[AgentRole, Dict[str, Any]], None]] = None
+    ) -> EnhancedAnalysisResult:
+        """
+        按依赖关系执行分析流水线（CLI 与 API 共用同一张图）
+
+        Args:
+            symbol: 股票代码
+            on_event: 节点事件回调（开始/完成/失败及耗时），在调用线程中触发
+            verbose: 节点内部是否打印详细信息
+            analyst_team: 已有的分析师报告，给出时第1层节点全部直接使用该报告
+            report_id: analyst_team 对应的报告ID；未给出时完成第1层后保存新报告
+            on_delta: LLM增量输出回调 (角色, 文本)，给出时所有LLM调用改为流式，在工作线程中触发
+            on_llm_event: LLM调用事件回调 (角色, 信息)，信息中 event 为:
+                hedge / timeout / fallback（发出对冲请求、超时、改用备用模型）、
+                retry（限流或服务端错误后重新排队重试）、prompt_trimmed（提示词超出预算被裁剪）、
+                token_usage（每次调用完成后的 token 用量）、
+                debate_round（多空研究员开始新一轮反驳，随后的增量文本属于该轮）
+
+        Returns:
+            EnhancedAnalysisResult对象
+        """
+        executor = PipelineExecutor(max_workers=get_settings().pipeline_concurrency)
+
+        self._begin_run(on_delta, on_llm_event)
+        try:
+            if analyst_team is not None:
+                # What-if 重跑：第1层全部使用已有报告，只执行第2-4层
+                results = executor.run(
+                    self.build_pipeline(symbol, verbose), on_event, self._rerun_initial(analyst_team)
+                )
+            else:
+                # 分析期间所有工具共享同一份日线快照，只下载一次
+                with market_data_session(symbol):
+                    cache_keys = self._analyst_cache_keys(symbol)
+                    graph = self.build_pipeline(symbol, verbose, cache_keys)
+                    results = executor.run(graph, on_event, self._cached_initial(cache_keys))
+                report_id = self._save_analyst_report(symbol, results["analyst_team"])
+        finally:
+            self._end_run()
+
+        return self._analysis_result(symbol, results, report_id)
+
+    async def arun_pipeline(
+        self,
+        symbol: str,
+        on_event: Optional[Callable[[NodeEvent], None]] = None,
+        verbose: bool = False,
+        analyst_team: Optional[AnalystTeamReport] = None,
+        report_id: Optional[str] = None,
+        on_delta: Optional[Callable[[AgentRole, str], None]] = None,
+        on_llm_event: Optional[Callable[[AgentRole, Dict[str, Any]], None]] = None
+    ) -> EnhancedAnalysisResult:
+        """
+        run_pipeline 的异步版本（API 使用）
+
+        LLM 调用使用 ainvoke/astream，数据工具提交到全局工具I/O线程池并在事件循环中等待，
+        一次分析不再占用专门的调度线程和节点线程。参数与 run_pipeline 相同，
+        on_event 和 on_delta 在事件循环中触发。
+        """
+        executor = AsyncPipelineExecutor(max_concurrency=get_settings().pipeline_concurrency)
+
+        self._begin_run(on_delta, on_llm_event)
+        try:
+            if analyst_team is not None:
+                results = await executor.run(
+                    self.build_pipeline(symbol, verbose), on_event, self._rerun_initial(analyst_team)
+                )
+            else:
+                with market_data_session(symbol):
+                    cache_keys = await asyncio.to_thread(self._analyst_cache_keys, symbol)
+                    graph = self.build_pipeline(symbol, verbose, cache_keys)
+                    results = await executor.run(graph, on_event, self._cached_initial(cache_keys))
+                report_id = await asyncio.to_thread(
+                    self._save_analyst_report, symbol, results["analyst_team"]
+                )
+        finally:
+            self._end_run()
+
+        return self._analysis_result(symbol, results, report_id)
+
+    def _begin_run(
+        self,
+        on_delta: Optional[Callable[[AgentRole, str], None]],
+        on_llm_event: Optional[Callable[[AgentRole, Dict[str, Any]], None]]
+    ) -> None:
+        """设置本次运行的回调，并按 llm_request_budget 开始计时"""
+        budget = get_settings().llm_request_budget
+        self._on_delta = on_delta
+        self._on_llm_event = on_llm_event
+        self._deadline = time.monotonic() + budget if budget > 0 else None
+    
+    def _end_run(self) -> None:
+        self._on_delta = None
+        self._on_llm_event = None
+        self._deadline = None
+    
+    def build_pipeline(
+        self,
+        symbol: str,
+        verbose: bool = False,
+        cache_keys: Optional[Dict[str, Hashable]] = None
+    ) -> PipelineGraph:
+        """
+        构建分析流水线
+
+        每位分析师拆分为"数据获取"和"LLM分析"两个节点：某位分析师的数据一就绪
+        就开始调用LLM，不必等待其他分析师的数据。之后各层只依赖真正需要的输入。
+        每个节点同时提供同步实现（func）和异步实现（afunc）。
+
+        Args:
+            symbol: 股票代码
+            verbose: 节点内部是否打印详细信息
+            cache_keys: {分析师节点: 缓存键}，分析师完成后将结果写入共享缓存
+
+        Returns:
+            PipelineGraph对象
+        """
+        risk_roles = [
+            AgentRole.RISK_MANAGER_AGGRESSIVE,
+            AgentRole.RISK_MANAGER_NEUTRAL,
+            AgentRole.RISK_MANAGER_CONSERVATIVE,
+        ]
+
+        cache_keys = cache_keys or {}
+        nodes: List[PipelineNode] = []
+
+        # ========== Layer 1: Analyst Team ==========
+        for role, spec in self._analysts.items():
+            data_node = f"{role.value}_data"
+            # 数据获取失败不中断流水线，由分析节点生成"分析失败"的输出
+            nodes.append(PipelineNode(
+                name=data_node,
+                func=lambda inputs, spec=spec: invoke_tools_concurrently(spec.tool_calls(symbol)),
+                afunc=lambda inputs, spec=spec: ainvoke_tools_concurrently(spec.tool_calls(symbol)),
+                layer=1,
+                tolerate_errors=True
+            ))
+            nodes.append(PipelineNode(
+                name=role.value,
+                func=lambda inputs, role=role, data_node=data_node, key=cache_keys.get(role.value): (
+                    self._run_analyst(role, symbol, inputs[data_node], key)
+                ),
+                afunc=lambda inputs, role=role, data_node=data_node, key=cache_keys.get(role.value): (
+                    self._arun_analyst(role, symbol, inputs[data_node], key)
+                ),
+                inputs=[data_node],
+                layer=1
+            ))
+        nodes.append(PipelineNode(
+            name="analyst_team",
+            func=lambda inputs: AnalystTeamReport(
+                fundamentals=inputs[AgentRole.FUNDAMENTALS_ANALYST.value],
+                sentiment=inputs[AgentRole.SENTIMENT_ANALYST.value],
+                news=inputs[AgentRole.NEWS_ANALYST.value],
+                technical=inputs[AgentRole.TECHNICAL_ANALYST.value],
+                quant=inputs[AgentRole.QUANT_ANALYST.value]
+            ),
+            inputs=[role.value for role in self._analysts],
+            layer=1,
+            inline=True
+        ))
+        # 每份分析师报告只提炼一次摘要，第2、3层复用
+        nodes.append(PipelineNode(
+            name="analyst_digest",
+            func=lambda inputs: self._digest_analyst_team(inputs["analyst_team"]),
+            inputs=["analyst_team"],
+            layer=1,
+            inline=True
+        ))
+
+        # ========== Layer 2: Researcher Team ==========
+        # 多空研究员只依赖分析师报告摘要，相互独立
+        for role in (AgentRole.BULLISH_RESEARCHER, AgentRole.BEARISH_RESEARCHER):
+            nodes.append(PipelineNode(
+                name=role.value,
+                func=lambda inputs, role=role: self._run_researcher(role, inputs["analyst_digest"]),
+                afunc=lambda inputs, role=role: self._arun_researcher(role, inputs["analyst_digest"]),
+                inputs=["analyst_digest"],
+                layer=2
+            ))
+        debate_args = lambda inputs: (
+            inputs["analyst_digest"],
+            inputs[AgentRole.BULLISH_RESEARCHER.value],
+            inputs[AgentRole.BEARISH_RESEARCHER.value],
+            verbose
+        )
+        nodes.append(PipelineNode(
+            name="researcher_debate",
+            func=lambda inputs: self._run_researcher_debate(*debate_args(inputs)),
+            afunc=lambda inputs: self._arun_researcher_debate(*debate_args(inputs)),
+            inputs=["analyst_digest", AgentRole.BULLISH_RESEARCHER.value, AgentRole.BEARISH_RESEARCHER.value],
+            layer=2
+        ))
+
+        # ========== Layer 3: Trader ==========
+        trader_args = lambda inputs: (symbol, inputs["analyst_digest"], inputs["researcher_debate"], verbose)
+        nodes.append(PipelineNode(
+            name="trader",
+            func=lambda inputs: self._run_trader(*trader_args(inputs)),
+            afunc=lambda inputs: self._arun_trader(*trader_args(inputs)),
+            inputs=["analyst_digest", "researcher_debate"],
+            layer=3
+        ))
+
         # ========== Layer 4: Risk & Portfolio ==========
-        if verbose:
-            print(f"\n{'='*70}")
-            print("⚖️  第4层: 风险评估与最终决策")
-            print(f"{'='*70}")
-        
-        risk_assessment = self._run_risk_management(trader_decision, verbose)
-        final_decision = self._run_portfolio_manager(
-            symbol, analyst_team, researcher_debate, trader_decision, risk_assessment, verbose
+        # 三位风险经理评估同一份交易决策，相互独立
+        for role in risk_roles:
+            nodes.append(PipelineNode(
+                name=role.value,
+                func=lambda inputs, role=role: self._run_risk_manager(role, inputs["trader"]),
+                afunc=lambda inputs, role=role: self._arun_risk_manager(role, inputs["trader"]),
+                inputs=["trader"],
+                layer=4
+            ))
+        nodes.append(PipelineNode(
+            name="risk_assessment",
+            func=lambda inputs: RiskAssessment(
+                aggressive=inputs[AgentRole.RISK_MANAGER_AGGRESSIVE.value],
+                neutral=inputs[AgentRole.RISK_MANAGER_NEUTRAL.value],
+                conservative=inputs[AgentRole.RISK_MANAGER_CONSERVATIVE.value]
+            ),
+            inputs=[role.value for role in risk_roles],
+            layer=4,
+            inline=True
+        ))
+        portfolio_args = lambda inputs: (
+            symbol,
+            inputs["analyst_team"],
+            inputs["researcher_debate"],
+            inputs["trader"],
+            inputs["risk_assessment"],
+            verbose
         )
-        
-        # 构建完整结果
-        result = EnhancedAnalysisResult(
+        nodes.append(PipelineNode(
+            name="portfolio_manager",
+            func=lambda inputs: self._run_portfolio_manager(*portfolio_args(inputs)),
+            afunc=lambda inputs: self._arun_portfolio_manager(*portfolio_args(inputs)),
+            inputs=["analyst_team", "researcher_debate", "trader", "risk_assessment"],
+            layer=4
+        ))
+
+        return PipelineGraph(nodes)
+
+    def _rerun_initial(self, analyst_team: AnalystTeamReport) -> Dict[str, Any]:
+        """What-if 重跑：第1层所有节点直接使用已有报告"""
+        initial: Dict[str, Any] = {"analyst_team": analyst_team}
+        for node, output in self._analyst_outputs(analyst_team).items():
+            initial[node] = output
+            initial[f"{node}_data"] = None
+        return initial
+
+    def _cached_initial(self, cache_keys: Dict[str, Hashable]) -> Dict[str, Any]:
+        """命中缓存的分析师直接作为已完成节点，连同其数据获取节点一起跳过"""
+        initial: Dict[str, Any] = {}
+        for node, key in cache_keys.items():
+            output = self.analyst_cache.get(key)
+            if output is not None:
+                initial[node] = output
+                initial[f"{node}_data"] = None
+        return initial
+
+    @staticmethod
+    def _analysis_result(symbol: str, results: Dict[str, Any], report_id: Optional[str]) -> EnhancedAnalysisResult:
+        """由流水线输出组装完整结果"""
+        return EnhancedAnalysisResult(
+            report_id=report_id,
             symbol=symbol,
-            analyst_team=analyst_team,
-            researcher_debate=researcher_debate,
-            trader_decision=trader_decision,
-            risk_assessment=risk_assessment,
-            final_decision=final_decision
+            analyst_team=results["analyst_team"],
+            researcher_debate=results["researcher_debate"],
+            trader_decision=results["trader"],
+            risk_assessment=results["risk_assessment"],
+            final_decision=results["portfolio_manager"]
         )
+    
+    # ==================== Analyst Reports ====================
+    
+    @staticmethod
+    def _analyst_outputs(analyst_team: AnalystTeamReport) -> Dict[str, AgentOutput]:
+        """{分析师节点: 输出}"""
+        outputs = {
+            AgentRole.FUNDAMENTALS_ANALYST.value: analyst_team.fundamentals,
+            AgentRole.SENTIMENT_ANALYST.value: analyst_team.sentiment,
+            AgentRole.NEWS_ANALYST.value: analyst_team.news,
+            AgentRole.TECHNICAL_ANALYST.value: analyst_team.technical,
+        }
+        outputs[AgentRole.QUANT_ANALYST.value] = analyst_team.quant or AgentOutput(
+            role=AgentRole.QUANT_ANALYST,
+            content="无量化分析",
+            metadata={"failed": True}
+        )
+        return outputs
+    
+    def _save_analyst_report(self, symbol: str, analyst_team: AnalystTeamReport) -> Optional[str]:
+        """保存分析师报告，失败时不影响分析结果"""
+        try:
+            return save_report(symbol, analyst_team.to_dict(), model=self.model)
+        except Exception as e:
+            print(f"[WARN] 分析师报告保存失败: {e}")
+            return None
+    
+    @staticmethod
+    def load_analyst_report(report_id: str, symbol: Optional[str] = None) -> AnalystTeamReport:
+        """
+        按ID读取已保存的分析师报告
         
-        if verbose:
-            print(f"\n{'='*70}")
-            print("✅ 完整分析流程结束")
-            print(f"{'='*70}")
-        
-        return result
+        Args:
+            report_id: 报告ID
+            symbol: 期望的股票代码，给出时校验报告是否属于该股票
+            
+        Returns:
+            AnalystTeamReport对象
+            
+        Raises:
+            ValueError: 报告ID无效或与股票代码不符
+            FileNotFoundError: 报告不存在
+        """
+        data = load_report(report_id)
+        if symbol and data.get("symbol") != symbol:
+            raise ValueError(f"报告 {report_id} 属于股票 {data.get('symbol')}，而不是 {symbol}")
+        return AnalystTeamReport.from_dict(data["analyst_team"])
     
     # ==================== Layer 1: Analyst Team ====================
     
-    def _run_analyst_team(
+    def _build_analysts(self) -> Dict[AgentRole, "_AnalystSpec"]:
+        """各分析师的数据工具和提示词（同步和异步路径共用）"""
+        return {
+            AgentRole.FUNDAMENTALS_ANALYST: _AnalystSpec(
+                "基本面", True, self._fundamentals_tool_calls, self._fundamentals_prompt,
+                ("financials", "metrics", "intrinsic_value", "red_flags")
+            ),
+            AgentRole.SENTIMENT_ANALYST: _AnalystSpec(
+                "情绪", False, self._sentiment_tool_calls, self._sentiment_prompt,
+                ("market_mood", "social_sentiment", "sentiment_score")
+            ),
+            AgentRole.NEWS_ANALYST: _AnalystSpec(
+                "新闻", False, self._news_tool_calls, self._news_prompt,
+                ("global_news", "macro_indicators", "event_impact", "news_sentiment")
+            ),
+            AgentRole.TECHNICAL_ANALYST: _AnalystSpec(
+                "技术", True, self._technical_tool_calls, self._technical_prompt,
+                ("history", "industry", "indicators")
+            ),
+            AgentRole.QUANT_ANALYST: _AnalystSpec(
+                "量化", True, self._quant_tool_calls, self._quant_prompt,
+                ("dragon_tiger", "northbound", "quant_signals", "sharpe", "max_drawdown", "beta",
+                 "volatility", "factor_score")
+            ),
+        }
+    
+    def _analyst_cache_keys(self, symbol: str) -> Dict[str, Hashable]:
+        """各分析师的缓存键；未启用缓存或无法计算数据指纹时返回空字典"""
+        if self.analyst_cache is None:
+            return {}
+        fingerprint = analyst_data_fingerprint(symbol)
+        if fingerprint is None:
+            return {}
+        return {
+            role.value: analyst_cache_key(symbol, role.value, self._analyst_cache_config(role), fingerprint)
+            for role in self._analysts
+        }
+    
+    def _analyst_cache_config(self, role: AgentRole) -> Dict[str, Any]:
+        """影响分析师输出的配置：模型路由和提示词设置，任一不同则不共享缓存结果"""
+        route = self._route(role)
+        return {
+            "base_url": self.base_url,
+            "model": route.model,
+            "temperature": getattr(route.llm, "temperature", None),
+            "max_tokens": getattr(route.llm, "max_tokens", None),
+            "structured_output": self.structured_output,
+            "prompt_budget": self._prompt_budget(role),
+        }
+    
+    def _remember_analyst_output(self, key: Optional[Hashable], output: AgentOutput) -> AgentOutput:
+        """将成功的分析师输出写入共享缓存"""
+        if self.analyst_cache is not None and key is not None and not output.metadata.get("failed"):
+            self.analyst_cache.set(key, output)
+        return output
+    
+    def _run_analyst(
         self,
+        role: AgentRole,
         symbol: str,
-        verbose: bool
-    ) -> AnalystTeamReport:
-        """运行分析师团队（5个专业分析师真正并行执行）"""
-        
-        if verbose:
-            print("⚡ 5位分析师并行执行中，预计节省60-70%等待时间...")
-        
-        analyst_tasks = {
-            "fundamentals": lambda: self._run_fundamentals_analyst(symbol, verbose),
-            "sentiment":    lambda: self._run_sentiment_analyst(symbol, verbose),
-            "news":         lambda: self._run_news_analyst(symbol, verbose),
-            "technical":    lambda: self._run_technical_analyst(symbol, verbose),
-            "quant":        lambda: self._run_quant_analyst(symbol, verbose),
-        }
-        
-        results: Dict[str, AgentOutput] = {}
-        
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            future_to_name = {
-                executor.submit(task): name
-                for name, task in analyst_tasks.items()
-            }
-            for future in as_completed(future_to_name):
-                name = future_to_name[future]
-                try:
-                    results[name] = future.result()
-                    if verbose:
-                        score_str = f" | 评分: {results[name].score}/10" if results[name].score else ""
-                        analyst_names = {
-                            "fundamentals": "基本面分析师",
-                            "sentiment": "情绪分析师",
-                            "news": "新闻分析师",
-                            "technical": "技术分析师",
-                            "quant": "量化分析师",
-                        }
-                        print(f"  ✅ [{analyst_names.get(name, name)}] 完成{score_str}")
-                except Exception as e:
-                    if verbose:
-                        print(f"  ❌ [{name}] 失败: {e}")
-                    results[name] = AgentOutput(
-                        role=AgentRole.FUNDAMENTALS_ANALYST,
-                        content=f"{name}分析失败: {str(e)}",
-                        score=5.0
-                    )
+        data: Any = None,
+        cache_key: Optional[Hashable] = None
+    ) -> AgentOutput:
+        """
+        运行单个分析师
         
-        return AnalystTeamReport(
-            fundamentals=results["fundamentals"],
-            sentiment=results["sentiment"],
-            news=results["news"],
-            technical=results["technical"],
-            quant=results["quant"]
+        Args:
+            role: 分析师角色
+            symbol: 股票代码
+            data: 流水线中由数据节点预先获取的工具输出（失败时为异常对象）；为 None 时现场获取
+            cache_key: 共享缓存键，成功的输出写入缓存
+        """
+        spec = self._analysts[role]
+        try:
+            if data is None:
+                data = invoke_tools_concurrently(spec.tool_calls(symbol))
+            if isinstance(data, BaseException):
+                raise data
+            output = self._analyst_output(role, self._invoke_llm(role, self._analyst_prompt(role, symbol, data)))
+        except Exception as e:
+            output = self._analyst_failure(role, e)
+        return self._remember_analyst_output(cache_key, output)
+    
+    async def _arun_analyst(
+        self,
+        role: AgentRole,
+        symbol: str,
+        data: Any = None,
+        cache_key: Optional[Hashable] = None
+    ) -> AgentOutput:
+        """_run_analyst 的异步版本"""
+        spec = self._analysts[role]
+        try:
+            if data is None:
+                data = await ainvoke_tools_concurrently(spec.tool_calls(symbol))
+            if isinstance(data, BaseException):
+                raise data
+            output = self._analyst_output(role, await self._ainvoke_llm(role, self._analyst_prompt(role, symbol, data)))
+        except Exception as e:
+            output = self._analyst_failure(role, e)
+        return self._remember_analyst_output(cache_key, output)
+    
+    def _analyst_prompt(self, role: AgentRole, symbol: str, data: Dict[str, Any]) -> ChatPromptTemplate:
+        """分析师提示词（工具输出取紧凑文本，超出预算时按 trim_order 裁剪）"""
+        spec = self._analysts[role]
+        return self._fit_prompt(
+            role, lambda sections: spec.prompt(symbol, sections), _render_tool_data(data), spec.trim_order
         )
     
-    def _run_fundamentals_analyst(self, symbol: str, verbose: bool) -> AgentOutput:
+    def _analyst_output(self, role: AgentRole, reply: "_LLMReply") -> AgentOutput:
+        """分析师输出（打分的分析师同时给出评分）"""
+        score = self._reply_score(reply) if self._analysts[role].scored else None
+        return AgentOutput(role=role, content=reply.content, score=score, metadata=reply.metadata())
+    
+    def _analyst_failure(self, role: AgentRole, error: Exception) -> AgentOutput:
+        """分析失败时的输出（打分的分析师给中性评分5分）"""
+        spec = self._analysts[role]
+        return AgentOutput(
+            role=role,
+            content=f"{spec.label}分析失败: {str(error)}",
+            score=5.0 if spec.scored else None,
+            metadata={"failed": True}
+        )
+    
+    def _fundamentals_tool_calls(self, symbol: str) -> Dict[str, Tuple[BaseTool, Dict[str, Any]]]:
+        """基本面分析师数据工具"""
+        return {
+            "financials": (get_company_financials, {"symbol": symbol}),
+            "intrinsic_value": (calculate_intrinsic_value, {"symbol": symbol}),
+            "metrics": (get_performance_metrics, {"symbol": symbol}),
+            "red_flags": (identify_red_flags, {"symbol": symbol}),
+        }
+    
+    def _fundamentals_prompt(self, symbol: str, data: Dict[str, Any]) -> ChatPromptTemplate:
         """基本面分析师"""
-        try:
-            # 获取财务数据
-            financials = get_company_financials.invoke({"symbol": symbol})
-            intrinsic_value = calculate_intrinsic_value.invoke({"symbol": symbol})
-            metrics = get_performance_metrics.invoke({"symbol": symbol})
-            red_flags = identify_red_flags.invoke({"symbol": symbol})
-            
-            # LLM分析
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", get_prompt_by_role("fundamentals_analyst")),
-                ("user", f"""请分析股票 {symbol} 的基本面:
+        return ChatPromptTemplate.from_messages([
+            ("system", get_prompt_by_role("fundamentals_analyst")),
+            ("user", f"""请分析股票 {symbol} 的基本面:
 
 【财务数据】
-{financials}
+{data['financials']}
 
 【内在价值评估】
-{intrinsic_value}
+{data['intrinsic_value']}
 
 【业绩指标】
-{metrics}
+{data['metrics']}
 
 【财务风险识别】
-{red_flags}
+{data['red_flags']}
 
 请给出基本面评分(1-10分)和分析。""")
-            ])
-            
-            response = (prompt | self.llm).invoke({})
-            score = self._extract_score(response.content)
-            
-            return AgentOutput(
-                role=AgentRole.FUNDAMENTALS_ANALYST,
-                content=response.content,
-                score=score
-            )
-        except Exception as e:
-            return AgentOutput(
-                role=AgentRole.FUNDAMENTALS_ANALYST,
-                content=f"基本面分析失败: {str(e)}",
-                score=5.0
-            )
+        ])
     
-    def _run_sentiment_analyst(self, symbol: str, verbose: bool) -> AgentOutput:
+    def _sentiment_tool_calls(self, symbol: str) -> Dict[str, Tuple[BaseTool, Dict[str, Any]]]:
+        """情绪分析师数据工具"""
+        return {
+            "social_sentiment": (analyze_social_media_sentiment, {"symbol": symbol}),
+            "sentiment_score": (get_public_sentiment_score, {"symbol": symbol}),
+            "market_mood": (track_market_mood, {}),
+        }
+    
+    def _sentiment_prompt(self, symbol: str, data: Dict[str, Any]) -> ChatPromptTemplate:
         """情绪分析师"""
-        try:
-            # 获取情绪数据
-            social_sentiment = analyze_social_media_sentiment.invoke({"symbol": symbol})
-            sentiment_score = get_public_sentiment_score.invoke({"symbol": symbol})
-            market_mood = track_market_mood.invoke({})
-            
-            # LLM分析
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", get_prompt_by_role("sentiment_analyst")),
-                ("user", f"""请分析股票 {symbol} 的市场情绪:
+        return ChatPromptTemplate.from_messages([
+            ("system", get_prompt_by_role("sentiment_analyst")),
+            ("user", f"""请分析股票 {symbol} 的市场情绪:
 
 【社交媒体情绪】
-{social_sentiment}
+{data['social_sentiment']}
 
 【公众情绪评分】
-{sentiment_score}
+{data['sentiment_score']}
 
 【市场整体情绪】
-{market_mood}
+{data['market_mood']}
 
 请给出情绪面分析和投资启示。""")
-            ])
-            
-            response = (prompt | self.llm).invoke({})
-            
-            return AgentOutput(
-                role=AgentRole.SENTIMENT_ANALYST,
-                content=response.content
-            )
-        except Exception as e:
-            return AgentOutput(
-                role=AgentRole.SENTIMENT_ANALYST,
-                content=f"情绪分析失败: {str(e)}"
-            )
+        ])
+    
+    def _news_tool_calls(self, symbol: str) -> Dict[str, Tuple[BaseTool, Dict[str, Any]]]:
+        """新闻分析师数据工具"""
+        return {
+            "news_sentiment": (analyze_news_sentiment, {"symbol": symbol, "max_news": 10}),
+            "macro_indicators": (get_macroeconomic_indicators, {}),
+            "event_impact": (assess_event_impact, {"symbol": symbol}),
+            "global_news": (get_global_market_news, {"max_news": 5}),
+        }
     
-    def _run_news_analyst(self, symbol: str, verbose: bool) -> AgentOutput:
+    def _news_prompt(self, symbol: str, data: Dict[str, Any]) -> ChatPromptTemplate:
         """新闻分析师"""
-        try:
-            # 获取新闻数据
-            news_sentiment = analyze_news_sentiment.invoke({"symbol": symbol, "max_news": 10})
-            macro_indicators = get_macroeconomic_indicators.invoke({})
-            event_impact = assess_event_impact.invoke({"symbol": symbol})
-            global_news = get_global_market_news.invoke({"max_news": 5})
-            
-            # LLM分析
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", get_prompt_by_role("news_analyst")),
-                ("user", f"""请分析股票 {symbol} 的新闻面:
+        return ChatPromptTemplate.from_messages([
+            ("system", get_prompt_by_role("news_analyst")),
+            ("user", f"""请分析股票 {symbol} 的新闻面:
 
 【新闻情感分析】
-{news_sentiment}
+{data['news_sentiment']}
 
 【宏观经济指标】
-{macro_indicators}
+{data['macro_indicators']}
 
 【事件影响评估】
-{event_impact}
+{data['event_impact']}
 
 【全球市场动态】
-{global_news}
+{data['global_news']}
 
 请给出新闻面综合判断。""")
-            ])
-            
-            response = (prompt | self.llm).invoke({})
-            
-            return AgentOutput(
-                role=AgentRole.NEWS_ANALYST,
-                content=response.content
-            )
-        except Exception as e:
-            return AgentOutput(
-                role=AgentRole.NEWS_ANALYST,
-                content=f"新闻分析失败: {str(e)}"
-            )
+        ])
     
-    def _run_technical_analyst(self, symbol: str, verbose: bool) -> AgentOutput:
+    def _technical_tool_calls(self, symbol: str) -> Dict[str, Tuple[BaseTool, Dict[str, Any]]]:
+        """技术分析师数据工具"""
+        return {
+            "indicators": (get_stock_technical_indicators, {"symbol": symbol}),
+            "history": (get_stock_history, {"symbol": symbol}),
+            "industry": (get_industry_comparison, {"symbol": symbol}),
+        }
+    
+    def _technical_prompt(self, symbol: str, data: Dict[str, Any]) -> ChatPromptTemplate:
         """技术分析师"""
-        try:
-            # 获取技术数据
-            indicators = get_stock_technical_indicators.invoke({"symbol": symbol})
-            history = get_stock_history.invoke({"symbol": symbol})
-            industry = get_industry_comparison.invoke({"symbol": symbol})
-            
-            # LLM分析
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", get_prompt_by_role("technical_analyst")),
-                ("user", f"""请分析股票 {symbol} 的技术面:
+        return ChatPromptTemplate.from_messages([
+            ("system", get_prompt_by_role("technical_analyst")),
+            ("user", f"""请分析股票 {symbol} 的技术面:
 
 【技术指标】
-{indicators}
+{data['indicators']}
 
 【历史行情】
-{history}
+{data['history']}
 
 【行业对比】
-{industry}
+{data['industry']}
 
 请给出技术面评分(1-10分)和分析。""")
-            ])
-            
-            response = (prompt | self.llm).invoke({})
-            score = self._extract_score(response.content)
-            
-            return AgentOutput(
-                role=AgentRole.TECHNICAL_ANALYST,
-                content=response.content,
-                score=score
-            )
-        except Exception as e:
-            return AgentOutput(
-                role=AgentRole.TECHNICAL_ANALYST,
-                content=f"技术分析失败: {str(e)}",
-                score=5.0
-            )
+        ])
     
-    def _run_quant_analyst(self, symbol: str, verbose: bool) -> AgentOutput:
-        """量化分析师 — 五因子模型 + 风险度量 + 量化信号 + A股特色数据"""
-        try:
+    def _quant_tool_calls(self, symbol: str) -> Dict[str, Tuple[BaseTool, Dict[str, Any]]]:
+        """量化分析师数据工具（8个相互独立的工具，耗时取决于最慢的一个）"""
+        return {
             # 五因子模型评分
-            factor_score = calculate_multi_factor_score.invoke({"symbol": symbol})
+            "factor_score": (calculate_multi_factor_score, {"symbol": symbol}),
             # 量化信号生成（均线/MACD/RSI）
-            quant_signals = generate_quant_signals.invoke({"symbol": symbol})
+            "quant_signals": (generate_quant_signals, {"symbol": symbol}),
             # 风险度量指标
-            volatility = calculate_volatility.invoke({"symbol": symbol})
-            beta = calculate_beta.invoke({"symbol": symbol})
-            max_drawdown = calculate_max_drawdown.invoke({"symbol": symbol})
-            sharpe = calculate_sharpe_ratio.invoke({"symbol": symbol})
+            "volatility": (calculate_volatility, {"symbol": symbol}),
+            "beta": (calculate_beta, {"symbol": symbol}),
+            "max_drawdown": (calculate_max_drawdown, {"symbol": symbol}),
+            "sharpe": (calculate_sharpe_ratio, {"symbol": symbol}),
             # A股特色数据：北向资金 + 龙虎榜
-            northbound = get_northbound_flow.invoke({"symbol": symbol})
-            dragon_tiger = get_dragon_tiger_board.invoke({"symbol": symbol})
-
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", get_prompt_by_role("quant_analyst")),
-                ("user", f"""请对股票 {symbol} 进行量化分析:
+            "northbound": (get_northbound_flow, {"symbol": symbol}),
+            "dragon_tiger": (get_dragon_tiger_board, {"symbol": symbol}),
+        }
+    
+    def _quant_prompt(self, symbol: str, data: Dict[str, Any]) -> ChatPromptTemplate:
+        """量化分析师 — 五因子模型 + 风险度量 + 量化信号 + A股特色数据"""
+        return ChatPromptTemplate.from_messages([
+            ("system", get_prompt_by_role("quant_analyst")),
+            ("user", f"""请对股票 {symbol} 进行量化分析:
 
 【五因子模型评分】
-{factor_score}
+{data['factor_score']}
 
 【量化交易信号】
-{quant_signals}
+{data['quant_signals']}
 
 【风险度量指标】
-年化波动率: {volatility}
-贝塔系数: {beta}
-最大回撤: {max_drawdown}
-夏普比率: {sharpe}
+年化波动率: {data['volatility']}
+贝塔系数: {data['beta']}
+最大回撤: {data['max_drawdown']}
+夏普比率: {data['sharpe']}
 
 【A股特色数据】
 北向资金动态:
-{northbound}
+{data['northbound']}
 
 龙虎榜情况:
-{dragon_tiger}
+{data['dragon_tiger']}
 
 请给出量化评分(1-10分)和综合量化判断，特别关注北向资金和龙虎榜对量化信号的验证作用。""")
-            ])
-
-            response = (prompt | self.llm).invoke({})
-            score = self._extract_score(response.content)
-
-            return AgentOutput(
-                role=AgentRole.QUANT_ANALYST,
-                content=response.content,
-                score=score
-            )
-        except Exception as e:
-            return AgentOutput(
-                role=AgentRole.QUANT_ANALYST,
-                content=f"量化分析失败: {str(e)}",
-                score=5.0
-            )
-
+        ])
+    
     # ==================== Layer 2: Researcher Team ====================
     
-    def _run_researcher_team(
-        self,
-        symbol: str,
-        analyst_team: AnalystTeamReport,
-        verbose: bool
-    ) -> ResearcherDebate:
-        """运行研究员团队（多空辩论）"""
-        
-        # 汇总分析师报告（含量化分析师）
-        quant_section = ""
+    def _digest_analyst_team(self, analyst_team: AnalystTeamReport) -> AnalystTeamDigest:
+        """将分析师报告提炼为固定大小的摘要（研究员、辩论和交易员共用）"""
+        max_tokens = get_settings().analyst_digest_tokens
+        reports = [
+            ("基本面分析", analyst_team.fundamentals),
+            ("情绪分析", analyst_team.sentiment),
+            ("新闻分析", analyst_team.news),
+            ("技术分析", analyst_team.technical),
+        ]
         if analyst_team.quant:
-            quant_section = f"\n\n【量化分析】\n{analyst_team.quant.content}"
-        
-        context = f"""【基本面分析】
-{analyst_team.fundamentals.content}
-
-【情绪分析】
-{analyst_team.sentiment.content}
-
-【新闻分析】
-{analyst_team.news.content}
-
-【技术分析】
-{analyst_team.technical.content}{quant_section}"""
-        
-        # Bullish Researcher
-        if verbose:
-            print("\n[多头研究员] 分析中...")
-        bullish_prompt = ChatPromptTemplate.from_messages([
-            ("system", get_prompt_by_role("bullish_researcher")),
-            ("user", f"基于以下分析报告，请给出多头观点:\n\n{context}")
+            reports.append(("量化分析", analyst_team.quant))
+        return AnalystTeamDigest([
+            digest_report(title, output.content, output.score, max_tokens)
+            for title, output in reports
         ])
-        bullish_response = (bullish_prompt | self.llm).invoke({})
-        bullish_score = self._extract_score(bullish_response.content)
-        
-        bullish = AgentOutput(
-            role=AgentRole.BULLISH_RESEARCHER,
-            content=bullish_response.content,
-            score=bullish_score
+    
+    def _researcher_prompt(self, role: AgentRole, analyst_digest: AnalystTeamDigest) -> ChatPromptTemplate:
+        """研究员初始观点提示词（多头/空头）"""
+        stance = "多头" if role == AgentRole.BULLISH_RESEARCHER else "空头"
+        return self._fit_prompt(role, lambda sections: ChatPromptTemplate.from_messages([
+            ("system", get_prompt_by_role(role.value)),
+            ("user", f"基于以下分析报告摘要，请给出{stance}观点:\n\n{sections['analyst_digest']}")
+        ]), {"analyst_digest": analyst_digest.render()}, ("analyst_digest",))
+    
+    def _run_researcher(
+        self,
+        role: AgentRole,
+        analyst_digest: AnalystTeamDigest
+    ) -> AgentOutput:
+        """单个研究员基于分析师报告摘要给出初始观点（多头/空头）"""
+        reply = self._invoke_llm(role, self._researcher_prompt(role, analyst_digest))
+        return AgentOutput(
+            role=role,
+            content=reply.content,
+            score=self._reply_score(reply),
+            metadata=reply.metadata()
         )
-        
-        # Bearish Researcher
-        if verbose:
-            print("[空头研究员] 分析中...")
-        bearish_prompt = ChatPromptTemplate.from_messages([
-            ("system", get_prompt_by_role("bearish_researcher")),
-            ("user", f"基于以下分析报告，请给出空头观点:\n\n{context}")
-        ])
-        bearish_response = (bearish_prompt | self.llm).invoke({})
-        bearish_score = self._extract_score(bearish_response.content)
-        
-        bearish = AgentOutput(
-            role=AgentRole.BEARISH_RESEARCHER,
-            content=bearish_response.content,
-            score=bearish_score
+    
+    async def _arun_researcher(
+        self,
+        role: AgentRole,
+        analyst_digest: AnalystTeamDigest
+    ) -> AgentOutput:
+        """_run_researcher 的异步版本"""
+        reply = await self._ainvoke_llm(role, self._researcher_prompt(role, analyst_digest))
+        return AgentOutput(
+            role=role,
+            content=reply.content,
+            score=self._reply_score(reply),
+            metadata=reply.metadata()
         )
-        
-        # 判断是否需要辩论
-        score_diff = abs(bullish_score - bearish_score)
+    
+    def _debate_needed(self, bullish: AgentOutput, bearish: AgentOutput, verbose: bool) -> Tuple[float, bool]:
+        """根据多空初始观点的评分差异决定是否辩论，返回 (评分差异, 是否辩论)"""
+        score_diff = abs(bullish.score - bearish.score)
         debate_occurred = score_diff >= self.debate_threshold
+        if debate_occurred and verbose:
+            print(f"\n⚡ 评分差异 {score_diff:.1f} >= {self.debate_threshold}，触发辩论！")
+        return score_diff, debate_occurred
+    
+    def _run_researcher_debate(
+        self,
+        analyst_digest: AnalystTeamDigest,
+        bullish: AgentOutput,
+        bearish: AgentOutput,
+        verbose: bool
+    ) -> ResearcherDebate:
+        """根据多空初始观点的评分差异决定是否辩论"""
+        score_diff, debate_occurred = self._debate_needed(bullish, bearish, verbose)
         
         debate_rounds = []
         if debate_occurred:
-            if verbose:
-                print(f"\n⚡ 评分差异 {score_diff:.1f} >= {self.debate_threshold}，触发辩论！")
-            
             # 运行完整辩论机制
             debate_rounds, bullish, bearish = self._run_debate(
-                bullish, bearish, context, verbose
+                bullish, bearish, self._debate_context(analyst_digest), verbose
+            )
+        
+        return ResearcherDebate(
+            bullish=bullish,
+            bearish=bearish,
+            score_diff=score_diff,
+            debate_occurred=debate_occurred,
+            debate_rounds=debate_rounds
+        )
+    
+    async def _arun_researcher_debate(
+        self,
+        analyst_digest: AnalystTeamDigest,
+        bullish: AgentOutput,
+        bearish: AgentOutput,
+        verbose: bool
+    ) -> ResearcherDebate:
+        """_run_researcher_debate 的异步版本"""
+        score_diff, debate_occurred = self._debate_needed(bullish, bearish, verbose)
+        
+        debate_rounds = []
+        if debate_occurred:
+            debate_rounds, bullish, bearish = await self._arun_debate(
+                bullish, bearish, self._debate_context(analyst_digest), verbose
             )
         
         return ResearcherDebate(
@@ -638,30 +1402,88 @@ class EnhancedMultiAgentSystem:
         Args:
             bullish: 多头研究员的初始观点
             bearish: 空头研究员的初始观点
-            context: 分析师报告上下文
+            context: 分析师报告摘要上下文
             verbose: 是否打印详细信息
             
         Returns:
             (debate_rounds, updated_bullish, updated_bearish)
+            更新后的观点为辩论记忆的压缩版本（初始要点 + 各轮要点 + 最近一轮反驳），
+            各轮反驳全文保存在 debate_rounds 中
         """
         debate_rounds = []
+        state = DebateState(bullish.content, bearish.content, self._debate_view_tokens())
         
         for round_num in range(1, self.max_debate_rounds + 1):
             if verbose:
                 print(f"\n--- 辩论第 {round_num} 轮 ---")
-            
-            # 多头反驳空头
+                print("[多头] [空头] 并行反驳中...")
+            self._emit_debate_round(round_num)
+            # 多头反驳空头、空头反驳多头都只依赖上一轮观点，同一轮内并行执行
+            responses = self._invoke_prompts_concurrently(self._rebuttal_prompts(state, context))
+            record, bullish, bearish, converged = self._apply_rebuttals(
+                round_num, state, responses, verbose
+            )
+            debate_rounds.append(record)
+            if converged:
+                break
+        
+        return debate_rounds, bullish, bearish
+    
+    async def _arun_debate(
+        self,
+        bullish: AgentOutput,
+        bearish: AgentOutput,
+        context: str,
+        verbose: bool
+    ) -> tuple:
+        """_run_debate 的异步版本"""
+        debate_rounds = []
+        state = DebateState(bullish.content, bearish.content, self._debate_view_tokens())
+        
+        for round_num in range(1, self.max_debate_rounds + 1):
             if verbose:
-                print("[多头] 反驳中...")
-            bull_rebuttal_prompt = ChatPromptTemplate.from_messages([
-                ("system", """你是看涨研究员，请针对空头的观点进行反驳。
+                print(f"\n--- 辩论第 {round_num} 轮 ---")
+                print("[多头] [空头] 并行反驳中...")
+            self._emit_debate_round(round_num)
+            responses = await self._ainvoke_prompts_concurrently(self._rebuttal_prompts(state, context))
+            record, bullish, bearish, converged = self._apply_rebuttals(
+                round_num, state, responses, verbose
+            )
+            debate_rounds.append(record)
+            if converged:
+                break
+        
+        return debate_rounds, bullish, bearish
+    
+    def _emit_debate_round(self, round_num: int) -> None:
+        """通知多空研究员开始新一轮反驳（前端据此清空上一轮的流式文本）"""
+        for role in (AgentRole.BULLISH_RESEARCHER, AgentRole.BEARISH_RESEARCHER):
+            self._emit_llm_event(role, "debate_round", round=round_num)
+    
+    def _debate_view_tokens(self) -> int:
+        """辩论记忆中每一方观点的 token 上限（单次反驳提示词上限的 40%）"""
+        budget = get_settings().debate_prompt_tokens
+        return budget * 2 // 5 if budget > 0 else sys.maxsize
+    
+    def _debate_context(self, analyst_digest: AnalystTeamDigest) -> str:
+        """辩论使用的分析报告摘要：不超过提示词上限减去对方观点所占的部分"""
+        budget = get_settings().debate_prompt_tokens
+        context = analyst_digest.render()
+        if budget <= 0:
+            return context
+        return truncate_to_tokens(context, budget - self._debate_view_tokens())
+    
+    def _rebuttal_prompts(self, state: DebateState, context: str) -> Dict[AgentRole, ChatPromptTemplate]:
+        """一轮辩论中多空双方的反驳提示词（对方观点取自辩论记忆；超出预算时先裁剪分析报告摘要）"""
+        bull_rebuttal_prompt = lambda sections: ChatPromptTemplate.from_messages([
+            ("system", """你是看涨研究员，请针对空头的观点进行反驳。
 保持理性和专业，用数据和事实说话。
 反驳后请重新给出你的评分(1-10分)。"""),
-                ("user", f"""原始分析报告:
-{context}
+            ("user", f"""分析报告摘要:
+{sections['context']}
 
 空头观点:
-{bearish.content}
+{sections['opponent']}
 
 请针对空头的主要论点进行反驳，强化你的看涨理由。
 格式:
@@ -672,21 +1494,16 @@ class EnhancedMultiAgentSystem:
 【更新后评分】
 评分: X/10分
 信心水平: 高/中/低""")
-            ])
-            bull_response = (bull_rebuttal_prompt | self.llm).invoke({})
-            
-            # 空头反驳多头
-            if verbose:
-                print("[空头] 反驳中...")
-            bear_rebuttal_prompt = ChatPromptTemplate.from_messages([
-                ("system", """你是看跌研究员，请针对多头的观点进行反驳。
+        ])
+        bear_rebuttal_prompt = lambda sections: ChatPromptTemplate.from_messages([
+            ("system", """你是看跌研究员，请针对多头的观点进行反驳。
 保持理性和专业，用数据和事实说话。
 反驳后请重新给出你的评分(1-10分，分数越低越看跌)。"""),
-                ("user", f"""原始分析报告:
-{context}
+            ("user", f"""分析报告摘要:
+{sections['context']}
 
 多头观点:
-{bullish.content}
+{sections['opponent']}
 
 请针对多头的主要论点进行反驳，强化你的看跌理由。
 格式:
@@ -697,163 +1514,197 @@ class EnhancedMultiAgentSystem:
 【更新后评分】
 评分: X/10分
 信心水平: 高/中/低""")
-            ])
-            bear_response = (bear_rebuttal_prompt | self.llm).invoke({})
-            
-            # 记录辩论轮次
-            debate_rounds.append({
-                "round": round_num,
-                "bullish_rebuttal": bull_response.content,
-                "bearish_rebuttal": bear_response.content,
-                "bullish_score": self._extract_score(bull_response.content),
-                "bearish_score": self._extract_score(bear_response.content)
-            })
-            
-            # 更新观点
-            bullish = AgentOutput(
-                role=AgentRole.BULLISH_RESEARCHER,
-                content=f"{bullish.content}\n\n【第{round_num}轮辩论补充】\n{bull_response.content}",
-                score=self._extract_score(bull_response.content)
-            )
-            bearish = AgentOutput(
-                role=AgentRole.BEARISH_RESEARCHER,
-                content=f"{bearish.content}\n\n【第{round_num}轮辩论补充】\n{bear_response.content}",
-                score=self._extract_score(bear_response.content)
-            )
-            
-            if verbose:
-                print(f"第{round_num}轮辩论完成: 多头评分 {bullish.score}/10, 空头评分 {bearish.score}/10")
-            
-            # 如果评分差异收敛，提前结束辩论
-            new_diff = abs(bullish.score - bearish.score)
-            if new_diff < self.debate_threshold * 0.5:
-                if verbose:
-                    print(f"评分差异收敛至 {new_diff:.1f}，提前结束辩论")
-                break
+        ])
+        trim_order = ("context", "opponent")
+        return {
+            AgentRole.BULLISH_RESEARCHER: self._fit_prompt(
+                AgentRole.BULLISH_RESEARCHER, bull_rebuttal_prompt,
+                {"context": context, "opponent": state.bearish_view()}, trim_order
+            ),
+            AgentRole.BEARISH_RESEARCHER: self._fit_prompt(
+                AgentRole.BEARISH_RESEARCHER, bear_rebuttal_prompt,
+                {"context": context, "opponent": state.bullish_view()}, trim_order
+            ),
+        }
+    
+    def _apply_rebuttals(
+        self,
+        round_num: int,
+        state: DebateState,
+        responses: Dict[AgentRole, "_LLMReply"],
+        verbose: bool
+    ) -> Tuple[Dict[str, Any], AgentOutput, AgentOutput, bool]:
+        """
+        将一轮反驳记入辩论记忆并更新多空观点
         
-        return debate_rounds, bullish, bearish
+        Returns:
+            (本轮记录, 更新后的多头观点, 更新后的空头观点, 评分差异是否已收敛)
+        """
+        bull_response = responses[AgentRole.BULLISH_RESEARCHER]
+        bear_response = responses[AgentRole.BEARISH_RESEARCHER]
+        
+        # 记录辩论轮次
+        record = {
+            "round": round_num,
+            "bullish_rebuttal": bull_response.content,
+            "bearish_rebuttal": bear_response.content,
+            "bullish_score": self._reply_score(bull_response),
+            "bearish_score": self._reply_score(bear_response)
+        }
+        
+        # 更新观点（压缩后的辩论记忆，长度有上限）
+        state.record(round_num, bull_response.content, bear_response.content)
+        bullish = AgentOutput(
+            role=AgentRole.BULLISH_RESEARCHER,
+            content=state.bullish_view(),
+            score=record["bullish_score"]
+        )
+        bearish = AgentOutput(
+            role=AgentRole.BEARISH_RESEARCHER,
+            content=state.bearish_view(),
+            score=record["bearish_score"]
+        )
+        
+        if verbose:
+            print(f"第{round_num}轮辩论完成: 多头评分 {bullish.score}/10, 空头评分 {bearish.score}/10")
+        
+        # 如果评分差异收敛，提前结束辩论
+        new_diff = abs(bullish.score - bearish.score)
+        converged = new_diff < self.debate_threshold * 0.5
+        if converged and verbose:
+            print(f"评分差异收敛至 {new_diff:.1f}，提前结束辩论")
+        
+        return record, bullish, bearish, converged
     
     # ==================== Layer 3: Trader ====================
     
-    def _run_trader(
+    def _trader_prompt(
         self,
-        symbol: str,
-        analyst_team: AnalystTeamReport,
-        researcher_debate: ResearcherDebate,
-        verbose: bool
-    ) -> TraderDecision:
-        """交易员决策"""
-        
-        quant_summary = ""
-        if analyst_team.quant:
-            quant_summary = f"\n量化面: {analyst_team.quant.content[:200]}..."
-
-        context = f"""【分析师团队报告摘要】
-基本面: {analyst_team.fundamentals.content[:200]}...
-情绪面: {analyst_team.sentiment.content[:200]}...
-新闻面: {analyst_team.news.content[:200]}...
-技术面: {analyst_team.technical.content[:200]}...{quant_summary}
+        analyst_digest: AnalystTeamDigest,
+        researcher_debate: ResearcherDebate
+    ) -> ChatPromptTemplate:
+        """交易员决策提示词（超出预算时先裁剪分析师报告摘要，再裁剪多空观点）"""
+        def build(sections: Dict[str, str]) -> ChatPromptTemplate:
+            context = f"""【分析师团队报告摘要】
+{sections['analyst_digest']}
 
 【研究员辩论】
 多头观点(评分{researcher_debate.bullish.score}/10):
-{researcher_debate.bullish.content}
+{sections['bullish']}
 
 空头观点(评分{researcher_debate.bearish.score}/10):
-{researcher_debate.bearish.content}
+{sections['bearish']}
 
 评分差异: {researcher_debate.score_diff}
 {'发生辩论' if researcher_debate.debate_occurred else '未发生辩论'}"""
+            
+            return ChatPromptTemplate.from_messages([
+                ("system", get_prompt_by_role("trader")),
+                ("user", f"基于以上所有分析，请给出交易决策:\n\n{context}")
+            ])
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", get_prompt_by_role("trader")),
-            ("user", f"基于以上所有分析，请给出交易决策:\n\n{context}")
-        ])
-        
-        response = (prompt | self.llm).invoke({})
-        
-        recommendation = self._extract_recommendation(response.content)
-        position = self._extract_position(response.content)
-        
+        sections = {
+            "analyst_digest": analyst_digest.render(),
+            "bullish": researcher_debate.bullish.content,
+            "bearish": researcher_debate.bearish.content,
+        }
+        return self._fit_prompt(AgentRole.TRADER, build, sections, ("analyst_digest", "bearish", "bullish"))
+    
+    def _trader_decision(self, reply: "_LLMReply") -> TraderDecision:
+        """解析交易员响应（结构化数据优先，否则从正文提取）"""
+        content = reply.content
+        if reply.data is not None:
+            recommendation, position = reply.data.recommendation, reply.data.position
+        else:
+            recommendation, position = self._extract_recommendation(content), self._extract_position(content)
         return TraderDecision(
             decision=AgentOutput(
                 role=AgentRole.TRADER,
-                content=response.content
+                content=content,
+                metadata=reply.metadata()
             ),
             recommendation=recommendation,
             suggested_position=position
         )
     
-    # ==================== Layer 4: Risk & Portfolio ====================
+    def _run_trader(
+        self,
+        symbol: str,
+        analyst_digest: AnalystTeamDigest,
+        researcher_debate: ResearcherDebate,
+        verbose: bool
+    ) -> TraderDecision:
+        """交易员决策"""
+        response = self._invoke_llm(AgentRole.TRADER, self._trader_prompt(analyst_digest, researcher_debate))
+        return self._trader_decision(response)
     
-    def _run_risk_management(
+    async def _arun_trader(
         self,
-        trader_decision: TraderDecision,
+        symbol: str,
+        analyst_digest: AnalystTeamDigest,
+        researcher_debate: ResearcherDebate,
         verbose: bool
-    ) -> RiskAssessment:
-        """风险管理团队（3种风格）"""
-        
-        trader_context = trader_decision.decision.content
-        
-        # Aggressive
-        aggressive_prompt = ChatPromptTemplate.from_messages([
-            ("system", get_prompt_by_role("risk_manager_aggressive")),
-            ("user", f"评估以下交易决策的风险:\n\n{trader_context}")
-        ])
-        aggressive_response = (aggressive_prompt | self.llm).invoke({})
-        
-        # Neutral
-        neutral_prompt = ChatPromptTemplate.from_messages([
-            ("system", get_prompt_by_role("risk_manager_neutral")),
-            ("user", f"评估以下交易决策的风险:\n\n{trader_context}")
-        ])
-        neutral_response = (neutral_prompt | self.llm).invoke({})
-        
-        # Conservative
-        conservative_prompt = ChatPromptTemplate.from_messages([
-            ("system", get_prompt_by_role("risk_manager_conservative")),
-            ("user", f"评估以下交易决策的风险:\n\n{trader_context}")
-        ])
-        conservative_response = (conservative_prompt | self.llm).invoke({})
-        
-        return RiskAssessment(
-            aggressive=AgentOutput(
-                role=AgentRole.RISK_MANAGER_AGGRESSIVE,
-                content=aggressive_response.content
-            ),
-            neutral=AgentOutput(
-                role=AgentRole.RISK_MANAGER_NEUTRAL,
-                content=neutral_response.content
-            ),
-            conservative=AgentOutput(
-                role=AgentRole.RISK_MANAGER_CONSERVATIVE,
-                content=conservative_response.content
-            )
+    ) -> TraderDecision:
+        """_run_trader 的异步版本"""
+        response = await self._ainvoke_llm(AgentRole.TRADER, self._trader_prompt(analyst_digest, researcher_debate))
+        return self._trader_decision(response)
+    
+    # ==================== Layer 4: Risk & Portfolio ====================
+    
+    def _risk_prompt(self, role: AgentRole, trader_decision: TraderDecision) -> ChatPromptTemplate:
+        """风险经理提示词（激进/中立/保守）"""
+        return self._fit_prompt(role, lambda sections: ChatPromptTemplate.from_messages([
+            ("system", get_prompt_by_role(role.value)),
+            ("user", f"评估以下交易决策的风险:\n\n{sections['trader_decision']}")
+        ]), {"trader_decision": trader_decision.decision.content}, ("trader_decision",))
+    
+    def _run_risk_manager(
+        self,
+        role: AgentRole,
+        trader_decision: TraderDecision
+    ) -> AgentOutput:
+        """单个风险经理评估交易决策（激进/中立/保守）"""
+        response = self._invoke_llm(role, self._risk_prompt(role, trader_decision))
+        return AgentOutput(
+            role=role,
+            content=response.content
         )
     
-    def _run_portfolio_manager(
+    async def _arun_risk_manager(
+        self,
+        role: AgentRole,
+        trader_decision: TraderDecision
+    ) -> AgentOutput:
+        """_run_risk_manager 的异步版本"""
+        response = await self._ainvoke_llm(role, self._risk_prompt(role, trader_decision))
+        return AgentOutput(
+            role=role,
+            content=response.content
+        )
+    
+    def _portfolio_prompt(
         self,
         symbol: str,
         analyst_team: AnalystTeamReport,
         researcher_debate: ResearcherDebate,
         trader_decision: TraderDecision,
-        risk_assessment: RiskAssessment,
-        verbose: bool
-    ) -> FinalDecision:
-        """投资组合经理最终决策"""
-        
+        risk_assessment: RiskAssessment
+    ) -> ChatPromptTemplate:
+        """投资组合经理提示词（超出预算时先裁剪三位风险经理的评估，最后裁剪交易员决策）"""
         quant_score_line = ""
         if analyst_team.quant and analyst_team.quant.score:
             quant_score_line = f"\n量化面: {analyst_team.quant.score}/10"
 
-        full_context = f"""【股票代码】{symbol}
+        def build(sections: Dict[str, str]) -> ChatPromptTemplate:
+            full_context = f"""【股票代码】{symbol}
 
 【交易员决策】
-{trader_decision.decision.content}
+{sections['trader_decision']}
 
 【风险评估】
-激进派: {risk_assessment.aggressive.content}
-中立派: {risk_assessment.neutral.content}
-保守派: {risk_assessment.conservative.content}
+激进派: {sections['aggressive']}
+中立派: {sections['neutral']}
+保守派: {sections['conservative']}
 
 【分析师评分摘要】
 基本面: {analyst_team.fundamentals.score}/10
@@ -862,44 +1713,461 @@ class EnhancedMultiAgentSystem:
 【研究员评分】
 多头: {researcher_debate.bullish.score}/10
 空头: {researcher_debate.bearish.score}/10"""
+            
+            return ChatPromptTemplate.from_messages([
+                ("system", get_prompt_by_role("portfolio_manager")),
+                ("user", f"请给出最终投资决策:\n\n{full_context}")
+            ])
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", get_prompt_by_role("portfolio_manager")),
-            ("user", f"请给出最终投资决策:\n\n{full_context}")
-        ])
-        
-        response = (prompt | self.llm).invoke({})
-        
-        recommendation = self._extract_recommendation(response.content)
-        confidence = self._extract_confidence(response.content)
-        position_suggestions = self._extract_position_suggestions(response.content)
-        
+        sections = {
+            "trader_decision": trader_decision.decision.content,
+            "aggressive": risk_assessment.aggressive.content,
+            "neutral": risk_assessment.neutral.content,
+            "conservative": risk_assessment.conservative.content,
+        }
+        return self._fit_prompt(
+            AgentRole.PORTFOLIO_MANAGER, build, sections,
+            ("aggressive", "conservative", "neutral", "trader_decision")
+        )
+    
+    def _final_decision(self, reply: "_LLMReply") -> FinalDecision:
+        """解析投资组合经理响应（结构化数据优先，否则从正文提取）"""
+        content = reply.content
+        data = reply.data
+        if data is not None:
+            recommendation, confidence = data.recommendation, data.confidence
+            position_suggestions = {
+                "激进型": data.position_suggestions.aggressive,
+                "稳健型": data.position_suggestions.moderate,
+                "保守型": data.position_suggestions.conservative,
+            }
+        else:
+            recommendation = self._extract_recommendation(content)
+            confidence = self._extract_confidence(content)
+            position_suggestions = self._extract_position_suggestions(content)
         return FinalDecision(
             decision=AgentOutput(
                 role=AgentRole.PORTFOLIO_MANAGER,
-                content=response.content
+                content=content,
+                metadata=reply.metadata()
             ),
             recommendation=recommendation,
             confidence=confidence,
             position_suggestions=position_suggestions
         )
     
+    def _run_portfolio_manager(
+        self,
+        symbol: str,
+        analyst_team: AnalystTeamReport,
+        researcher_debate: ResearcherDebate,
+        trader_decision: TraderDecision,
+        risk_assessment: RiskAssessment,
+        verbose: bool
+    ) -> FinalDecision:
+        """投资组合经理最终决策"""
+        prompt = self._portfolio_prompt(symbol, analyst_team, researcher_debate, trader_decision, risk_assessment)
+        response = self._invoke_llm(AgentRole.PORTFOLIO_MANAGER, prompt)
+        return self._final_decision(response)
+    
+    async def _arun_portfolio_manager(
+        self,
+        symbol: str,
+        analyst_team: AnalystTeamReport,
+        researcher_debate: ResearcherDebate,
+        trader_decision: TraderDecision,
+        risk_assessment: RiskAssessment,
+        verbose: bool
+    ) -> FinalDecision:
+        """_run_portfolio_manager 的异步版本"""
+        prompt = self._portfolio_prompt(symbol, analyst_team, researcher_debate, trader_decision, risk_assessment)
+        response = await self._ainvoke_llm(AgentRole.PORTFOLIO_MANAGER, prompt)
+        return self._final_decision(response)
+    
     # ==================== Helper Functions ====================
     
-    def _extract_score(self, content: str) -> float:
-        """从内容中提取评分"""
-        import re
-        patterns = [
-            r'评分[：:]\s*(\d+(?:\.\d+)?)\s*/\s*10',
-            r'(\d+(?:\.\d+)?)\s*/\s*10\s*分',
-            r'综合评分[：:]\s*(\d+(?:\.\d+)?)',
-            r'评分[：:]\s*(\d+(?:\.\d+)?)',
-            r'(\d+(?:\.\d+)?)\s*分',
-            r'(?:得分|打分)[：:]\s*(\d+(?:\.\d+)?)',
-        ]
+    def _invoke_llm(self, role: AgentRole, prompt: ChatPromptTemplate) -> "_LLMReply":
+        """
+        调用LLM（所有Agent的同步LLM调用都经过这里）
+        
+        结构化模式下，有输出格式的角色（见 ROLE_SCHEMAS）在提示词末尾追加格式要求，
+        并从回答中解析 JSON 代码块；解析失败时做一次修复调用。
+        
+        Returns:
+            _LLMReply（content 为去掉 JSON 代码块后的正文）
+        """
+        schema = ROLE_SCHEMAS.get(role.value) if self.structured_output else None
+        if schema is None:
+            return _LLMReply(content=self._call_llm(role, prompt).content)
+        
+        message = self._call_llm(role, with_format_instructions(prompt, schema))
+        content, data, error = parse_structured(message.content, schema)
+        if data is not None:
+            return _LLMReply(content=content, data=data, structured="parsed")
+        try:
+            repaired = self._call_llm(role, repair_prompt(message.content, schema, error), stream=False)
+            _, data, _ = parse_structured(repaired.content, schema)
+        except Exception:
+            data = None
+        return _LLMReply(content=content, data=data, structured="repaired" if data is not None else "failed")
+    
+    async def _ainvoke_llm(self, role: AgentRole, prompt: ChatPromptTemplate) -> "_LLMReply":
+        """_invoke_llm 的异步版本"""
+        schema = ROLE_SCHEMAS.get(role.value) if self.structured_output else None
+        if schema is None:
+            return _LLMReply(content=(await self._acall_llm(role, prompt)).content)
+        
+        message = await self._acall_llm(role, with_format_instructions(prompt, schema))
+        content, data, error = parse_structured(message.content, schema)
+        if data is not None:
+            return _LLMReply(content=content, data=data, structured="parsed")
+        try:
+            repaired = await self._acall_llm(role, repair_prompt(message.content, schema, error), stream=False)
+            _, data, _ = parse_structured(repaired.content, schema)
+        except Exception:
+            data = None
+        return _LLMReply(content=content, data=data, structured="repaired" if data is not None else "failed")
+    
+    def _call_llm(self, role: AgentRole, prompt: ChatPromptTemplate, stream: bool = True) -> Any:
+        """
+        发起一次LLM调用，返回响应消息
+        
+        调用在 API地址+模型 的自适应并发窗口内执行，窗口已满时排队等待。
+        设置了增量输出回调且 stream 为 True 时使用流式接口，每收到一段文本就以 (角色, 文本) 回调一次，
+        最终仍返回完整的响应消息。
+        
+        每次调用有超时（见 _call_timeout）；迟迟没有输出时发出对冲请求（见 _hedge_delay）；
+        主模型超时且配置了备用模型时改用备用模型重试一次。
+        """
+        route = self._route(role)
+        timeout = self._call_timeout(role)
+        hedge_delay = self._hedge_delay(route, stream)
+        try:
+            message = hedged_call(
+                lambda index, claim, started: self._attempt_llm(role, prompt, route, claim, started, stream),
+                timeout=timeout,
+                hedge_delay=hedge_delay,
+                on_hedge=lambda: self._emit_llm_event(role, "hedge", model=route.model, delay=hedge_delay)
+            )
+        except TimeoutError:
+            fallback = self._fallback_after_timeout(role, route, timeout)
+            if fallback is None:
+                raise
+            route = fallback
+            message = hedged_call(
+                lambda index, claim, started: self._attempt_llm(role, prompt, fallback, claim, started, stream),
+                timeout=get_settings().llm_fallback_timeout or None
+            )
+        self._record_usage(role, route, prompt, message)
+        return message
+    
+    async def _acall_llm(self, role: AgentRole, prompt: ChatPromptTemplate, stream: bool = True) -> Any:
+        """_call_llm 的异步版本（ainvoke / astream）"""
+        route = self._route(role)
+        timeout = self._call_timeout(role)
+        hedge_delay = self._hedge_delay(route, stream)
+        try:
+            message = await ahedged_call(
+                lambda index, claim, started: self._aattempt_llm(role, prompt, route, claim, started, stream),
+                timeout=timeout,
+                hedge_delay=hedge_delay,
+                on_hedge=lambda: self._emit_llm_event(role, "hedge", model=route.model, delay=hedge_delay)
+            )
+        except TimeoutError:
+            fallback = self._fallback_after_timeout(role, route, timeout)
+            if fallback is None:
+                raise
+            route = fallback
+            message = await ahedged_call(
+                lambda index, claim, started: self._aattempt_llm(role, prompt, fallback, claim, started, stream),
+                timeout=get_settings().llm_fallback_timeout or None
+            )
+        self._record_usage(role, route, prompt, message)
+        return message
+    
+    def _attempt_llm(
+        self,
+        role: AgentRole,
+        prompt: ChatPromptTemplate,
+        route: _LLMRoute,
+        claim: Callable[[], bool],
+        started: Callable[[], bool],
+        stream: bool = True
+    ) -> Any:
+        """
+        发起一份LLM请求（对冲时可能同时有两份，只有胜出的一份输出增量文本）
+        
+        限流（429）、服务端错误和连接错误最多重试 _LLM_RETRIES 次，每次重新在并发窗口中排队；
+        已推送增量文本后不再重试，避免重复输出。
+        """
+        delivered: List[str] = []
+        for retry in range(_LLM_RETRIES + 1):
+            try:
+                return self._send_llm(role, prompt, route, claim, started, stream, delivered)
+            except Exception as e:
+                if retry >= _LLM_RETRIES or delivered or not is_retryable(e):
+                    raise
+                delay = retry_delay(e, retry)
+                self._emit_llm_event(role, "retry", model=route.model, delay=delay, error=str(e))
+            time.sleep(delay)
+    
+    def _send_llm(
+        self,
+        role: AgentRole,
+        prompt: ChatPromptTemplate,
+        route: _LLMRoute,
+        claim: Callable[[], bool],
+        started: Callable[[], bool],
+        stream: bool,
+        delivered: List[str]
+    ) -> Any:
+        """
+        在并发窗口内发送一次请求
+        
+        占到并发位置后先调用 started()：等待期间调用已超时或另一份已胜出时不再发送。
+        流式调用先查询响应缓存（LangChain 只在 invoke 中使用缓存），命中时不占并发位置，
+        缓存的回答作为一段增量文本推送。
+        """
+        on_delta = self._on_delta if stream else None
+        tracker = get_latency_tracker(self.base_url, route.model, streaming=on_delta is not None)
+        if on_delta is not None:
+            messages = prompt.format_messages()
+            cached = lookup_message(route.llm, messages)
+            if cached is not None:
+                return self._replay_cached(role, cached, claim, delivered)
+        with route.limiter.limit():
+            if not started():
+                raise HedgeLost()
+            start = time.monotonic()
+            if on_delta is None:
+                message = (prompt | route.llm).invoke({})
+                tracker.record(time.monotonic() - start)
+                return message
+            
+            message = None
+            for chunk in (prompt | route.llm).stream({}):
+                if message is None:
+                    tracker.record(time.monotonic() - start)
+                if not claim():
+                    raise HedgeLost()
+                message = chunk if message is None else message + chunk
+                if chunk.content:
+                    delivered.append(chunk.content)
+                    on_delta(role, chunk.content)
+        update_message(route.llm, messages, message)
+        return message
+    
+    def _replay_cached(
+        self,
+        role: AgentRole,
+        message: Any,
+        claim: Callable[[], bool],
+        delivered: List[str]
+    ) -> Any:
+        """把缓存命中的回答作为一段增量文本推送"""
+        if not claim():
+            raise HedgeLost()
+        if message.content:
+            delivered.append(message.content)
+            self._on_delta(role, message.content)
+        return message
+    
+    async def _aattempt_llm(
+        self,
+        role: AgentRole,
+        prompt: ChatPromptTemplate,
+        route: _LLMRoute,
+        claim: Callable[[], bool],
+        started: Callable[[], bool],
+        stream: bool = True
+    ) -> Any:
+        """_attempt_llm 的异步版本"""
+        delivered: List[str] = []
+        for retry in range(_LLM_RETRIES + 1):
+            try:
+                return await self._asend_llm(role, prompt, route, claim, started, stream, delivered)
+            except Exception as e:
+                if retry >= _LLM_RETRIES or delivered or not is_retryable(e):
+                    raise
+                delay = retry_delay(e, retry)
+                self._emit_llm_event(role, "retry", model=route.model, delay=delay, error=str(e))
+            await asyncio.sleep(delay)
+    
+    async def _asend_llm(
+        self,
+        role: AgentRole,
+        prompt: ChatPromptTemplate,
+        route: _LLMRoute,
+        claim: Callable[[], bool],
+        started: Callable[[], bool],
+        stream: bool,
+        delivered: List[str]
+    ) -> Any:
+        """_send_llm 的异步版本"""
+        on_delta = self._on_delta if stream else None
+        tracker = get_latency_tracker(self.base_url, route.model, streaming=on_delta is not None)
+        if on_delta is not None:
+            messages = prompt.format_messages()
+            cached = await asyncio.to_thread(lookup_message, route.llm, messages)
+            if cached is not None:
+                return self._replay_cached(role, cached, claim, delivered)
+        async with route.limiter.alimit():
+            if not started():
+                raise HedgeLost()
+            start = time.monotonic()
+            if on_delta is None:
+                message = await (prompt | route.llm).ainvoke({})
+                tracker.record(time.monotonic() - start)
+                return message
+            
+            message = None
+            async for chunk in (prompt | route.llm).astream({}):
+                if message is None:
+                    tracker.record(time.monotonic() - start)
+                if not claim():
+                    raise HedgeLost()
+                message = chunk if message is None else message + chunk
+                if chunk.content:
+                    delivered.append(chunk.content)
+                    on_delta(role, chunk.content)
+        await asyncio.to_thread(update_message, route.llm, messages, message)
+        return message
+    
+    def _call_timeout(self, role: AgentRole) -> Optional[float]:
+        """
+        单次LLM调用的超时（秒，None 表示不限）
+        
+        不超过 llm_call_timeout；运行中设置了总预算时，剩余预算按本次调用之后
+        还要串行经过的阶段数（含辩论轮次）平均分配，前面的阶段不会耗尽后面阶段的时间。
+        """
+        timeout = get_settings().llm_call_timeout or None
+        if self._deadline is not None:
+            stage = _LLM_STAGES.get(role, _LLM_STAGE_COUNT)
+            stages_left = _LLM_STAGE_COUNT - stage + 1
+            if stage <= _LLM_STAGES[AgentRole.BULLISH_RESEARCHER]:
+                stages_left += self.max_debate_rounds
+            share = max(0.0, self._deadline - time.monotonic()) / stages_left
+            timeout = share if timeout is None else min(timeout, share)
+        return timeout
+    
+    def _route(self, role: AgentRole) -> _LLMRoute:
+        """角色使用的模型（未配置路由时为默认模型）"""
+        return self._routes.get(role, self._default_route)
+    
+    def _hedge_delay(self, route: _LLMRoute, stream: bool = True) -> Optional[float]:
+        """
+        对冲延迟：该模型最近调用耗时的 llm_hedge_percentile 分位数
+        
+        未启用、样本不足或并发窗口已在排队（再加请求只会加重拥塞）时返回 None。
+        """
+        settings = get_settings()
+        if settings.llm_hedge_percentile <= 0 or route.limiter.queue_depth > 0:
+            return None
+        tracker = get_latency_tracker(self.base_url, route.model, streaming=stream and self._on_delta is not None)
+        return tracker.percentile(settings.llm_hedge_percentile, settings.llm_hedge_min_samples)
+    
+    def _fallback_after_timeout(
+        self,
+        role: AgentRole,
+        route: _LLMRoute,
+        timeout: Optional[float]
+    ) -> Optional[_LLMRoute]:
+        """主模型超时：报告事件，返回改用的备用模型（没有可用的备用模型时返回 None）"""
+        fallback = self._fallback_route
+        if fallback is None or fallback.model == route.model:
+            self._emit_llm_event(role, "timeout", model=route.model, timeout=timeout)
+            return None
+        self._emit_llm_event(role, "fallback", model=fallback.model, timeout=timeout)
+        return fallback
+    
+    def _emit_llm_event(self, role: AgentRole, event: str, **info: Any) -> None:
+        if self._on_llm_event is not None:
+            self._on_llm_event(role, {"event": event, **info})
+    
+    def _prompt_budget(self, role: AgentRole) -> Optional[int]:
+        """角色的提示词 token 预算（None 表示不限）"""
+        budget = self._prompt_budgets.get(role, get_settings().llm_prompt_tokens)
+        return budget if budget > 0 else None
+    
+    def _fit_prompt(
+        self,
+        role: AgentRole,
+        build: Callable[[Dict[str, str]], ChatPromptTemplate],
+        sections: Dict[str, str],
+        trim_order: Tuple[str, ...]
+    ) -> ChatPromptTemplate:
+        """
+        按角色的提示词预算构建提示词
+        
+        Args:
+            role: 角色
+            build: 由各小节文本构建提示词的函数
+            sections: {小节名: 文本}（工具输出、报告摘要、对方观点等长度不固定的部分）
+            trim_order: 超出预算时依次裁剪的小节（优先级低的在前，见 fit_sections）
+        
+        超出预算时发出 prompt_trimmed 事件。
+        """
+        prompt = build(sections)
+        budget = self._prompt_budget(role)
+        if budget is None:
+            return prompt
+        tokens = prompt_tokens(prompt)
+        if tokens <= budget:
+            return prompt
+        overhead = tokens - sum(estimate_tokens(text) for text in sections.values())
+        fitted, trimmed = fit_sections(sections, trim_order, budget - overhead)
+        prompt = build(fitted)
+        self._emit_llm_event(
+            role, "prompt_trimmed",
+            budget=budget, original_tokens=tokens, prompt_tokens=prompt_tokens(prompt), sections=trimmed
+        )
+        return prompt
+    
+    def _record_usage(self, role: AgentRole, route: _LLMRoute, prompt: ChatPromptTemplate, message: Any) -> None:
+        """
+        发出 token_usage 事件
         
-        for pattern in patterns:
-            match = re.search(pattern, content)
+        服务商在响应中返回用量（usage_metadata）时使用实际值（estimated=False），
+        否则提示词和回答的 token 数都用离线估算。
+        """
+        if self._on_llm_event is None:
+            return
+        usage = getattr(message, "usage_metadata", None) or {}
+        if usage.get("input_tokens"):
+            counts = {"prompt_tokens": usage["input_tokens"], "completion_tokens": usage.get("output_tokens", 0)}
+        else:
+            counts = {"prompt_tokens": prompt_tokens(prompt), "completion_tokens": message_tokens(message)}
+        self._emit_llm_event(role, "token_usage", model=route.model, estimated=not usage.get("input_tokens"), **counts)
+    
+    def _invoke_prompts_concurrently(self, prompts: Dict[AgentRole, ChatPromptTemplate]) -> Dict[AgentRole, "_LLMReply"]:
+        """并行调用多个相互独立的LLM提示，返回 {角色: 响应}"""
+        with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+            futures = {
+                role: executor.submit(self._invoke_llm, role, prompt)
+                for role, prompt in prompts.items()
+            }
+            return {role: future.result() for role, future in futures.items()}
+    
+    async def _ainvoke_prompts_concurrently(
+        self,
+        prompts: Dict[AgentRole, ChatPromptTemplate]
+    ) -> Dict[AgentRole, "_LLMReply"]:
+        """_invoke_prompts_concurrently 的异步版本"""
+        responses = await asyncio.gather(*(
+            self._ainvoke_llm(role, prompt) for role, prompt in prompts.items()
+        ))
+        return dict(zip(prompts, responses))
+    
+    def _reply_score(self, reply: "_LLMReply") -> float:
+        """评分：结构化数据优先，否则从正文提取"""
+        if reply.data is not None:
+            return float(reply.data.score)
+        return self._extract_score(reply.content)
+    
+    def _extract_score(self, content: str) -> float:
+        """从内容中提取评分（未启用结构化输出或解析失败时使用）"""
+        for pattern in _SCORE_PATTERNS:
+            match = pattern.search(content)
             if match:
                 try:
                     score = float(match.group(1))
@@ -920,20 +2188,9 @@ class EnhancedMultiAgentSystem:
         2. 考虑否定词前缀
         3. 基于关键词评分（平衡评分）
         """
-        import re
-        
         # 优先级1: 查找明确的综合建议语句（最可靠）
-        # 注意：使用原始字符串r''，\s表示空白字符
-        explicit_patterns = [
-            r'综合建议[：:]\s*(买入|持有|卖出|观望|规避)',
-            r'最终.*?建议[：:]\s*(买入|持有|卖出|观望|规避)',
-            r'交易决策[：:]\s*(买入|持有|卖出|观望|规避)',
-            r'决策[：:]\s*(买入|持有|卖出|观望|规避)',
-            r'投资建议[：:]\s*(买入|持有|卖出|观望|规避)',
-        ]
-        
-        for pattern in explicit_patterns:
-            match = re.search(pattern, content)
+        for pattern in _RECOMMENDATION_PATTERNS:
+            match = pattern.search(content)
             if match:
                 result = match.group(1)
                 if result == '观望':
@@ -1009,17 +2266,9 @@ class EnhancedMultiAgentSystem:
     
     def _extract_position(self, content: str) -> str:
         """提取仓位建议 - 增强版"""
-        import re
-        
         # 明确的仓位建议匹配
-        patterns = [
-            r'建议仓位[：:]\s*(轻仓|半仓|重仓|空仓|观望)',
-            r'仓位建议[：:]\s*(轻仓|半仓|重仓|空仓|观望)',
-            r'(轻仓|半仓|重仓|空仓).*?(?:买入|持有)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, content)
+        for pattern in _POSITION_PATTERNS:
+            match = pattern.search(content)
             if match:
                 pos = match.group(1)
                 if pos == '空仓' or pos == '观望':
@@ -1027,7 +2276,7 @@ class EnhancedMultiAgentSystem:
                 return pos
         
         # 百分比匹配
-        pct_match = re.search(r'(\d+)[-–]?(\d*)%.*?仓位', content)
+        pct_match = _POSITION_PCT_PATTERN.search(content)
         if pct_match:
             pct = int(pct_match.group(1))
             if pct >= 70:
@@ -1053,18 +2302,9 @@ class EnhancedMultiAgentSystem:
     
     def _extract_confidence(self, content: str) -> str:
         """提取信心水平 - 增强版"""
-        import re
-        
         # 明确的信心水平匹配
-        patterns = [
-            r'信心水平[：:]\s*(高|中|低)',
-            r'信心[：:]\s*(高|中|低)',
-            r'把握[：:]\s*(高|中|低|大|小)',
-            r'确定性[：:]\s*(高|中|低)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, content)
+        for pattern in _CONFIDENCE_PATTERNS:
+            match = pattern.search(content)
             if match:
                 level = match.group(1)
                 if level in ['大']:
@@ -1088,8 +2328,6 @@ class EnhancedMultiAgentSystem:
     
     def _extract_position_suggestions(self, content: str) -> Dict[str, str]:
         """提取不同风险偏好的仓位建议 - 增强版"""
-        import re
-        
         result = {
             "激进型": "30-50%",
             "稳健型": "20-30%",
@@ -1097,15 +2335,9 @@ class EnhancedMultiAgentSystem:
         }
         
         # 尝试从内容中提取具体百分比
-        patterns = {
-            "激进型": [r'激进[型派].*?[：:]\s*(\d+[-–]\d+%|\d+%)', r'激进.*?仓位.*?(\d+[-–]\d+%|\d+%)'],
-            "稳健型": [r'稳健[型派].*?[：:]\s*(\d+[-–]\d+%|\d+%)', r'稳健.*?仓位.*?(\d+[-–]\d+%|\d+%)'],
-            "保守型": [r'保守[型派].*?[：:]\s*(\d+[-–]\d+%|\d+%)', r'保守.*?仓位.*?(\d+[-–]\d+%|\d+%)'],
-        }
-        
-        for key, pattern_list in patterns.items():
+        for key, pattern_list in _POSITION_SUGGESTION_PATTERNS.items():
             for pattern in pattern_list:
-                match = re.search(pattern, content)
+                match = pattern.search(content)
                 if match:
                     result[key] = match.group(1).replace('–', '-')
                     break
@@ -0,0 +1,282 @@
+"""
+Pipeline DAG Scheduler
+分析流水线 DAG 调度器
+
+将多Agent分析流程声明为有向无环图：每个节点声明自己依赖哪些节点的输出，
+执行器在节点的所有输入就绪后立即启动它，而不是按固定的层级屏障等待。
+例如技术面、量化面的数据获取可以与基本面分析师的LLM调用同时进行。
+
+CLI（run_analysis）与 API（/api/analyze）驱动同一张图，
+执行器为每个节点发出开始/完成事件（含耗时），调用方据此打印或推送进度。
+
+同一张图有两种执行器：
+- PipelineExecutor: 线程池执行节点的同步函数（CLI）
+- AsyncPipelineExecutor: 在事件循环中执行节点的异步函数（API），
+  没有异步实现的节点才放到线程中执行
+"""
+
+import asyncio
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+@dataclass
+class PipelineNode:
+    """
+    流水线节点
+
+    Attributes:
+        name: 节点名称（图内唯一，也是其输出在结果字典中的键）
+        func: 节点函数，参数为 {输入节点名: 输出}
+        inputs: 依赖的节点名称
+        layer: 所属层级（1-4），用于进度展示
+        tolerate_errors: 为 True 时节点异常不会中断流水线，异常对象作为其输出传给下游
+        afunc: 节点的异步实现（参数同 func），供 AsyncPipelineExecutor 使用
+        inline: 纯计算节点（如汇总），异步执行器直接在事件循环中调用 func
+    """
+    name: str
+    func: Callable[[Dict[str, Any]], Any]
+    inputs: List[str] = field(default_factory=list)
+    layer: int = 0
+    tolerate_errors: bool = False
+    afunc: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None
+    inline: bool = False
+
+
+@dataclass
+class NodeEvent:
+    """节点事件（node_start / node_done / node_error）"""
+    type: str
+    node: str
+    layer: int
+    result: Any = None
+    elapsed: float = 0.0
+    error: Optional[BaseException] = None
+    cached: bool = False  # 输出由调用方预先给定（如命中缓存），节点未实际执行
+
+
+class PipelineError(RuntimeError):
+    """流水线节点执行失败"""
+
+    def __init__(self, node: str, error: BaseException):
+        super().__init__(f"节点 {node} 执行失败: {error}")
+        self.node = node
+        self.error = error
+
+
+class PipelineGraph:
+    """节点的有向无环图"""
+
+    def __init__(self, nodes: List[PipelineNode]):
+        self.nodes: Dict[str, PipelineNode] = {}
+        for node in nodes:
+            if node.name in self.nodes:
+                raise ValueError(f"重复的节点名称: {node.name}")
+            self.nodes[node.name] = node
+        for node in nodes:
+            for dep in node.inputs:
+                if dep not in self.nodes:
+                    raise ValueError(f"节点 {node.name} 依赖不存在的节点 {dep}")
+        self._check_acyclic()
+
+    def _check_acyclic(self) -> None:
+        remaining = {name: set(node.inputs) for name, node in self.nodes.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"流水线存在循环依赖: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+
+class PipelineExecutor:
+    """按依赖关系并发执行流水线节点"""
+
+    def __init__(self, max_workers: int = 8):
+        """
+        Args:
+            max_workers: 同时执行的节点数上限
+        """
+        self.max_workers = max_workers
+
+    def run(
+        self,
+        graph: PipelineGraph,
+        on_event: Optional[Callable[[NodeEvent], None]] = None,
+        initial: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        执行整张图
+
+        事件回调在调用 run 的线程中触发，回调内无需考虑线程安全。
+
+        Args:
+            graph: 流水线图
+            on_event: 节点事件回调
+            initial: 预先给定的节点输出（对应节点不再执行，直接发出 cached 的完成事件）
+
+        Returns:
+            {节点名: 输出}
+
+        Raises:
+            PipelineError: 某个不容错的节点抛出异常（已在运行的节点会先执行完毕）
+        """
+        emit = on_event or (lambda event: None)
+        results: Dict[str, Any] = dict(initial or {})
+        pending = {name: node for name, node in graph.nodes.items() if name not in results}
+        running: Dict[Future, PipelineNode] = {}
+        started_at: Dict[str, float] = {}
+        failure: Optional[PipelineError] = None
+
+        for name, result in results.items():
+            if name in graph.nodes:
+                emit(NodeEvent(
+                    type="node_done", node=name, layer=graph.nodes[name].layer,
+                    result=result, cached=True
+                ))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline") as executor:
+            while pending or running:
+                if failure is None:
+                    ready = [
+                        node for node in pending.values()
+                        if all(dep in results for dep in node.inputs)
+                    ]
+                    for node in ready:
+                        del pending[node.name]
+                        inputs = {dep: results[dep] for dep in node.inputs}
+                        started_at[node.name] = time.perf_counter()
+                        emit(NodeEvent(type="node_start", node=node.name, layer=node.layer))
+                        running[executor.submit(node.func, inputs)] = node
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    elapsed = time.perf_counter() - started_at[node.name]
+                    error = future.exception()
+                    if error is None:
+                        results[node.name] = future.result()
+                        emit(NodeEvent(
+                            type="node_done", node=node.name, layer=node.layer,
+                            result=results[node.name], elapsed=elapsed
+                        ))
+                    elif node.tolerate_errors:
+                        results[node.name] = error
+                        emit(NodeEvent(
+                            type="node_error", node=node.name, layer=node.layer,
+                            elapsed=elapsed, error=error
+                        ))
+                    else:
+                        emit(NodeEvent(
+                            type="node_error", node=node.name, layer=node.layer,
+                            elapsed=elapsed, error=error
+                        ))
+                        if failure is None:
+                            failure = PipelineError(node.name, error)
+
+        if failure is not None:
+            raise failure
+        return results
+
+
+class AsyncPipelineExecutor:
+    """在事件循环中按依赖关系并发执行流水线节点"""
+
+    def __init__(self, max_concurrency: int = 8):
+        """
+        Args:
+            max_concurrency: 同时执行的节点数上限
+        """
+        self.max_concurrency = max_concurrency
+
+    async def run(
+        self,
+        graph: PipelineGraph,
+        on_event: Optional[Callable[[NodeEvent], None]] = None,
+        initial: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        执行整张图（语义与 PipelineExecutor.run 相同，事件回调在事件循环中触发）
+
+        有 afunc 的节点直接 await；inline 节点直接调用 func；
+        其余节点通过 asyncio.to_thread 执行 func。
+        run 被取消时先取消并等待所有执行中的节点（线程中的 func 无法中断，会运行至结束），再向上抛出。
+        """
+        emit = on_event or (lambda event: None)
+        results: Dict[str, Any] = dict(initial or {})
+        pending = {name: node for name, node in graph.nodes.items() if name not in results}
+        running: Dict[asyncio.Task, PipelineNode] = {}
+        started_at: Dict[str, float] = {}
+        failure: Optional[PipelineError] = None
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def execute(node: PipelineNode, inputs: Dict[str, Any]) -> Any:
+            async with semaphore:
+                if node.afunc is not None:
+                    return await node.afunc(inputs)
+                if node.inline:
+                    return node.func(inputs)
+                return await asyncio.to_thread(node.func, inputs)
+
+        for name, result in results.items():
+            if name in graph.nodes:
+                emit(NodeEvent(
+                    type="node_done", node=name, layer=graph.nodes[name].layer,
+                    result=result, cached=True
+                ))
+
+        try:
+            while pending or running:
+                if failure is None:
+                    ready = [
+                        node for node in pending.values()
+                        if all(dep in results for dep in node.inputs)
+                    ]
+                    for node in ready:
+                        del pending[node.name]
+                        inputs = {dep: results[dep] for dep in node.inputs}
+                        started_at[node.name] = time.perf_counter()
+                        emit(NodeEvent(type="node_start", node=node.name, layer=node.layer))
+                        running[asyncio.create_task(execute(node, inputs))] = node
+
+                if not running:
+                    break
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node = running.pop(task)
+                    elapsed = time.perf_counter() - started_at[node.name]
+                    error = task.exception()
+                    if error is None:
+                        results[node.name] = task.result()
+                        emit(NodeEvent(
+                            type="node_done", node=node.name, layer=node.layer,
+                            result=results[node.name], elapsed=elapsed
+                        ))
+                    else:
+                        if node.tolerate_errors:
+                            results[node.name] = error
+                        emit(NodeEvent(
+                            type="node_error", node=node.name, layer=node.layer,
+                            elapsed=elapsed, error=error
+                        ))
+                        if not node.tolerate_errors and failure is None:
+                            failure = PipelineError(node.name, error)
+        except asyncio.CancelledError:
+            # 流水线被取消（如客户端断开）：取消所有执行中的节点并等待其退出，
+            # 不再发起新的LLM调用，也不会启动下游节点
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            raise
+
+        if failure is not None:
+            raise failure
+        return results
@@ -0,0 +1,119 @@
+"""
+Prompt Token Budget
+提示词 token 预算与用量统计
+
+每次LLM调用前离线估算提示词的 token 数（与 debate_memory.estimate_tokens 同一估算方法），
+超出角色的预算（Settings.llm_prompt_tokens / llm_role_prompt_tokens）时，
+按提示词中各小节的优先级从低到高依次截断或省略，不把超长的提示词发给模型。
+
+每次调用完成后统计用量：服务商在响应中返回用量（usage_metadata）时使用实际值，
+否则使用离线估算。TokenUsage 按角色汇总一次分析的用量。
+"""
+
+import threading
+from typing import Any, Dict, List, Sequence, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from src.agent.debate_memory import estimate_tokens, truncate_to_tokens
+
+
+# 每条消息的格式开销（角色标记、分隔符）和回复起始标记，参照 OpenAI 聊天格式
+_MESSAGE_OVERHEAD = 4
+_REPLY_PRIMER = 3
+
+_OMITTED = "（超出提示词预算，已省略）"
+
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(part if isinstance(part, str) else str(part.get("text", "")) for part in content)
+    return str(content)
+
+
+def prompt_tokens(prompt: ChatPromptTemplate) -> int:
+    """估算提示词（全部消息）的 token 数"""
+    messages = prompt.format_messages()
+    return sum(estimate_tokens(_content_text(m.content)) + _MESSAGE_OVERHEAD for m in messages) + _REPLY_PRIMER
+
+
+def message_tokens(message: Any) -> int:
+    """估算响应消息正文的 token 数"""
+    return estimate_tokens(_content_text(getattr(message, "content", message)))
+
+
+def fit_sections(
+    sections: Dict[str, str],
+    trim_order: Sequence[str],
+    max_tokens: int
+) -> Tuple[Dict[str, str], List[str]]:
+    """
+    将提示词各小节压缩到 max_tokens 以内
+
+    按 trim_order（优先级从低到高）依次处理：先截断该小节的末尾，
+    截断到不剩内容时整节省略；总量回到预算以内即停止，更重要的小节保持原样。
+
+    Args:
+        sections: {小节名: 文本}
+        trim_order: 可裁剪的小节名，优先级低的在前；未列出的小节不裁剪
+        max_tokens: 各小节合计的 token 上限
+
+    Returns:
+        (裁剪后的小节, 被裁剪的小节名)
+    """
+    fitted = dict(sections)
+    trimmed: List[str] = []
+    total = sum(estimate_tokens(text) for text in fitted.values())
+    for name in trim_order:
+        if total <= max_tokens:
+            break
+        text = fitted.get(name)
+        if not text:
+            continue
+        cost = estimate_tokens(text)
+        fitted[name] = truncate_to_tokens(text, cost - (total - max_tokens)) or _OMITTED
+        total += estimate_tokens(fitted[name]) - cost
+        trimmed.append(name)
+    return fitted, trimmed
+
+
+class TokenUsage:
+    """一次分析的 token 用量（汇总 token_usage 事件，可在多个线程中调用 add）"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_calls = 0  # 服务商未返回用量、使用离线估算的调用次数
+        self.by_role: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, role: str, info: Dict[str, Any]) -> None:
+        """
+        记录一次调用
+
+        Args:
+            role: 角色
+            info: token_usage 事件信息（prompt_tokens / completion_tokens / estimated）
+        """
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += info["prompt_tokens"]
+            self.completion_tokens += info["completion_tokens"]
+            self.estimated_calls += 1 if info.get("estimated") else 0
+            role_usage = self.by_role.setdefault(role, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            role_usage["calls"] += 1
+            role_usage["prompt_tokens"] += info["prompt_tokens"]
+            role_usage["completion_tokens"] += info["completion_tokens"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "estimated_calls": self.estimated_calls,
+                "by_role": {role: dict(usage) for role, usage in self.by_role.items()},
+            }
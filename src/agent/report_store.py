@@ -0,0 +1,68 @@
+"""
+Analyst Report Store
+分析师报告存储
+
+每次完整分析后把第1层的 AnalystTeamReport 保存为 data_dir/reports/<report_id>.json。
+用户只想换一个 debate_threshold / max_rounds 试试时，可以凭 report_id
+只重跑研究员、交易员、风险和投资组合经理这几层，不必再调用5位分析师。
+"""
+
+import datetime
+import os
+import re
+import uuid
+from typing import Any, Dict
+
+from src.utils import load_from_json, save_to_json
+
+
+_REPORT_ID_PATTERN = re.compile(r'^[0-9A-Za-z_-]{1,64}$')
+
+
+def _report_path(report_id: str) -> str:
+    from src.config import get_settings
+
+    if not _REPORT_ID_PATTERN.match(report_id):
+        raise ValueError(f"无效的报告ID: {report_id}")
+    return os.path.join(get_settings().data_dir, "reports", f"{report_id}.json")
+
+
+def save_report(symbol: str, analyst_team: Dict[str, Any], **extra: Any) -> str:
+    """
+    保存分析师报告
+
+    Args:
+        symbol: 股票代码
+        analyst_team: AnalystTeamReport.to_dict() 的结果
+        **extra: 其他需要一并记录的字段（如模型名称）
+
+    Returns:
+        报告ID
+    """
+    now = datetime.datetime.now()
+    report_id = f"{symbol}-{now.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    save_to_json({
+        "report_id": report_id,
+        "symbol": symbol,
+        "created_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+        **extra,
+        "analyst_team": analyst_team,
+    }, _report_path(report_id))
+    return report_id
+
+
+def load_report(report_id: str) -> Dict[str, Any]:
+    """
+    读取分析师报告
+
+    Returns:
+        包含 report_id、symbol、created_at、analyst_team 等字段的字典
+
+    Raises:
+        ValueError: 报告ID格式无效
+        FileNotFoundError: 报告不存在
+    """
+    path = _report_path(report_id)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"报告不存在: {report_id}")
+    return load_from_json(path)
@@ -0,0 +1,134 @@
+"""
+Structured Agent Output
+Agent 结构化输出
+
+默认模式下，评分、投资建议、仓位和信心水平都靠一串正则从长篇中文回答里提取，
+提取失败时静默退回默认值（如 5.0 分）。结构化模式下，需要被解析的角色在回答末尾
+附带一个 ```json 代码块，按 pydantic 模型校验：
+- 评分类角色（基本面/技术/量化分析师、多空研究员）: {"score": 7.5}
+- 交易员: {"recommendation": "买入", "position": "轻仓"}
+- 投资组合经理: {"recommendation": ..., "confidence": ..., "position_suggestions": {...}}
+
+代码块放在正文之后，流式输出不受影响；解析失败时用一次不流式的修复调用
+只让模型输出 JSON，仍失败才退回正则提取。
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Literal, Optional, Tuple, Type
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel, Field
+
+
+# 回答中的 JSON 代码块（取最后一个）
+_JSON_BLOCK = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.S)
+
+
+class ScoreOutput(BaseModel):
+    score: float = Field(ge=0, le=10)
+
+
+class TraderOutput(BaseModel):
+    recommendation: Literal["买入", "持有", "卖出"]
+    position: Literal["轻仓", "半仓", "重仓", "观望"]
+
+
+class PositionSuggestions(BaseModel):
+    aggressive: str
+    moderate: str
+    conservative: str
+
+
+class PortfolioOutput(BaseModel):
+    recommendation: Literal["买入", "持有", "卖出"]
+    confidence: Literal["高", "中", "低"]
+    position_suggestions: PositionSuggestions
+
+
+@dataclass
+class OutputSchema:
+    """角色的结构化输出格式"""
+    model: Type[BaseModel]
+    example: str  # 给模型看的 JSON 示例
+    description: str  # 各字段含义
+
+
+SCORE_SCHEMA = OutputSchema(
+    model=ScoreOutput,
+    example='{"score": 7.5}',
+    description="score: 评分，0-10 的数字"
+)
+TRADER_SCHEMA = OutputSchema(
+    model=TraderOutput,
+    example='{"recommendation": "买入", "position": "轻仓"}',
+    description="recommendation: 买入/持有/卖出 之一；position: 轻仓/半仓/重仓/观望 之一"
+)
+PORTFOLIO_SCHEMA = OutputSchema(
+    model=PortfolioOutput,
+    example=(
+        '{"recommendation": "持有", "confidence": "中", "position_suggestions": '
+        '{"aggressive": "30-50%", "moderate": "20-30%", "conservative": "10-20%"}}'
+    ),
+    description=(
+        "recommendation: 买入/持有/卖出 之一；confidence: 高/中/低 之一；"
+        "position_suggestions: 激进型(aggressive)/稳健型(moderate)/保守型(conservative)投资者的建议仓位"
+    )
+)
+
+# 角色 -> 输出格式（按 AgentRole 的值；未列出的角色只输出正文）
+ROLE_SCHEMAS: Dict[str, OutputSchema] = {
+    "fundamentals_analyst": SCORE_SCHEMA,
+    "technical_analyst": SCORE_SCHEMA,
+    "quant_analyst": SCORE_SCHEMA,
+    "bullish_researcher": SCORE_SCHEMA,
+    "bearish_researcher": SCORE_SCHEMA,
+    "trader": TRADER_SCHEMA,
+    "portfolio_manager": PORTFOLIO_SCHEMA,
+}
+
+
+def _validate(model: Type[BaseModel], data: Any) -> BaseModel:
+    validate = getattr(model, "model_validate", None) or model.parse_obj
+    return validate(data)
+
+
+def with_format_instructions(prompt: ChatPromptTemplate, schema: OutputSchema) -> ChatPromptTemplate:
+    """在提示词末尾追加输出格式要求（消息对象不参与模板变量替换，JSON 中的花括号无需转义）"""
+    instructions = (
+        "完成以上分析后，请在回答的最后单独附上一个 ```json 代码块，格式如下：\n"
+        f"```json\n{schema.example}\n```\n"
+        f"字段说明: {schema.description}"
+    )
+    return ChatPromptTemplate.from_messages(list(prompt.messages) + [HumanMessage(content=instructions)])
+
+
+def parse_structured(content: str, schema: OutputSchema) -> Tuple[str, Optional[BaseModel], Optional[str]]:
+    """
+    从回答中解析结构化数据
+
+    Returns:
+        (去掉 JSON 代码块后的正文, 校验后的数据, 错误信息)；解析失败时数据为 None
+    """
+    matches = list(_JSON_BLOCK.finditer(content))
+    if not matches:
+        return content, None, "回答中没有 JSON 代码块"
+    match = matches[-1]
+    prose = (content[:match.start()] + content[match.end():]).strip()
+    try:
+        return prose, _validate(schema.model, json.loads(match.group(1))), None
+    except Exception as e:
+        return prose, None, str(e)
+
+
+def repair_prompt(content: str, schema: OutputSchema, error: Optional[str]) -> ChatPromptTemplate:
+    """解析失败时的修复提示词：只要求模型按格式输出 JSON"""
+    return ChatPromptTemplate.from_messages([
+        SystemMessage(content="你负责把分析回答中的结论整理为 JSON，只输出一个 ```json 代码块，不要输出其他内容。"),
+        HumanMessage(content=(
+            f"格式: {schema.example}\n字段说明: {schema.description}\n"
+            f"上一次解析失败的原因: {error}\n\n回答:\n{content}"
+        )),
+    ])
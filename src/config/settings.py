@@ -9,6 +9,14 @@ from dataclasses import dataclass
 from dotenv import load_dotenv
 
 
+def _env_bool(name: str, default: bool) -> bool:
+    """读取布尔型环境变量（1/true/yes 视为真）"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 @dataclass
 class Settings:
     """
@@ -21,6 +29,48 @@ class Settings:
         temperature: 温度参数
         max_iterations: Agent最大迭代次数
         data_dir: 数据目录
+        bar_store_enabled: 是否启用本地日线存储
+        bar_store_path: 本地日线存储（SQLite）路径，为空时使用 data_dir/bars.sqlite
+        bar_refresh_seconds: 本地日线距上次同步超过该秒数才增量更新
+        news_cache_ttl: 个股新闻缓存过期时间（秒）
+        news_cache_size: 个股新闻缓存最多保留的股票数
+        spot_refresh_trading: 交易时段全市场行情快照刷新间隔（秒）
+        spot_refresh_idle: 非交易时段全市场行情快照刷新间隔（秒）
+        macro_ttl: 宏观经济指标缓存时间（秒）
+        global_news_ttl: 全球市场新闻缓存时间（秒）
+        market_mood_ttl: 大盘情绪缓存时间（秒）
+        benchmark_ttl: 基准指数日线缓存时间（秒）
+        tool_io_concurrency: 全局同时执行的数据工具调用上限
+        pipeline_concurrency: 单次分析中同时执行的流水线节点上限
+        llm_cache_enabled: 是否启用LLM响应磁盘缓存
+        llm_cache_path: LLM响应缓存（SQLite）路径，为空时使用 data_dir/llm_cache.sqlite
+        llm_cache_ttl: LLM响应缓存有效期（秒）
+        llm_cache_max_entries: LLM响应缓存最多保留的条目数
+        analyst_cache_enabled: 是否在请求之间共享分析师结果
+        analyst_cache_ttl: 分析师结果缓存时间（秒）
+        analyst_cache_size: 分析师结果缓存最多保留的条目数
+        llm_max_connections: 每个LLM API地址的最大HTTP连接数
+        llm_max_keepalive: 每个LLM API地址保持的空闲长连接数
+        llm_keepalive_expiry: 空闲长连接保留时间（秒）
+        llm_pool_size: 进程内复用的LLM客户端（模型+密钥+地址）数量上限
+        llm_limit_initial: 每个 API地址+模型 的初始LLM并发窗口
+        llm_limit_min: LLM并发窗口下限
+        llm_limit_max: LLM并发窗口上限
+        llm_latency_target: 单次LLM调用超过该秒数视为拥塞并缩小窗口（0 表示不按耗时调整）
+        llm_request_budget: 一次分析中所有LLM调用的总时间预算（秒，0 表示不限，默认不限）
+        llm_call_timeout: 单次LLM调用的超时上限（秒，0 表示不限，默认不限）
+        llm_hedge_percentile: 调用超过最近耗时的该分位数仍无输出时发起对冲请求（0 表示不对冲）
+        llm_hedge_min_samples: 计算对冲延迟所需的最少耗时样本数
+        llm_fallback_model: 主模型超时后改用的备用模型（为空时不降级）
+        llm_fallback_timeout: 备用模型调用的超时（秒）
+        llm_role_models: 按角色的模型路由表（JSON，格式见 resolve_role_models），为空时所有角色使用同一模型
+        llm_structured_output: 评分/决策类角色是否在回答末尾附带 JSON 结论（替代正则提取）
+        debate_prompt_tokens: 单次辩论反驳提示词的 token 上限（分析报告 + 对方观点，0 表示不限）
+        analyst_digest_tokens: 每份分析师报告摘要的 token 上限（研究员、辩论和交易员使用摘要而非全文）
+        llm_prompt_tokens: 单次LLM调用提示词的默认 token 预算（离线估算，超出时裁剪低优先级小节，0 表示不限）
+        llm_role_prompt_tokens: 按角色的提示词 token 预算（JSON，{角色或分组: token数}），覆盖 llm_prompt_tokens
+        analysis_dedup_enabled: 参数相同的并发分析请求是否共享同一次运行（后加入的请求回放已有事件）
+        analysis_abandon_grace: 共享的分析无人观看超过该秒数后取消
     """
     api_key: str
     base_url: str
@@ -28,6 +78,48 @@ class Settings:
     temperature: float = 0.3
     max_iterations: int = 10
     data_dir: str = "data"
+    bar_store_enabled: bool = True
+    bar_store_path: str = ""
+    bar_refresh_seconds: int = 300
+    news_cache_ttl: float = 300.0
+    news_cache_size: int = 256
+    spot_refresh_trading: float = 30.0
+    spot_refresh_idle: float = 1800.0
+    macro_ttl: float = 86400.0
+    global_news_ttl: float = 1800.0
+    market_mood_ttl: float = 300.0
+    benchmark_ttl: float = 300.0
+    tool_io_concurrency: int = 16
+    pipeline_concurrency: int = 8
+    llm_cache_enabled: bool = False
+    llm_cache_path: str = ""
+    llm_cache_ttl: float = 43200.0
+    llm_cache_max_entries: int = 5000
+    analyst_cache_enabled: bool = True
+    analyst_cache_ttl: float = 14400.0
+    analyst_cache_size: int = 1024
+    llm_max_connections: int = 64
+    llm_max_keepalive: int = 32
+    llm_keepalive_expiry: float = 60.0
+    llm_pool_size: int = 64
+    llm_limit_initial: int = 4
+    llm_limit_min: int = 1
+    llm_limit_max: int = 32
+    llm_latency_target: float = 60.0
+    llm_request_budget: float = 0.0
+    llm_call_timeout: float = 0.0
+    llm_hedge_percentile: float = 0.95
+    llm_hedge_min_samples: int = 20
+    llm_fallback_model: str = ""
+    llm_fallback_timeout: float = 60.0
+    llm_role_models: str = ""
+    llm_structured_output: bool = False
+    debate_prompt_tokens: int = 6000
+    analyst_digest_tokens: int = 300
+    llm_prompt_tokens: int = 8000
+    llm_role_prompt_tokens: str = ""
+    analysis_dedup_enabled: bool = True
+    analysis_abandon_grace: float = 10.0
     
     @classmethod
     def from_env(cls) -> 'Settings':
@@ -45,7 +137,49 @@ class Settings:
             model=os.getenv("model", "Qwen/Qwen2.5-7B-Instruct"),
             temperature=float(os.getenv("temperature", "0.3")),
             max_iterations=int(os.getenv("max_iterations", "10")),
-            data_dir=os.getenv("data_dir", "data")
+            data_dir=os.getenv("data_dir", "data"),
+            bar_store_enabled=_env_bool("bar_store_enabled", True),
+            bar_store_path=os.getenv("bar_store_path", ""),
+            bar_refresh_seconds=int(os.getenv("bar_refresh_seconds", "300")),
+            news_cache_ttl=float(os.getenv("news_cache_ttl", "300")),
+            news_cache_size=int(os.getenv("news_cache_size", "256")),
+            spot_refresh_trading=float(os.getenv("spot_refresh_trading", "30")),
+            spot_refresh_idle=float(os.getenv("spot_refresh_idle", "1800")),
+            macro_ttl=float(os.getenv("macro_ttl", "86400")),
+            global_news_ttl=float(os.getenv("global_news_ttl", "1800")),
+            market_mood_ttl=float(os.getenv("market_mood_ttl", "300")),
+            benchmark_ttl=float(os.getenv("benchmark_ttl", "300")),
+            tool_io_concurrency=int(os.getenv("tool_io_concurrency", "16")),
+            pipeline_concurrency=int(os.getenv("pipeline_concurrency", "8")),
+            llm_cache_enabled=_env_bool("llm_cache_enabled", False),
+            llm_cache_path=os.getenv("llm_cache_path", ""),
+            llm_cache_ttl=float(os.getenv("llm_cache_ttl", "43200")),
+            llm_cache_max_entries=int(os.getenv("llm_cache_max_entries", "5000")),
+            analyst_cache_enabled=_env_bool("analyst_cache_enabled", True),
+            analyst_cache_ttl=float(os.getenv("analyst_cache_ttl", "14400")),
+            analyst_cache_size=int(os.getenv("analyst_cache_size", "1024")),
+            llm_max_connections=int(os.getenv("llm_max_connections", "64")),
+            llm_max_keepalive=int(os.getenv("llm_max_keepalive", "32")),
+            llm_keepalive_expiry=float(os.getenv("llm_keepalive_expiry", "60")),
+            llm_pool_size=int(os.getenv("llm_pool_size", "64")),
+            llm_limit_initial=int(os.getenv("llm_limit_initial", "4")),
+            llm_limit_min=int(os.getenv("llm_limit_min", "1")),
+            llm_limit_max=int(os.getenv("llm_limit_max", "32")),
+            llm_latency_target=float(os.getenv("llm_latency_target", "60")),
+            llm_request_budget=float(os.getenv("llm_request_budget", "0")),
+            llm_call_timeout=float(os.getenv("llm_call_timeout", "0")),
+            llm_hedge_percentile=float(os.getenv("llm_hedge_percentile", "0.95")),
+            llm_hedge_min_samples=int(os.getenv("llm_hedge_min_samples", "20")),
+            llm_fallback_model=os.getenv("llm_fallback_model", ""),
+            llm_fallback_timeout=float(os.getenv("llm_fallback_timeout", "60")),
+            llm_role_models=os.getenv("llm_role_models", ""),
+            llm_structured_output=_env_bool("llm_structured_output", False),
+            debate_prompt_tokens=int(os.getenv("debate_prompt_tokens", "6000")),
+            analyst_digest_tokens=int(os.getenv("analyst_digest_tokens", "300")),
+            llm_prompt_tokens=int(os.getenv("llm_prompt_tokens", "8000")),
+            llm_role_prompt_tokens=os.getenv("llm_role_prompt_tokens", ""),
+            analysis_dedup_enabled=_env_bool("analysis_dedup_enabled", True),
+            analysis_abandon_grace=float(os.getenv("analysis_abandon_grace", "10"))
         )
 
 
@@ -49,6 +49,21 @@ from .fundamentals_tools import (
     identify_red_flags
 )
 
+from .market_data import (
+    market_data_session,
+    get_stock_hist,
+)
+
+from .market_context import (
+    get_index_daily,
+    warm_market_context,
+)
+
+from .spot_snapshot import (
+    get_spot_quote,
+    get_spot_service,
+)
+
 from .tool_registry import (
     ToolRegistry,
     tool_registry,
@@ -56,6 +71,11 @@ from .tool_registry import (
     get_tool_registry,
 )
 
+from .rendering import (
+    ToolReport,
+    render_for_llm,
+)
+
 from .risk_metrics import (
     calculate_volatility,
     calculate_beta,
@@ -94,11 +114,21 @@ __all__ = [
     'calculate_intrinsic_value',
     'get_performance_metrics',
     'identify_red_flags',
+    # Shared market data
+    'market_data_session',
+    'get_stock_hist',
+    'get_spot_quote',
+    'get_index_daily',
+    'warm_market_context',
+    'get_spot_service',
     # Tool Registry
     'ToolRegistry',
     'tool_registry',
     'init_tool_registry',
     'get_tool_registry',
+    # Tool output rendering
+    'ToolReport',
+    'render_for_llm',
     # Risk Metrics (Quantitative Analyst)
     'calculate_volatility',
     'calculate_beta',
@@ -0,0 +1,249 @@
+"""
+Local Bar Store
+本地日线存储
+
+将前复权日线持久化到本地 SQLite，每只股票只增量下载上次同步之后的新K线：
+- 距上次同步不足 bar_refresh_seconds 秒时直接读本地
+- 否则从今天之前最后一个已存交易日开始增量下载并合并（今天的K线盘中不断变化，总是覆盖）
+- 若该交易日（已收盘）的收盘价与本地不一致，说明发生了除权除息导致前复权价格整体变动，
+  此时重新下载完整窗口并替换本地数据
+"""
+
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+import pandas as pd
+
+from .singleflight import ak
+
+
+# akshare stock_zh_a_hist 返回的列
+BAR_COLUMNS = [
+    '日期', '股票代码', '开盘', '收盘', '最高', '最低',
+    '成交量', '成交额', '振幅', '涨跌幅', '涨跌额', '换手率',
+]
+
+# 判断前复权价格是否变动的容差（元）
+_ADJUST_TOLERANCE = 0.005
+
+
+def fetch_bars(symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """从 akshare 下载前复权日线（日期格式 YYYYMMDD）"""
+    return ak.stock_zh_a_hist(
+        symbol=symbol,
+        period="daily",
+        start_date=start_date,
+        end_date=end_date,
+        adjust="qfq"
+    )
+
+
+class BarStore:
+    """SQLite 日线存储，按股票增量同步"""
+
+    def __init__(self, path: str, refresh_seconds: int = 300):
+        """
+        Args:
+            path: SQLite 文件路径
+            refresh_seconds: 距上次同步超过该秒数才访问网络
+        """
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            columns = ", ".join(f'"{c}"' for c in BAR_COLUMNS)
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS bars (symbol TEXT NOT NULL, {columns}, "
+                f"PRIMARY KEY (symbol, \"日期\"))"
+            )
+            # window_start: 本地已覆盖的窗口起点；last_date: 最后一个已存交易日
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS bar_sync ("
+                "symbol TEXT PRIMARY KEY, window_start TEXT, last_date TEXT, synced_at REAL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """打开连接，正常退出时提交事务，最后关闭连接"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _symbol_lock(self, symbol: str) -> threading.Lock:
+        with self._locks_guard:
+            if symbol not in self._locks:
+                self._locks[symbol] = threading.Lock()
+            return self._locks[symbol]
+
+    def load(self, symbol: str, days: int) -> pd.DataFrame:
+        """
+        读取最近 days 个自然日的日线，必要时先增量同步
+
+        Args:
+            symbol: 股票代码（6位数字）
+            days: 自然日窗口长度
+
+        Returns:
+            akshare stock_zh_a_hist 格式的 DataFrame（日期为 YYYY-MM-DD 字符串）
+        """
+        start = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
+        with self._symbol_lock(symbol):
+            self._sync(symbol, start)
+        return self.read(symbol, days)
+
+    def read(self, symbol: str, days: int) -> pd.DataFrame:
+        """只读取本地已存的最近 days 个自然日的日线（不同步，下载失败时使用）"""
+        start = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
+        with self._connect() as conn:
+            columns = ", ".join(f'"{c}"' for c in BAR_COLUMNS)
+            return pd.read_sql_query(
+                f'SELECT {columns} FROM bars WHERE symbol = ? AND "日期" >= ? ORDER BY "日期"',
+                conn,
+                params=(symbol, start),
+            )
+
+    def _sync(self, symbol: str, start: str) -> None:
+        """保证本地数据覆盖 [start, 今天]"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT window_start, last_date, synced_at FROM bar_sync WHERE symbol = ?",
+                (symbol,),
+            ).fetchone()
+
+        today = datetime.datetime.now().strftime("%Y%m%d")
+        if row is None or row[0] > start:
+            # 本地没有数据，或本地窗口不够早：下载完整窗口
+            self._replace(symbol, start, fetch_bars(symbol, start.replace("-", ""), today))
+            return
+
+        window_start, last_date, synced_at = row
+        if time.time() - (synced_at or 0) < self.refresh_seconds:
+            return
+        if last_date is None:
+            # 上次下载为空（停牌、新股或代码有误），重新尝试完整窗口
+            self._replace(symbol, window_start, fetch_bars(symbol, window_start.replace("-", ""), today))
+            return
+
+        # 增量下载：从今天之前最后一个已存交易日开始（含），用该日已收盘的价格校验前复权是否变动；
+        # 今天的K线盘中每次刷新都会变，不能用于校验
+        with self._connect() as conn:
+            anchor = conn.execute(
+                'SELECT "日期", "收盘" FROM bars WHERE symbol = ? AND "日期" < ? ORDER BY "日期" DESC LIMIT 1',
+                (symbol, datetime.datetime.now().strftime("%Y-%m-%d")),
+            ).fetchone()
+        anchor_date = anchor[0] if anchor is not None else last_date
+        fresh = _normalize(symbol, fetch_bars(symbol, anchor_date.replace("-", ""), today))
+        if fresh.empty:
+            self._touch(symbol)
+            return
+
+        overlap = fresh[fresh['日期'] == anchor_date]
+        if anchor is not None and not overlap.empty:
+            if abs(float(overlap['收盘'].iloc[0]) - float(anchor[1])) > _ADJUST_TOLERANCE:
+                # 发生除权除息，历史前复权价格已变化，整体重建
+                self._replace(symbol, window_start, fetch_bars(symbol, window_start.replace("-", ""), today))
+                return
+
+        self._merge(symbol, fresh)
+
+    def _replace(self, symbol: str, window_start: str, df: pd.DataFrame) -> None:
+        """用完整窗口替换本地数据"""
+        df = _normalize(symbol, df)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM bars WHERE symbol = ?", (symbol,))
+            self._insert(conn, symbol, df)
+            self._write_sync(conn, symbol, window_start)
+
+    def _merge(self, symbol: str, df: pd.DataFrame) -> None:
+        """合并增量K线（覆盖重叠交易日，当日K线在盘中会不断变化）"""
+        with self._connect() as conn:
+            conn.execute(
+                'DELETE FROM bars WHERE symbol = ? AND "日期" >= ?',
+                (symbol, df['日期'].min()),
+            )
+            self._insert(conn, symbol, df)
+            self._write_sync(conn, symbol)
+
+    def _touch(self, symbol: str) -> None:
+        with self._connect() as conn:
+            conn.execute("UPDATE bar_sync SET synced_at = ? WHERE symbol = ?", (time.time(), symbol))
+
+    def _insert(self, conn: sqlite3.Connection, symbol: str, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        columns = ", ".join(f'"{c}"' for c in BAR_COLUMNS)
+        placeholders = ", ".join("?" for _ in range(len(BAR_COLUMNS) + 1))
+        # 转为 Python 原生类型，sqlite3 不接受 numpy.int64
+        values = df[BAR_COLUMNS].astype(object).where(df[BAR_COLUMNS].notna(), None)
+        rows = [(symbol, *row) for row in values.itertuples(index=False, name=None)]
+        conn.executemany(
+            f"INSERT OR REPLACE INTO bars (symbol, {columns}) VALUES ({placeholders})",
+            rows,
+        )
+
+    def _write_sync(self, conn: sqlite3.Connection, symbol: str, window_start: Optional[str] = None) -> None:
+        """更新同步记录；window_start 为空时保留原窗口起点"""
+        last_date = conn.execute(
+            'SELECT MAX("日期") FROM bars WHERE symbol = ?', (symbol,)
+        ).fetchone()[0]
+        if window_start is None:
+            window_start = conn.execute(
+                "SELECT window_start FROM bar_sync WHERE symbol = ?", (symbol,)
+            ).fetchone()[0]
+        conn.execute(
+            "INSERT OR REPLACE INTO bar_sync (symbol, window_start, last_date, synced_at) "
+            "VALUES (?, ?, ?, ?)",
+            (symbol, window_start, last_date, time.time()),
+        )
+
+
+def _normalize(symbol: str, df: pd.DataFrame) -> pd.DataFrame:
+    """统一列集合与日期格式，便于写入 SQLite"""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=BAR_COLUMNS)
+    df = df.copy()
+    for column in BAR_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+    df['日期'] = pd.to_datetime(df['日期']).dt.strftime("%Y-%m-%d")
+    df['股票代码'] = symbol
+    return df[BAR_COLUMNS]
+
+
+# 全局存储实例
+_bar_store: Optional[BarStore] = None
+_bar_store_lock = threading.Lock()
+
+
+def get_bar_store() -> Optional[BarStore]:
+    """
+    获取全局日线存储实例（单例模式）
+
+    Returns:
+        BarStore对象；配置中关闭本地存储时返回 None
+    """
+    global _bar_store
+    if _bar_store is None:
+        from src.config import get_settings
+
+        settings = get_settings()
+        if not settings.bar_store_enabled:
+            return None
+        with _bar_store_lock:
+            if _bar_store is None:
+                path = settings.bar_store_path or os.path.join(settings.data_dir, "bars.sqlite")
+                _bar_store = BarStore(path, refresh_seconds=settings.bar_refresh_seconds)
+    return _bar_store
@@ -0,0 +1,131 @@
+"""
+TTL Cache
+带过期时间的进程内缓存
+
+线程安全的 LRU + TTL 缓存，并发未命中时只有一个调用方真正加载数据，
+其余调用方等待同一次加载的结果，避免对同一数据源瞬间发起大量重复请求。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Union
+
+
+class _Pending:
+    """一次进行中的加载"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache:
+    """LRU + TTL 缓存，支持并发未命中合并"""
+
+    def __init__(self, ttl: float, maxsize: int = 256):
+        """
+        Args:
+            ttl: 默认过期时间（秒）
+            maxsize: 最多缓存的条目数，超出时淘汰最久未使用的条目
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, _Pending] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """读取未过期的缓存值，不存在时返回 None"""
+        with self._lock:
+            return self._lookup(key)
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        ttl: Union[None, float, Callable[[Any], float]] = None
+    ) -> Any:
+        """
+        读取缓存，未命中时调用 loader 加载并写入缓存
+
+        同一个 key 的并发未命中只会调用一次 loader，其余调用方等待其结果。
+        loader 抛出的异常会传递给所有等待者，且不会被缓存。
+
+        Args:
+            key: 缓存键
+            loader: 无参加载函数
+            ttl: 本条目的过期时间（秒），默认使用缓存的 ttl；
+                也可以传入函数，根据加载结果决定过期时间（例如降级结果缓存更短时间）
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = _Pending()
+                self._inflight[key] = pending
+
+        if not leader:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = loader()
+        except BaseException as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if pending.error is None:
+                    if ttl is None:
+                        ttl = self.ttl
+                    elif callable(ttl):
+                        ttl = ttl(pending.value)
+                    self._store(key, pending.value, ttl)
+            pending.event.set()
+        return pending.value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """写入条目（None 值不缓存）"""
+        with self._lock:
+            self._store(key, value, self.ttl if ttl is None else ttl)
+
+    def invalidate(self, key: Hashable) -> None:
+        """删除单个条目"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def _store(self, key: Hashable, value: Any, ttl: float) -> None:
+        if value is None or ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
@@ -9,15 +9,18 @@ Fundamentals Analysis Tools
 - 财务风险识别
 """
 
-import akshare as ak
+from .singleflight import ak
 import pandas as pd
 from langchain_core.tools import tool
 from typing import Optional
 import datetime
 
+from .rendering import ToolReport
+from .spot_snapshot import get_spot_quote
+
 
 @tool
-def get_company_financials(symbol: str) -> str:
+def get_company_financials(symbol: str) -> ToolReport:
     """
     获取公司的财务报表数据。
     
@@ -25,30 +28,29 @@ def get_company_financials(symbol: str) -> str:
     
     Args:
         symbol: 股票代码（6位数字）
-        
+    
     Returns:
         公司财务数据摘要
-        
+    
     Example:
         >>> result = get_company_financials.invoke({"symbol": "600519"})
     """
     try:
-        result = f"【股票 {symbol} 公司财务数据】\n\n"
+        report = ToolReport(f"股票 {symbol} 公司财务数据")
         
         # 获取股票基本信息
         try:
             stock_info = ak.stock_individual_info_em(symbol=symbol)
             
             if not stock_info.empty:
-                result += "【基本信息】\n"
+                report.section("基本信息")
                 for idx, row in stock_info.iterrows():
                     item = row['item']
                     value = row['value']
                     if item in ['总市值', '流通市值', '总股本', '流通股']:
-                        result += f"  {item}: {value}\n"
-                result += "\n"
+                        report.field(item, value, indent=1)
         except:
-            result += "【基本信息】 获取失败\n\n"
+            report.section("基本信息", "获取失败")
         
         # 获取主要财务指标
         try:
@@ -58,42 +60,42 @@ def get_company_financials(symbol: str) -> str:
             if not financial_df.empty:
                 latest = financial_df.iloc[0]  # 最新一期
                 
-                result += f"【主要财务指标】 (报告期: {latest.get('报告期', 'N/A')})\n\n"
+                report.section("主要财务指标", f"报告期: {latest.get('报告期', 'N/A')}")
                 
                 # 盈利能力
-                result += "盈利能力:\n"
-                result += f"  净资产收益率(ROE): {latest.get('净资产收益率', 'N/A')}%\n"
-                result += f"  总资产收益率(ROA): {latest.get('总资产净利率', 'N/A')}%\n"
-                result += f"  销售净利率: {latest.get('销售净利率', 'N/A')}%\n"
-                result += f"  毛利率: {latest.get('销售毛利率', 'N/A')}%\n\n"
+                report.group("盈利能力")
+                report.field("净资产收益率(ROE)", latest.get('净资产收益率'), "%", indent=1)
+                report.field("总资产收益率(ROA)", latest.get('总资产净利率'), "%", indent=1)
+                report.field("销售净利率", latest.get('销售净利率'), "%", indent=1)
+                report.field("毛利率", latest.get('销售毛利率'), "%", indent=1)
                 
                 # 成长能力
-                result += "成长能力:\n"
-                result += f"  营业收入同比增长: {latest.get('营业收入同比增长', 'N/A')}%\n"
-                result += f"  净利润同比增长: {latest.get('净利润同比增长', 'N/A')}%\n\n"
+                report.group("成长能力")
+                report.field("营业收入同比增长", latest.get('营业收入同比增长'), "%", indent=1)
+                report.field("净利润同比增长", latest.get('净利润同比增长'), "%", indent=1)
                 
                 # 偿债能力
-                result += "偿债能力:\n"
-                result += f"  资产负债率: {latest.get('资产负债率', 'N/A')}%\n"
-                result += f"  流动比率: {latest.get('流动比率', 'N/A')}\n"
-                result += f"  速动比率: {latest.get('速动比率', 'N/A')}\n\n"
+                report.group("偿债能力")
+                report.field("资产负债率", latest.get('资产负债率'), "%", indent=1)
+                report.field("流动比率", latest.get('流动比率'), indent=1)
+                report.field("速动比率", latest.get('速动比率'), indent=1)
                 
                 # 营运能力
-                result += "营运能力:\n"
-                result += f"  总资产周转率: {latest.get('总资产周转率', 'N/A')}\n"
-                result += f"  应收账款周转率: {latest.get('应收账款周转率', 'N/A')}\n"
-                
-        except Exception as e:
-            result += f"【主要财务指标】 获取失败: {str(e)}\n"
+                report.group("营运能力")
+                report.field("总资产周转率", latest.get('总资产周转率'), indent=1)
+                report.field("应收账款周转率", latest.get('应收账款周转率'), indent=1)
         
-        return result
+        except Exception as e:
+            report.section("主要财务指标", f"获取失败: {str(e)}")
         
+        return report
+    
     except Exception as e:
-        return f"公司财务数据获取失败: {str(e)}"
+        return ToolReport.failure(f"公司财务数据获取失败: {str(e)}")
 
 
 @tool
-def calculate_intrinsic_value(symbol: str) -> str:
+def calculate_intrinsic_value(symbol: str) -> ToolReport:
     """
     计算股票的内在价值评估。
     
@@ -101,51 +103,50 @@ def calculate_intrinsic_value(symbol: str) -> str:
     
     Args:
         symbol: 股票代码（6位数字）
-        
+    
     Returns:
         内在价值评估报告
-        
+    
     Example:
         >>> result = calculate_intrinsic_value.invoke({"symbol": "600519"})
     """
     try:
-        result = f"【股票 {symbol} 内在价值评估】\n\n"
+        report = ToolReport(f"股票 {symbol} 内在价值评估")
         
-        # 获取当前股价
+        # 获取当前股价（来自后台刷新的全市场行情快照）
         try:
-            realtime = ak.stock_zh_a_spot_em()
-            stock_data = realtime[realtime['代码'] == symbol]
-            
-            if not stock_data.empty:
-                current_price = float(stock_data.iloc[0]['最新价'])
-                result += f"当前股价: {current_price:.2f}元\n\n"
-            else:
-                current_price = None
-                result += "当前股价: 获取失败\n\n"
+            quote = get_spot_quote(symbol)
         except:
+            quote = None
+        
+        current_price = quote.get('最新价') if quote else None
+        if current_price:
+            report.field("当前股价", f"{current_price:.2f}", "元")
+        else:
             current_price = None
-            result += "当前股价: 获取失败\n\n"
+            report.field("当前股价", "获取失败")
         
         # 获取估值指标
         try:
-            # 获取市盈率等估值数据
-            stock_info = ak.stock_individual_info_em(symbol=symbol)
+            # 优先使用快照中的市盈率/市净率，缺失时再查询个股信息
+            pe_ratio = quote.get('市盈率-动态') if quote else None
+            pb_ratio = quote.get('市净率') if quote else None
             
-            pe_ratio = None
-            pb_ratio = None
-            
-            for idx, row in stock_info.iterrows():
-                if row['item'] == '市盈率-动态':
-                    pe_ratio = float(row['value'])
-                elif row['item'] == '市净率':
-                    pb_ratio = float(row['value'])
+            if pe_ratio is None or pb_ratio is None:
+                stock_info = ak.stock_individual_info_em(symbol=symbol)
+                
+                for idx, row in stock_info.iterrows():
+                    if row['item'] == '市盈率-动态' and pe_ratio is None:
+                        pe_ratio = float(row['value'])
+                    elif row['item'] == '市净率' and pb_ratio is None:
+                        pb_ratio = float(row['value'])
             
-            result += "【估值指标】\n"
-            result += f"市盈率(PE): {pe_ratio if pe_ratio else 'N/A'}\n"
-            result += f"市净率(PB): {pb_ratio if pb_ratio else 'N/A'}\n\n"
+            report.section("估值指标")
+            report.field("市盈率(PE)", pe_ratio if pe_ratio else None)
+            report.field("市净率(PB)", pb_ratio if pb_ratio else None)
             
             # 行业平均估值对比
-            result += "【估值分析】\n"
+            report.section("估值分析")
             
             if pe_ratio:
                 if pe_ratio < 15:
@@ -157,7 +158,7 @@ def calculate_intrinsic_value(symbol: str) -> str:
                 else:
                     pe_assessment = "高估 (PE很高)"
                 
-                result += f"PE评估: {pe_assessment}\n"
+                report.field("PE评估", pe_assessment)
             
             if pb_ratio:
                 if pb_ratio < 1:
@@ -169,9 +170,7 @@ def calculate_intrinsic_value(symbol: str) -> str:
                 else:
                     pb_assessment = "高估 (PB很高)"
                 
-                result += f"PB评估: {pb_assessment}\n"
-            
-            result += "\n"
+                report.field("PB评估", pb_assessment)
             
             # 简化的内在价值估算
             if current_price and pe_ratio:
@@ -181,40 +180,40 @@ def calculate_intrinsic_value(symbol: str) -> str:
                 eps = current_price / pe_ratio if pe_ratio > 0 else 0
                 fair_value = eps * industry_avg_pe
                 
-                result += "【内在价值估算】\n"
-                result += f"基于行业平均PE估算:\n"
-                result += f"  合理价值: {fair_value:.2f}元\n"
-                result += f"  当前价格: {current_price:.2f}元\n"
+                report.section("内在价值估算")
+                report.group("基于行业平均PE估算")
+                report.field("合理价值", f"{fair_value:.2f}", "元", indent=1)
+                report.field("当前价格", f"{current_price:.2f}", "元", indent=1)
                 
                 discount = ((fair_value - current_price) / fair_value * 100) if fair_value > 0 else 0
                 
                 if discount > 20:
-                    valuation = f"低估约{discount:.1f}% 💡"
+                    report.field("估值判断", f"低估约{discount:.1f}%", icon="💡", indent=1)
                 elif discount > -20:
-                    valuation = "估值合理 ✓"
+                    report.field("估值判断", "估值合理", icon="✓", indent=1)
                 else:
-                    valuation = f"高估约{abs(discount):.1f}% ⚠️"
-                
-                result += f"  估值判断: {valuation}\n\n"
-            
-        except Exception as e:
-            result += f"估值数据获取失败: {str(e)}\n"
+                    report.field("估值判断", f"高估约{abs(discount):.1f}%", icon="⚠️", indent=1)
         
-        result += "【投资建议】\n"
-        result += "内在价值评估仅供参考，实际投资需综合考虑：\n"
-        result += "• 公司成长性\n"
-        result += "• 行业前景\n"
-        result += "• 市场情绪\n"
-        result += "• 宏观经济环境\n"
+        except Exception as e:
+            report.text(f"估值数据获取失败: {str(e)}")
         
-        return result
+        report.section("投资建议")
+        report.note(
+            "内在价值评估仅供参考，实际投资需综合考虑：\n"
+            "• 公司成长性\n"
+            "• 行业前景\n"
+            "• 市场情绪\n"
+            "• 宏观经济环境"
+        )
         
+        return report
+    
     except Exception as e:
-        return f"内在价值计算失败: {str(e)}"
+        return ToolReport.failure(f"内在价值计算失败: {str(e)}")
 
 
 @tool
-def get_performance_metrics(symbol: str) -> str:
+def get_performance_metrics(symbol: str) -> ToolReport:
     """
     获取公司业绩指标。
     
@@ -222,15 +221,15 @@ def get_performance_metrics(symbol: str) -> str:
     
     Args:
         symbol: 股票代码（6位数字）
-        
+    
     Returns:
         业绩指标报告
-        
+    
     Example:
         >>> result = get_performance_metrics.invoke({"symbol": "600519"})
     """
     try:
-        result = f"【股票 {symbol} 业绩指标分析】\n\n"
+        report = ToolReport(f"股票 {symbol} 业绩指标分析")
         
         # 获取财务指标
         try:
@@ -240,31 +239,28 @@ def get_performance_metrics(symbol: str) -> str:
                 # 获取最近4个季度的数据
                 recent = financial_df.head(4)
                 
-                result += "【关键业绩指标趋势】\n\n"
+                report.section("关键业绩指标趋势")
                 
                 # ROE趋势
-                roe_list = recent['净资产收益率'].tolist()
-                result += f"净资产收益率(ROE)趋势:\n"
+                report.group("净资产收益率(ROE)趋势")
                 for i, (idx, row) in enumerate(recent.iterrows()):
-                    result += f"  {row['报告期']}: {row['净资产收益率']}%\n"
-                
-                result += "\n"
+                    report.field(str(row['报告期']), row['净资产收益率'], "%", indent=1)
                 
                 # 营收和利润增长
-                result += f"营收和利润增长:\n"
+                report.group("营收和利润增长")
                 latest = recent.iloc[0]
-                result += f"  营业收入同比: {latest.get('营业收入同比增长', 'N/A')}%\n"
-                result += f"  净利润同比: {latest.get('净利润同比增长', 'N/A')}%\n"
-                result += f"  扣非净利润同比: {latest.get('扣非净利润同比增长', 'N/A')}%\n\n"
+                report.field("营业收入同比", latest.get('营业收入同比增长'), "%", indent=1)
+                report.field("净利润同比", latest.get('净利润同比增长'), "%", indent=1)
+                report.field("扣非净利润同比", latest.get('扣非净利润同比增长'), "%", indent=1)
                 
                 # 盈利质量
-                result += f"盈利质量:\n"
-                result += f"  销售毛利率: {latest.get('销售毛利率', 'N/A')}%\n"
-                result += f"  销售净利率: {latest.get('销售净利率', 'N/A')}%\n"
-                result += f"  加权净资产收益率: {latest.get('加权净资产收益率', 'N/A')}%\n\n"
+                report.group("盈利质量")
+                report.field("销售毛利率", latest.get('销售毛利率'), "%", indent=1)
+                report.field("销售净利率", latest.get('销售净利率'), "%", indent=1)
+                report.field("加权净资产收益率", latest.get('加权净资产收益率'), "%", indent=1)
                 
                 # 业绩评估
-                result += "【业绩评估】\n"
+                report.section("业绩评估")
                 
                 try:
                     roe = float(latest.get('净资产收益率', 0))
@@ -272,61 +268,57 @@ def get_performance_metrics(symbol: str) -> str:
                     profit_growth = float(latest.get('净利润同比增长', 0))
                     
                     score = 0
-                    insights = []
                     
                     if roe > 15:
                         score += 2
-                        insights.append("✓ ROE优秀 (>15%)")
+                        report.text("ROE优秀 (>15%)", icon="✓")
                     elif roe > 10:
                         score += 1
-                        insights.append("✓ ROE良好 (>10%)")
+                        report.text("ROE良好 (>10%)", icon="✓")
                     else:
-                        insights.append("⚠️ ROE偏低")
+                        report.text("ROE偏低", icon="⚠️")
                     
                     if revenue_growth > 20:
                         score += 2
-                        insights.append("✓ 营收高增长 (>20%)")
+                        report.text("营收高增长 (>20%)", icon="✓")
                     elif revenue_growth > 0:
                         score += 1
-                        insights.append("✓ 营收正增长")
+                        report.text("营收正增长", icon="✓")
                     else:
-                        insights.append("⚠️ 营收负增长")
+                        report.text("营收负增长", icon="⚠️")
                     
                     if profit_growth > 20:
                         score += 2
-                        insights.append("✓ 利润高增长 (>20%)")
+                        report.text("利润高增长 (>20%)", icon="✓")
                     elif profit_growth > 0:
                         score += 1
-                        insights.append("✓ 利润正增长")
+                        report.text("利润正增长", icon="✓")
                     else:
-                        insights.append("⚠️ 利润负增长")
+                        report.text("利润负增长", icon="⚠️")
                     
-                    for insight in insights:
-                        result += f"{insight}\n"
-                    
-                    result += f"\n综合评分: {score}/6分\n"
+                    report.field("综合评分", f"{score}/6分")
                     
                     if score >= 5:
-                        result += "业绩评级: 优秀 ⭐⭐⭐\n"
+                        report.field("业绩评级", "优秀", icon="⭐⭐⭐")
                     elif score >= 3:
-                        result += "业绩评级: 良好 ⭐⭐\n"
+                        report.field("业绩评级", "良好", icon="⭐⭐")
                     else:
-                        result += "业绩评级: 一般 ⭐\n"
+                        report.field("业绩评级", "一般", icon="⭐")
                 
                 except:
                     pass
-                
-        except Exception as e:
-            result += f"财务指标获取失败: {str(e)}\n"
         
-        return result
+        except Exception as e:
+            report.text(f"财务指标获取失败: {str(e)}")
         
+        return report
+    
     except Exception as e:
-        return f"业绩指标分析失败: {str(e)}"
+        return ToolReport.failure(f"业绩指标分析失败: {str(e)}")
 
 
 @tool
-def identify_red_flags(symbol: str) -> str:
+def identify_red_flags(symbol: str) -> ToolReport:
     """
     识别公司财务风险信号。
     
@@ -334,15 +326,15 @@ def identify_red_flags(symbol: str) -> str:
     
     Args:
         symbol: 股票代码（6位数字）
-        
+    
     Returns:
         财务风险识别报告
-        
+    
     Example:
         >>> result = identify_red_flags.invoke({"symbol": "600519"})
     """
     try:
-        result = f"【股票 {symbol} 财务风险识别】\n\n"
+        report = ToolReport(f"股票 {symbol} 财务风险识别")
         
         red_flags = []
         warnings = []
@@ -358,9 +350,9 @@ def identify_red_flags(symbol: str) -> str:
                 try:
                     debt_ratio = float(latest.get('资产负债率', 0))
                     if debt_ratio > 70:
-                        red_flags.append(f"🚨 资产负债率过高: {debt_ratio}% (>70%，财务杠杆风险)")
+                        red_flags.append(f"资产负债率过高: {debt_ratio}% (>70%，财务杠杆风险)")
                     elif debt_ratio > 60:
-                        warnings.append(f"⚠️ 资产负债率较高: {debt_ratio}% (>60%，需关注)")
+                        warnings.append(f"资产负债率较高: {debt_ratio}% (>60%，需关注)")
                 except:
                     pass
                 
@@ -368,9 +360,9 @@ def identify_red_flags(symbol: str) -> str:
                 try:
                     current_ratio = float(latest.get('流动比率', 0))
                     if current_ratio < 1:
-                        red_flags.append(f"🚨 流动比率过低: {current_ratio} (<1，短期偿债能力不足)")
+                        red_flags.append(f"流动比率过低: {current_ratio} (<1，短期偿债能力不足)")
                     elif current_ratio < 1.5:
-                        warnings.append(f"⚠️ 流动比率偏低: {current_ratio} (<1.5)")
+                        warnings.append(f"流动比率偏低: {current_ratio} (<1.5)")
                 except:
                     pass
                 
@@ -380,9 +372,9 @@ def identify_red_flags(symbol: str) -> str:
                     profit_growth = float(latest.get('净利润同比增长', 0))
                     
                     if revenue_growth > 0 and profit_growth < -20:
-                        red_flags.append(f"🚨 营收增长但利润大幅下滑 (营收{revenue_growth:+.1f}% vs 利润{profit_growth:+.1f}%)")
+                        red_flags.append(f"营收增长但利润大幅下滑 (营收{revenue_growth:+.1f}% vs 利润{profit_growth:+.1f}%)")
                     elif abs(revenue_growth - profit_growth) > 30:
-                        warnings.append(f"⚠️ 营收和利润增速背离较大 (营收{revenue_growth:+.1f}% vs 利润{profit_growth:+.1f}%)")
+                        warnings.append(f"营收和利润增速背离较大 (营收{revenue_growth:+.1f}% vs 利润{profit_growth:+.1f}%)")
                 except:
                     pass
                 
@@ -393,7 +385,7 @@ def identify_red_flags(symbol: str) -> str:
                         prev_roe = float(financial_df.iloc[3].get('净资产收益率', 0))
                         
                         if current_roe < prev_roe * 0.7:
-                            red_flags.append(f"🚨 ROE大幅下滑: {current_roe}% (较一年前下降超30%)")
+                            red_flags.append(f"ROE大幅下滑: {current_roe}% (较一年前下降超30%)")
                 except:
                     pass
                 
@@ -401,42 +393,40 @@ def identify_red_flags(symbol: str) -> str:
                 try:
                     gross_margin = float(latest.get('销售毛利率', 0))
                     if gross_margin < 10:
-                        warnings.append(f"⚠️ 毛利率较低: {gross_margin}% (<10%，盈利能力弱)")
+                        warnings.append(f"毛利率较低: {gross_margin}% (<10%，盈利能力弱)")
                 except:
                     pass
-                
+        
         except Exception as e:
-            result += f"财务数据分析失败: {str(e)}\n\n"
+            report.text(f"财务数据分析失败: {str(e)}")
         
         # 输出风险识别结果
         if red_flags:
-            result += "【严重风险信号 🚨】\n"
+            report.section("严重风险信号", icon="🚨")
             for flag in red_flags:
-                result += f"{flag}\n"
-            result += "\n"
+                report.text(flag, icon="🚨")
         
         if warnings:
-            result += "【警示信号 ⚠️】\n"
+            report.section("警示信号", icon="⚠️")
             for warning in warnings:
-                result += f"{warning}\n"
-            result += "\n"
+                report.text(warning, icon="⚠️")
         
         if not red_flags and not warnings:
-            result += "【风险评估】\n"
-            result += "✓ 未发现明显的财务风险信号\n"
-            result += "✓ 主要财务指标处于健康区间\n\n"
+            report.section("风险评估")
+            report.text("未发现明显的财务风险信号", icon="✓")
+            report.text("主要财务指标处于健康区间", icon="✓")
         
-        result += "【投资建议】\n"
+        report.section("投资建议")
         if red_flags:
-            result += "⚠️ 存在严重财务风险，建议谨慎投资或规避\n"
+            report.text("存在严重财务风险，建议谨慎投资或规避", icon="⚠️")
         elif warnings:
-            result += "⚠️ 存在一些警示信号，建议深入研究后再决策\n"
+            report.text("存在一些警示信号，建议深入研究后再决策", icon="⚠️")
         else:
-            result += "✓ 财务状况相对健康，可继续关注\n"
+            report.text("财务状况相对健康，可继续关注", icon="✓")
         
-        result += "\n注: 财务风险识别仅基于公开数据，实际投资需进一步尽职调查。"
-        
-        return result
+        report.note("\n注: 财务风险识别仅基于公开数据，实际投资需进一步尽职调查。")
         
+        return report
+    
     except Exception as e:
-        return f"财务风险识别失败: {str(e)}"
+        return ToolReport.failure(f"财务风险识别失败: {str(e)}")
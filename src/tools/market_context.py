@@ -0,0 +1,90 @@
+"""
+Market Context
+市场环境上下文
+
+宏观经济指标、全球市场新闻、大盘情绪、基准指数日线都与具体股票无关，
+但每次分析（以及对比分析中的每只股票）都会重新获取一遍。
+本模块按时间窗口缓存这些与个股无关的数据：
+- 宏观经济指标: 默认每天更新一次
+- 全球市场新闻: 默认30分钟
+- 大盘情绪 / 基准指数: 默认5分钟
+
+数据不完整（部分接口失败）的结果只缓存很短时间，尽快重试。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+import pandas as pd
+
+from .cache import TTLCache
+from .rendering import ToolReport
+from .singleflight import ak
+
+
+# 降级结果（部分数据获取失败）的缓存时间（秒）
+DEGRADED_TTL = 60.0
+
+_market_cache = TTLCache(ttl=300, maxsize=64)
+
+
+def get_market_report(name: str, builder: Callable[[], Tuple[ToolReport, bool]], ttl: float) -> ToolReport:
+    """
+    获取按时间窗口缓存的市场报告
+
+    Args:
+        name: 报告名称（缓存键）
+        builder: 生成报告的函数，返回 (报告, 数据是否完整)
+        ttl: 完整报告的缓存时间（秒）
+
+    Returns:
+        报告（缓存中的同一个对象，调用方不要修改）
+    """
+    report, _ = _market_cache.get_or_load(
+        ("report", name),
+        builder,
+        ttl=lambda value: ttl if value[1] else min(ttl, DEGRADED_TTL)
+    )
+    return report
+
+
+def get_index_daily(symbol: str) -> pd.DataFrame:
+    """
+    获取指数日线（如 'sh000001' 上证指数、'sh000300' 沪深300），按基准窗口缓存
+
+    Returns:
+        ak.stock_zh_index_daily 格式的 DataFrame 副本
+    """
+    from src.config import get_settings
+
+    df = _market_cache.get_or_load(
+        ("index", symbol),
+        lambda: ak.stock_zh_index_daily(symbol=symbol),
+        ttl=get_settings().benchmark_ttl
+    )
+    return df.copy()
+
+
+def warm_market_context(benchmark: Optional[str] = "sh000300") -> None:
+    """
+    预先计算所有与个股无关的市场数据
+
+    对比分析在并行分析多只股票之前调用一次，之后每只股票都直接命中缓存。
+    """
+    from .news_analysis_tools import get_macroeconomic_indicators, get_global_market_news
+    from .sentiment_tools import track_market_mood
+
+    tasks = [
+        lambda: get_macroeconomic_indicators.invoke({}),
+        lambda: get_global_market_news.invoke({"max_news": 5}),
+        lambda: track_market_mood.invoke({}),
+    ]
+    if benchmark:
+        tasks.append(lambda: get_index_daily(benchmark))
+
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        for future in [executor.submit(task) for task in tasks]:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[WARN] 市场环境数据预热失败: {e}")
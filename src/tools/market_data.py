@@ -0,0 +1,138 @@
+"""
+Market Data Context
+行情数据上下文
+
+一次分析中，技术、量化、风险等多个工具都需要同一只股票的日线数据。
+本模块在分析期间为每只股票只加载一次最宽窗口的前复权日线，
+各工具从内存中按各自的日期窗口切片使用，避免重复请求 akshare。
+日线优先来自本地日线存储（见 bar_store），只增量下载缺失的K线。
+
+用法:
+    with market_data_session("600519"):
+        df = get_stock_hist("600519", days=90)
+"""
+
+import datetime
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import pandas as pd
+
+from .bar_store import fetch_bars, get_bar_store
+
+
+# 最宽下载窗口（自然日）。约等于 270 个交易日，覆盖一年期（252 交易日）指标所需数据
+HISTORY_WINDOW_DAYS = 400
+
+
+class MarketDataContext:
+    """单只股票的共享行情快照（前复权日线）"""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self._lock = threading.Lock()
+        self._frame: Optional[pd.DataFrame] = None
+        self._dates: Optional[pd.Series] = None
+        self.refcount = 0
+
+    def get_frame(self) -> pd.DataFrame:
+        """获取完整窗口的日线数据（首次调用时下载，之后复用）"""
+        with self._lock:
+            if self._frame is None:
+                self._frame = _fetch_window(self.symbol, HISTORY_WINDOW_DAYS)
+                self._dates = pd.to_datetime(self._frame['日期']) if not self._frame.empty else None
+            return self._frame
+
+    def slice_days(self, days: int) -> pd.DataFrame:
+        """按自然日窗口切片，返回副本（调用方可以放心地增加列）"""
+        df = self.get_frame()
+        if df.empty or self._dates is None:
+            return df.copy()
+        return df[self._dates >= _start_of_window(days)].reset_index(drop=True)
+
+
+# 当前处于分析中的股票 -> 共享上下文
+_contexts: Dict[str, MarketDataContext] = {}
+_contexts_lock = threading.Lock()
+
+
+def _start_of_window(days: int) -> pd.Timestamp:
+    start = datetime.datetime.now() - datetime.timedelta(days=days)
+    return pd.Timestamp(start.strftime("%Y%m%d"))
+
+
+def _fetch_window(symbol: str, days: int) -> pd.DataFrame:
+    """
+    获取指定窗口的前复权日线：优先读本地日线存储（增量同步），不可用时直接下载；
+    同步时下载失败（网络错误、接口异常）则使用本地已存的日线
+    """
+    store = None
+    try:
+        store = get_bar_store()
+    except (sqlite3.Error, OSError) as e:
+        print(f"[WARN] 本地日线存储不可用，直接下载: {e}")
+    if store is not None:
+        try:
+            return store.load(symbol, days)
+        except Exception as e:
+            # 同步失败（requests 的网络错误也是 OSError 的子类），先退回本地已存的日线
+            try:
+                stored = store.read(symbol, days)
+            except (sqlite3.Error, OSError):
+                stored = None
+            if stored is not None and not stored.empty:
+                print(f"[WARN] 日线同步失败，使用本地已存数据（最新 {stored['日期'].iloc[-1]}）: {e}")
+                return stored
+            print(f"[WARN] 日线同步失败且本地无数据，直接下载: {e}")
+    end_date = datetime.datetime.now().strftime("%Y%m%d")
+    start_date = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%Y%m%d")
+    return fetch_bars(symbol, start_date, end_date)
+
+
+@contextmanager
+def market_data_session(symbol: str):
+    """
+    开启一只股票的共享行情会话
+
+    会话期间所有工具对该股票的日线请求都会复用同一份内存数据。
+    同一只股票的并发会话（例如多个用户同时分析）共享同一个上下文，
+    最后一个会话结束时释放数据。
+
+    Args:
+        symbol: 股票代码（6位数字）
+    """
+    with _contexts_lock:
+        ctx = _contexts.get(symbol)
+        if ctx is None:
+            ctx = MarketDataContext(symbol)
+            _contexts[symbol] = ctx
+        ctx.refcount += 1
+    try:
+        yield ctx
+    finally:
+        with _contexts_lock:
+            ctx.refcount -= 1
+            if ctx.refcount <= 0 and _contexts.get(symbol) is ctx:
+                del _contexts[symbol]
+
+
+def get_stock_hist(symbol: str, days: int) -> pd.DataFrame:
+    """
+    获取最近 days 个自然日的前复权日线数据
+
+    处于 market_data_session 中时从共享快照切片，否则单独加载该窗口。
+
+    Args:
+        symbol: 股票代码（6位数字）
+        days: 自然日窗口长度
+
+    Returns:
+        akshare stock_zh_a_hist 格式的 DataFrame
+    """
+    with _contexts_lock:
+        ctx = _contexts.get(symbol)
+    if ctx is not None and days <= HISTORY_WINDOW_DAYS:
+        return ctx.slice_days(days)
+    return _fetch_window(symbol, days)
@@ -9,16 +9,20 @@ News Analysis Tools
 - 全球市场新闻
 """
 
-import akshare as ak
+from .singleflight import ak
 import pandas as pd
 from langchain_core.tools import tool
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 import datetime
 import re
 
+from .market_context import get_market_report
+from .news_cache import fetch_stock_news
+from .rendering import ToolReport
+
 
 @tool
-def analyze_news_sentiment(symbol: str, max_news: int = 10) -> str:
+def analyze_news_sentiment(symbol: str, max_news: int = 10) -> ToolReport:
     """
     分析股票相关新闻的情感倾向。
     
@@ -36,10 +40,10 @@ def analyze_news_sentiment(symbol: str, max_news: int = 10) -> str:
     """
     try:
         # 获取新闻数据
-        news_df = ak.stock_news_em(symbol=symbol)
+        news_df = fetch_stock_news(symbol)
         
         if news_df.empty:
-            return f"未找到股票 {symbol} 的新闻数据"
+            return ToolReport.failure(f"未找到股票 {symbol} 的新闻数据")
         
         # 限制新闻数量
         news_df = news_df.head(max_news)
@@ -94,24 +98,25 @@ def analyze_news_sentiment(symbol: str, max_news: int = 10) -> str:
             overall_sentiment = "整体中性"
         
         # 格式化输出
-        result = f"【股票 {symbol} 新闻情感分析】\n\n"
-        result += f"整体情感: {overall_sentiment} (平均分: {avg_sentiment:.2f})\n"
-        result += f"分析新闻数量: {len(sentiment_results)}\n\n"
+        report = ToolReport(f"股票 {symbol} 新闻情感分析")
+        report.field("整体情感", f"{overall_sentiment} (平均分: {avg_sentiment:.2f})")
+        report.field("分析新闻数量", len(sentiment_results))
         
-        result += "【详细分析】\n"
-        for i, item in enumerate(sentiment_results, 1):
-            result += f"\n{i}. {item['title']}\n"
-            result += f"   来源: {item['source']} | 时间: {item['date']}\n"
-            result += f"   情感: {item['sentiment']} | 评分: {item['score']}\n"
+        report.section("详细分析")
+        report.table(
+            ["标题", "来源", "时间", "情感", "评分"],
+            [[item['title'], item['source'], item['date'], item['sentiment'], item['score']]
+             for item in sentiment_results]
+        )
         
-        return result
+        return report
         
     except Exception as e:
-        return f"新闻情感分析失败: {str(e)}"
+        return ToolReport.failure(f"新闻情感分析失败: {str(e)}")
 
 
 @tool
-def get_macroeconomic_indicators() -> str:
+def get_macroeconomic_indicators() -> ToolReport:
     """
     获取当前的宏观经济指标。
     
@@ -123,90 +128,108 @@ def get_macroeconomic_indicators() -> str:
     Example:
         >>> result = get_macroeconomic_indicators.invoke({})
     """
+    from src.config import get_settings
+
+    # 与个股无关，按时间窗口缓存（默认每天更新一次）
+    return get_market_report("macro", _build_macroeconomic_report, get_settings().macro_ttl)
+
+
+def _build_macroeconomic_report() -> Tuple[ToolReport, bool]:
+    """生成宏观经济指标报告，返回 (报告, 数据是否完整)"""
+    complete = True
     try:
-        result = "【中国宏观经济指标概览】\n\n"
+        report = ToolReport("中国宏观经济指标概览")
         
         # 获取实时PMI数据
         try:
             pmi_df = ak.macro_china_pmi()
             if not pmi_df.empty:
                 latest_pmi = pmi_df.iloc[-1]
-                result += "【PMI指数】\n"
-                result += f"  制造业PMI: {latest_pmi.get('制造业-指数', 'N/A')} ({latest_pmi.get('月份', 'N/A')})\n"
-                result += f"  非制造业PMI: {latest_pmi.get('非制造业-指数', 'N/A')}\n"
-                result += "  说明: PMI>50表示经济扩张\n\n"
+                report.section("PMI指数")
+                report.field("制造业PMI", f"{latest_pmi.get('制造业-指数', 'N/A')} ({latest_pmi.get('月份', 'N/A')})", indent=1)
+                report.field("非制造业PMI", latest_pmi.get('非制造业-指数'), indent=1)
+                report.note("  说明: PMI>50表示经济扩张")
             else:
                 raise ValueError("PMI数据为空")
         except Exception as e:
-            result += "【PMI指数】\n"
-            result += "  实时数据暂时不可用\n"
-            result += "  建议关注国家统计局官方发布\n\n"
+            complete = False
+            report.section("PMI指数")
+            report.text("实时数据暂时不可用", indent=1)
+            report.note("  建议关注国家统计局官方发布")
         
         # 获取实时CPI数据
         try:
             cpi_df = ak.macro_china_cpi_yearly()
             if not cpi_df.empty:
                 latest_cpi = cpi_df.iloc[-1]
-                result += "【CPI指数】\n"
-                result += f"  居民消费价格指数: {latest_cpi.get('同比增长', 'N/A')}% ({latest_cpi.get('月份', 'N/A')})\n"
-                result += "  说明: 反映物价变动趋势\n\n"
+                report.section("CPI指数")
+                report.field("居民消费价格指数", f"{latest_cpi.get('同比增长', 'N/A')}% ({latest_cpi.get('月份', 'N/A')})", indent=1)
+                report.note("  说明: 反映物价变动趋势")
             else:
                 raise ValueError("CPI数据为空")
         except Exception as e:
-            result += "【CPI指数】\n"
-            result += "  实时数据暂时不可用\n"
-            result += "  建议关注国家统计局官方发布\n\n"
+            complete = False
+            report.section("CPI指数")
+            report.text("实时数据暂时不可用", indent=1)
+            report.note("  建议关注国家统计局官方发布")
         
         # 获取实时GDP数据
         try:
             gdp_df = ak.macro_china_gdp_yearly()
             if not gdp_df.empty:
                 latest_gdp = gdp_df.iloc[-1]
-                result += "【GDP数据】\n"
-                result += f"  GDP总量: {latest_gdp.get('国内生产总值-绝对值', 'N/A')}亿元\n"
-                result += f"  同比增长: {latest_gdp.get('国内生产总值-同比增长', 'N/A')}%\n"
-                result += f"  统计时间: {latest_gdp.get('季度', 'N/A')}\n\n"
+                report.section("GDP数据")
+                report.field("GDP总量", latest_gdp.get('国内生产总值-绝对值'), "亿元", indent=1)
+                report.field("同比增长", latest_gdp.get('国内生产总值-同比增长'), "%", indent=1)
+                report.field("统计时间", latest_gdp.get('季度'), indent=1)
             else:
                 raise ValueError("GDP数据为空")
         except Exception as e:
-            result += "【GDP数据】\n"
-            result += "  实时数据暂时不可用\n"
-            result += "  建议关注国家统计局官方发布\n\n"
+            complete = False
+            report.section("GDP数据")
+            report.text("实时数据暂时不可用", indent=1)
+            report.note("  建议关注国家统计局官方发布")
         
         # 货币政策环境（部分数据需要手动更新或从其他来源获取）
-        result += "【货币政策环境】\n"
+        report.section("货币政策环境")
         try:
             # 尝试获取LPR利率
             lpr_df = ak.rate_interbank()
             if not lpr_df.empty:
                 latest_lpr = lpr_df.iloc[-1]
-                result += f"  市场利率: {latest_lpr.get('利率', 'N/A')}\n"
+                report.field("市场利率", latest_lpr.get('利率'), indent=1)
         except:
             pass
         
-        result += "  政策取向: 稳健的货币政策\n"
-        result += "  说明: 保持流动性合理充裕\n\n"
+        report.note("  政策取向: 稳健的货币政策\n  说明: 保持流动性合理充裕")
         
-        # 市场环境评估
-        result += "【市场环境评估】\n"
-        result += "  - 宏观经济: 基于实时数据分析\n"
-        result += "  - 政策面: 积极的财政政策和稳健的货币政策\n"
-        result += "  - 流动性: 保持合理充裕\n"
-        result += "  - 外部环境: 需关注国际经济形势\n\n"
+        # 市场环境评估（固定表述，不随数据变化）
+        report.section("市场环境评估")
+        report.note(
+            "  - 宏观经济: 基于实时数据分析\n"
+            "  - 政策面: 积极的财政政策和稳健的货币政策\n"
+            "  - 流动性: 保持合理充裕\n"
+            "  - 外部环境: 需关注国际经济形势"
+        )
         
-        result += "【投资建议】\n"
-        result += "基于最新宏观经济数据进行投资决策。\n"
-        result += "建议关注政策支持的行业和经济增长点。\n"
-        result += "注: 以上数据来自公开数据源，请以官方发布为准。"
+        report.section("投资建议")
+        report.note(
+            "基于最新宏观经济数据进行投资决策。\n"
+            "建议关注政策支持的行业和经济增长点。\n"
+            "注: 以上数据来自公开数据源，请以官方发布为准。"
+        )
         
-        return result
+        return report, complete
         
     except Exception as e:
-        return f"宏观经济指标获取失败: {str(e)}\n\n建议:\n- 检查网络连接\n- 关注国家统计局官方网站获取最新数据\n- 参考财经媒体的宏观经济报道"
+        return ToolReport.failure(
+            f"宏观经济指标获取失败: {str(e)}",
+            ["检查网络连接", "关注国家统计局官方网站获取最新数据", "参考财经媒体的宏观经济报道"]
+        ), False
 
 
 @tool
-def assess_event_impact(symbol: str, event_description: str = "") -> str:
+def assess_event_impact(symbol: str, event_description: str = "") -> ToolReport:
     """
     评估重大事件对股票的潜在影响。
     
@@ -224,24 +247,24 @@ def assess_event_impact(symbol: str, event_description: str = "") -> str:
     """
     try:
         # 获取最新新闻
-        news_df = ak.stock_news_em(symbol=symbol)
+        news_df = fetch_stock_news(symbol)
         
         if news_df.empty:
-            return f"未找到股票 {symbol} 的相关事件信息"
+            return ToolReport.failure(f"未找到股票 {symbol} 的相关事件信息")
         
         # 分析最近的重大事件
         recent_news = news_df.head(5)
         
-        result = f"【股票 {symbol} 事件影响评估】\n\n"
+        report = ToolReport(f"股票 {symbol} 事件影响评估")
         
         if event_description:
-            result += f"关注事件: {event_description}\n\n"
+            report.field("关注事件", event_description)
         
         # 事件分类关键词
         positive_events = ['政策支持', '业绩增长', '战略合作', '市场拓展', '技术突破', '订单增加']
         negative_events = ['监管调查', '业绩下滑', '高管变动', '市场萎缩', '成本上升', '诉讼风险']
         
-        result += "【近期重大事件】\n"
+        report.section("近期重大事件")
         
         impact_level = "轻微"
         overall_impact = "中性"
@@ -263,22 +286,21 @@ def assess_event_impact(symbol: str, event_description: str = "") -> str:
             else:
                 impact = "中性影响 ○"
             
-            result += f"\n• {title}\n"
-            result += f"  时间: {date} | 影响: {impact}\n"
+            report.text(f"{title} (时间: {date} | 影响: {impact})", icon="•")
         
-        result += f"\n【综合评估】\n"
-        result += f"整体影响: {overall_impact}\n"
-        result += f"影响程度: {impact_level}\n"
-        result += f"建议: 密切关注后续发展，评估事件对基本面的实际影响\n"
+        report.section("综合评估")
+        report.field("整体影响", overall_impact)
+        report.field("影响程度", impact_level)
+        report.note("建议: 密切关注后续发展，评估事件对基本面的实际影响")
         
-        return result
+        return report
         
     except Exception as e:
-        return f"事件影响评估失败: {str(e)}"
+        return ToolReport.failure(f"事件影响评估失败: {str(e)}")
 
 
 @tool
-def get_global_market_news(max_news: int = 10) -> str:
+def get_global_market_news(max_news: int = 10) -> ToolReport:
     """
     获取全球市场重要新闻。
     
@@ -293,8 +315,21 @@ def get_global_market_news(max_news: int = 10) -> str:
     Example:
         >>> result = get_global_market_news.invoke({"max_news": 5})
     """
+    from src.config import get_settings
+
+    # 与个股无关，按时间窗口缓存
+    return get_market_report(
+        f"global_news:{max_news}",
+        lambda: _build_global_market_news(max_news),
+        get_settings().global_news_ttl
+    )
+
+
+def _build_global_market_news(max_news: int) -> Tuple[ToolReport, bool]:
+    """生成全球市场新闻报告，返回 (报告, 数据是否完整)"""
+    complete = True
     try:
-        result = "【全球市场新闻概览】\n\n"
+        report = ToolReport("全球市场新闻概览")
         
         # 获取财经日历重要事件
         try:
@@ -302,29 +337,29 @@ def get_global_market_news(max_news: int = 10) -> str:
             calendar_df = ak.js_news(indicator="财经日历")
             
             if not calendar_df.empty:
-                result += "【财经日历重要事件】\n"
+                report.section("财经日历重要事件")
                 for idx, row in calendar_df.head(max_news).iterrows():
-                    result += f"• {row.get('标题', 'N/A')} - {row.get('时间', 'N/A')}\n"
-                result += "\n"
+                    report.text(f"{row.get('标题', 'N/A')} - {row.get('时间', 'N/A')}", icon="•")
         except:
-            pass
-        
-        # 获取市场要闻
-        try:
-            result += "【市场要闻】\n"
-            result += "• 关注美联储货币政策走向\n"
-            result += "• 关注中美贸易关系进展\n"
-            result += "• 关注全球通胀形势\n"
-            result += "• 关注地缘政治风险\n"
-            result += "• 关注主要经济体GDP增长情况\n\n"
-        except:
-            pass
-        
-        result += "【投资启示】\n"
-        result += "全球市场动态会通过预期、资金流向、汇率等渠道影响A股市场。\n"
-        result += "建议根据国际形势调整投资策略，关注外部风险对国内市场的传导效应。"
-        
-        return result
+            complete = False
+        
+        # 市场要闻（固定的关注要点，不随数据变化）
+        report.section("市场要闻")
+        report.note(
+            "• 关注美联储货币政策走向\n"
+            "• 关注中美贸易关系进展\n"
+            "• 关注全球通胀形势\n"
+            "• 关注地缘政治风险\n"
+            "• 关注主要经济体GDP增长情况"
+        )
+        
+        report.section("投资启示")
+        report.note(
+            "全球市场动态会通过预期、资金流向、汇率等渠道影响A股市场。\n"
+            "建议根据国际形势调整投资策略，关注外部风险对国内市场的传导效应。"
+        )
+        
+        return report, complete
         
     except Exception as e:
-        return f"全球市场新闻获取失败: {str(e)}\n建议关注主流财经媒体的国际新闻"
+        return ToolReport.failure(f"全球市场新闻获取失败: {str(e)}", ["关注主流财经媒体的国际新闻"]), False
@@ -0,0 +1,50 @@
+"""
+Stock News Cache
+个股新闻缓存
+
+新闻、情绪分析师的多个工具都需要同一只股票的新闻列表（ak.stock_news_em）。
+本模块按股票代码缓存新闻数据，过期时间和容量可配置，
+并发未命中时只请求一次东方财富新闻接口。
+"""
+
+import threading
+from typing import Optional
+
+import pandas as pd
+
+from .cache import TTLCache
+from .singleflight import ak
+
+
+_news_cache: Optional[TTLCache] = None
+_news_cache_lock = threading.Lock()
+
+
+def get_news_cache() -> TTLCache:
+    """获取全局新闻缓存实例（单例模式）"""
+    global _news_cache
+    if _news_cache is None:
+        from src.config import get_settings
+
+        settings = get_settings()
+        with _news_cache_lock:
+            if _news_cache is None:
+                _news_cache = TTLCache(
+                    ttl=settings.news_cache_ttl,
+                    maxsize=settings.news_cache_size
+                )
+    return _news_cache
+
+
+def fetch_stock_news(symbol: str) -> pd.DataFrame:
+    """
+    获取个股新闻列表（带缓存）
+
+    Args:
+        symbol: 股票代码（6位数字）
+
+    Returns:
+        ak.stock_news_em 格式的 DataFrame 副本
+    """
+    df = get_news_cache().get_or_load(symbol, lambda: ak.stock_news_em(symbol=symbol))
+    return df.copy()
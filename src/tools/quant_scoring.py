@@ -11,7 +11,7 @@ Quantitative Scoring Module
 - 综合得分与信号生成
 """
 
-import akshare as ak
+from .singleflight import ak
 import pandas as pd
 import numpy as np
 from dataclasses import dataclass
@@ -19,6 +19,9 @@ from typing import Dict, Optional, Tuple
 from langchain_core.tools import tool
 import datetime
 
+from .market_data import get_stock_hist
+from .rendering import ToolReport
+
 
 @dataclass
 class QuantScore:
@@ -268,7 +271,7 @@ def calculate_sentiment_score(volume_ratio: float, money_flow: str) -> float:
 
 
 @tool
-def calculate_multi_factor_score(symbol: str) -> str:
+def calculate_multi_factor_score(symbol: str) -> ToolReport:
     """
     计算股票的多因子量化评分。
     
@@ -285,15 +288,11 @@ def calculate_multi_factor_score(symbol: str) -> str:
         >>> result = calculate_multi_factor_score.invoke({"symbol": "600519"})
     """
     try:
-        # 获取基本数据
-        end_date = datetime.datetime.now().strftime("%Y%m%d")
-        start_date = (datetime.datetime.now() - datetime.timedelta(days=120)).strftime("%Y%m%d")
-        
         # 历史行情
-        df = ak.stock_zh_a_hist(symbol=symbol, start_date=start_date, end_date=end_date, adjust="qfq")
+        df = get_stock_hist(symbol, days=120)
         
         if df.empty or len(df) < 20:
-            return f"数据不足，无法计算股票 {symbol} 的多因子评分"
+            return ToolReport.failure(f"数据不足，无法计算股票 {symbol} 的多因子评分")
         
         # 计算技术指标
         current_price = df['收盘'].iloc[-1]
@@ -359,51 +358,51 @@ def calculate_multi_factor_score(symbol: str) -> str:
         signal, confidence = model.generate_signal(composite_score)
         
         # 生成报告
-        result = f"【股票 {symbol} 多因子量化评分】\n\n"
-        result += f"【因子评分明细】\n"
-        result += f"├─ 价值因子: {value_score:.0f}/100 (PE={pe:.1f}, PB={pb:.2f})\n"
-        result += f"├─ 成长因子: {growth_score:.0f}/100 (营收增长{revenue_growth*100:.1f}%, 利润增长{profit_growth*100:.1f}%)\n"
-        result += f"├─ 质量因子: {quality_score:.0f}/100 (ROE={roe*100:.1f}%, 毛利率{gross_margin*100:.1f}%)\n"
-        result += f"├─ 动量因子: {momentum_score:.0f}/100 (20日涨幅{price_change_20d*100:.1f}%, RSI={rsi:.1f})\n"
-        result += f"└─ 情绪因子: {sentiment_score:.0f}/100 (量比{volume_ratio:.2f}, {money_flow})\n\n"
-        
-        result += f"【综合评分】\n"
-        result += f"综合得分: {composite_score:.1f}/100\n\n"
-        
-        result += f"【量化信号】\n"
+        report = ToolReport(f"股票 {symbol} 多因子量化评分")
+        report.section("因子评分明细")
+        report.field("价值因子", f"{value_score:.0f}/100 (PE={pe:.1f}, PB={pb:.2f})", indent=1)
+        report.field("成长因子", f"{growth_score:.0f}/100 (营收增长{revenue_growth*100:.1f}%, 利润增长{profit_growth*100:.1f}%)", indent=1)
+        report.field("质量因子", f"{quality_score:.0f}/100 (ROE={roe*100:.1f}%, 毛利率{gross_margin*100:.1f}%)", indent=1)
+        report.field("动量因子", f"{momentum_score:.0f}/100 (20日涨幅{price_change_20d*100:.1f}%, RSI={rsi:.1f})", indent=1)
+        report.field("情绪因子", f"{sentiment_score:.0f}/100 (量比{volume_ratio:.2f}, {money_flow})", indent=1)
+        
+        report.section("综合评分")
+        report.field("综合得分", f"{composite_score:.1f}/100")
+        
+        report.section("量化信号")
         signal_cn = {"BUY": "买入", "HOLD": "持有", "SELL": "卖出"}[signal]
-        result += f"信号: {signal_cn}\n"
-        result += f"置信度: {confidence*100:.0f}%\n\n"
+        report.field("信号", signal_cn)
+        report.field("置信度", f"{confidence*100:.0f}", "%")
         
         # 评级说明
         if composite_score >= 70:
-            level = "优秀 ⭐⭐⭐"
+            level, icon = "优秀", "⭐⭐⭐"
             desc = "多因子共振向好，建议积极关注"
         elif composite_score >= 55:
-            level = "良好 ⭐⭐"
+            level, icon = "良好", "⭐⭐"
             desc = "综合表现较好，可适度参与"
         elif composite_score >= 45:
-            level = "中性 ⭐"
+            level, icon = "中性", "⭐"
             desc = "表现一般，建议观望"
         elif composite_score >= 30:
-            level = "较差"
+            level, icon = "较差", ""
             desc = "多项因子偏弱，注意风险"
         else:
-            level = "很差 ⚠️"
+            level, icon = "很差", "⚠️"
             desc = "多因子共振向下，建议规避"
         
-        result += f"【综合评级】\n"
-        result += f"等级: {level}\n"
-        result += f"说明: {desc}\n"
+        report.section("综合评级")
+        report.field("等级", level, icon=icon)
+        report.field("说明", desc)
         
-        return result
+        return report
         
     except Exception as e:
-        return f"多因子评分计算失败: {str(e)}"
+        return ToolReport.failure(f"多因子评分计算失败: {str(e)}")
 
 
 @tool
-def generate_quant_signals(symbol: str) -> str:
+def generate_quant_signals(symbol: str) -> ToolReport:
     """
     生成量化交易信号。
     
@@ -420,13 +419,10 @@ def generate_quant_signals(symbol: str) -> str:
         量化信号报告
     """
     try:
-        end_date = datetime.datetime.now().strftime("%Y%m%d")
-        start_date = (datetime.datetime.now() - datetime.timedelta(days=120)).strftime("%Y%m%d")
-        
-        df = ak.stock_zh_a_hist(symbol=symbol, start_date=start_date, end_date=end_date, adjust="qfq")
+        df = get_stock_hist(symbol, days=120)
         
         if df.empty or len(df) < 60:
-            return f"数据不足，无法生成量化信号"
+            return ToolReport.failure("数据不足，无法生成量化信号")
         
         # 计算均线
         df['MA5'] = df['收盘'].rolling(5).mean()
@@ -495,32 +491,32 @@ def generate_quant_signals(symbol: str) -> str:
             sell_count += 1
         
         # 生成报告
-        result = f"【股票 {symbol} 量化信号报告】\n\n"
-        result += f"当前价格: {current['收盘']:.2f}\n"
-        result += f"MA5/10/20/60: {current['MA5']:.2f}/{current['MA10']:.2f}/{current['MA20']:.2f}/{current['MA60']:.2f}\n"
-        result += f"RSI(14): {current['RSI']:.1f}\n"
-        result += f"MACD: DIF={current['DIF']:.3f}, DEA={current['DEA']:.3f}\n\n"
+        report = ToolReport(f"股票 {symbol} 量化信号报告")
+        report.field("当前价格", f"{current['收盘']:.2f}")
+        report.field("MA5/10/20/60", f"{current['MA5']:.2f}/{current['MA10']:.2f}/{current['MA20']:.2f}/{current['MA60']:.2f}")
+        report.field("RSI(14)", f"{current['RSI']:.1f}")
+        report.field("MACD", f"DIF={current['DIF']:.3f}, DEA={current['DEA']:.3f}")
         
-        result += f"【信号汇总】\n"
+        report.section("信号汇总")
         if signals:
             for signal_type, desc, conf in signals:
                 emoji = "🟢" if "买入" in signal_type else "🔴"
-                result += f"{emoji} {signal_type}: {desc} (置信度{conf*100:.0f}%)\n"
+                report.text(f"{signal_type}: {desc} (置信度{conf*100:.0f}%)", icon=emoji)
         else:
-            result += "暂无明确信号\n"
+            report.text("暂无明确信号")
         
-        result += f"\n【综合判断】\n"
-        result += f"买入信号: {buy_count}个\n"
-        result += f"卖出信号: {sell_count}个\n"
+        report.section("综合判断")
+        report.field("买入信号", buy_count, "个")
+        report.field("卖出信号", sell_count, "个")
         
         if buy_count > sell_count + 1:
-            result += f"倾向: 偏多 📈\n"
+            report.field("倾向", "偏多", icon="📈")
         elif sell_count > buy_count + 1:
-            result += f"倾向: 偏空 📉\n"
+            report.field("倾向", "偏空", icon="📉")
         else:
-            result += f"倾向: 中性 ➡️\n"
+            report.field("倾向", "中性", icon="➡️")
         
-        return result
+        return report
         
     except Exception as e:
-        return f"量化信号生成失败: {str(e)}"
+        return ToolReport.failure(f"量化信号生成失败: {str(e)}")
@@ -0,0 +1,228 @@
+"""
+Tool Report Rendering
+工具结果渲染
+
+工具原先直接拼接给人看的文本：emoji、树形符号、每次都一样的投资建议套话、
+Markdown 表格，这些文本原样粘贴进LLM提示词，占用大量输入 token。
+
+现在工具返回 ToolReport（结构化的报告内容），由两种渲染方式输出：
+- str(report): 给人看的版本（CLI、调试），与原先的格式一致
+- report.compact(): 给LLM的紧凑版本：去掉 emoji 和装饰符号，省略说明性套话（note），
+  同一小节的连续字段合并为一行，表格用 "|" 分隔、不补齐空格
+
+render_for_llm() 对 ToolReport 取紧凑版本，对普通字符串去掉装饰符号。
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Sequence
+
+
+# emoji、符号、箭头、制表符等装饰字符（紧凑版本中去掉）
+_DECORATION = re.compile(
+    "[\U0001F300-\U0001FAFF\u2190-\u21FF\u2500-\u25FF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D]"
+)
+# 行首的项目符号
+_LEADING_BULLET = re.compile(r"^\s*(?:[•·]\s*|[-*]\s+)")
+
+
+def _strip_decoration(text: str) -> str:
+    return re.sub(r"\s{2,}", " ", _DECORATION.sub("", text)).strip()
+
+
+@dataclass
+class _Block:
+    kind: str  # section / group / field / text / note / table
+    text: str = ""
+    value: Any = None
+    unit: str = ""
+    icon: str = ""
+    indent: int = 0
+    columns: Sequence[str] = ()
+    rows: List[Sequence[Any]] = field(default_factory=list)
+
+
+class ToolReport:
+    """工具的结构化结果（按顺序记录标题、小节、字段、文本、说明和表格）"""
+
+    def __init__(self, title: str = ""):
+        """
+        Args:
+            title: 报告标题（如 "股票 600519 波动率分析"）
+        """
+        self.title = title
+        self._blocks: List[_Block] = []
+
+    # ==================== 构建 ====================
+
+    def section(self, heading: str, detail: str = "", icon: str = "") -> "ToolReport":
+        """小节标题 【heading】，detail 为标题后的补充说明（如报告期）"""
+        self._blocks.append(_Block("section", text=heading, value=detail, icon=icon))
+        return self
+
+    def group(self, label: str) -> "ToolReport":
+        """小节内的分组标题（如 "盈利能力:"），紧凑版本中作为其后字段的前缀"""
+        self._blocks.append(_Block("group", text=label))
+        return self
+
+    def field(self, label: str, value: Any, unit: str = "", icon: str = "", indent: int = 0) -> "ToolReport":
+        """
+        字段 "label: value"
+
+        Args:
+            label: 字段名
+            value: 字段值（已格式化的文本或数字）；None 表示缺失，给人看的版本显示 N/A，紧凑版本省略
+            unit: 单位（如 "%"、"元"），值缺失时不显示
+            icon: 值后面的图标（紧凑版本中去掉）
+            indent: 缩进层级（给人看的版本）
+        """
+        self._blocks.append(_Block("field", text=label, value=value, unit=unit, icon=icon, indent=indent))
+        return self
+
+    def text(self, text: str, icon: str = "", indent: int = 0) -> "ToolReport":
+        """一行文本（结论、新闻条目等），icon 显示在行首（紧凑版本中去掉）"""
+        self._blocks.append(_Block("text", text=text, icon=icon, indent=indent))
+        return self
+
+    def note(self, text: str) -> "ToolReport":
+        """说明性文字（通用建议、免责声明、指标释义），只出现在给人看的版本中"""
+        self._blocks.append(_Block("note", text=text))
+        return self
+
+    def table(self, columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> "ToolReport":
+        """表格"""
+        self._blocks.append(_Block("table", columns=list(columns), rows=[list(row) for row in rows]))
+        return self
+
+    @classmethod
+    def failure(cls, message: str, advice: Sequence[str] = ()) -> "ToolReport":
+        """获取或计算失败时的结果（建议只出现在给人看的版本中）"""
+        report = cls().text(message)
+        if advice:
+            report.note("建议:\n" + "\n".join(f"- {item}" for item in advice))
+        return report
+
+    # ==================== 读取 ====================
+
+    def fields(self) -> Dict[str, Any]:
+        """所有字段 {字段名: 值}（同名字段取最后一个）"""
+        return {block.text: block.value for block in self._blocks if block.kind == "field"}
+
+    # ==================== 渲染 ====================
+
+    def __str__(self) -> str:
+        """给人看的版本"""
+        parts: List[str] = []
+        current: List[str] = []
+        if self.title:
+            parts.append(f"【{self.title}】")
+
+        for block in self._blocks:
+            pad = "  " * block.indent
+            if block.kind == "section":
+                if current:
+                    parts.append("\n".join(current))
+                icon = f" {block.icon}" if block.icon else ""
+                detail = f" ({block.value})" if block.value else ""
+                current = [f"【{block.text}{icon}】{detail}"]
+            elif block.kind == "group":
+                current.append(f"{block.text}:")
+            elif block.kind == "field":
+                value = "N/A" if block.value is None else f"{block.value}{block.unit}"
+                icon = f" {block.icon}" if block.icon else ""
+                current.append(f"{pad}{block.text}: {value}{icon}")
+            elif block.kind == "text":
+                icon = f"{block.icon} " if block.icon else ""
+                current.append(f"{pad}{icon}{block.text}")
+            elif block.kind == "note":
+                current.append(block.text)
+            elif block.kind == "table":
+                current.append(_markdown_table(block.columns, block.rows))
+        if current:
+            parts.append("\n".join(current))
+        return "\n\n".join(parts)
+
+    def compact(self) -> str:
+        """给LLM的紧凑版本"""
+        lines: List[str] = []
+        if self.title:
+            lines.append(f"【{_strip_decoration(self.title)}】")
+        run: List[str] = []
+        prefix = ""
+        # 小节标题等到有内容时才输出（只含说明的小节整体省略）
+        heading = ""
+
+        def emit(line: str) -> None:
+            nonlocal heading
+            if heading:
+                lines.append(heading)
+                heading = ""
+            lines.append(line)
+
+        def flush() -> None:
+            nonlocal prefix
+            if run:
+                emit(f"{prefix}{'; '.join(run)}")
+                run.clear()
+            prefix = ""
+
+        for block in self._blocks:
+            if block.kind == "field":
+                if block.value is not None:
+                    run.append(f"{block.text}:{_strip_decoration(f'{block.value}{block.unit}')}")
+                continue
+            flush()
+            if block.kind == "section":
+                detail = _strip_decoration(str(block.value)) if block.value else ""
+                if detail:
+                    # 带补充说明的标题（如 "获取失败"）本身就是内容
+                    heading = ""
+                    lines.append(f"【{block.text}】{detail}")
+                else:
+                    heading = f"【{block.text}】"
+            elif block.kind == "group":
+                prefix = f"{block.text.rstrip(':：')}: "
+            elif block.kind == "text":
+                text = _LEADING_BULLET.sub("", _strip_decoration(block.text))
+                if text:
+                    emit(text)
+            elif block.kind == "table":
+                emit("|".join(str(column) for column in block.columns))
+                lines.extend("|".join(_compact_cell(cell) for cell in row) for row in block.rows)
+        flush()
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        return f"ToolReport({self.title!r}, blocks={len(self._blocks)})"
+
+
+def _compact_cell(value: Any) -> str:
+    if isinstance(value, float):
+        if abs(value) < 1:
+            return f"{value:.4g}"
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    return _strip_decoration(str(value))
+
+
+def _markdown_table(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> str:
+    lines = [
+        "| " + " | ".join(str(column) for column in columns) + " |",
+        "|" + "|".join("---" for _ in columns) + "|",
+    ]
+    lines.extend("| " + " | ".join(str(cell) for cell in row) + " |" for row in rows)
+    return "\n".join(lines)
+
+
+def compact_text(text: str) -> str:
+    """普通文本的紧凑版本：去掉装饰符号和空行"""
+    lines = (_LEADING_BULLET.sub("", _strip_decoration(line)) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def render_for_llm(value: Any) -> str:
+    """工具输出在LLM提示词中的文本"""
+    if isinstance(value, ToolReport):
+        return value.compact()
+    if isinstance(value, str):
+        return compact_text(value)
+    return str(value)
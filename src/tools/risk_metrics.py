@@ -10,16 +10,20 @@ Risk Metrics Tools
 - VaR (风险价值)
 """
 
-import akshare as ak
+from .singleflight import ak
 import pandas as pd
 import numpy as np
 from langchain_core.tools import tool
 from typing import Optional
 import datetime
 
+from .market_context import get_index_daily
+from .market_data import get_stock_hist
+from .rendering import ToolReport
+
 
 @tool
-def calculate_volatility(symbol: str, period: int = 60) -> str:
+def calculate_volatility(symbol: str, period: int = 60) -> ToolReport:
     """
     计算股票的历史波动率。
     
@@ -38,13 +42,10 @@ def calculate_volatility(symbol: str, period: int = 60) -> str:
     """
     try:
         # 获取历史数据
-        end_date = datetime.datetime.now().strftime("%Y%m%d")
-        start_date = (datetime.datetime.now() - datetime.timedelta(days=period + 30)).strftime("%Y%m%d")
-        
-        df = ak.stock_zh_a_hist(symbol=symbol, start_date=start_date, end_date=end_date, adjust="qfq")
+        df = get_stock_hist(symbol, days=period + 30)
         
         if df.empty or len(df) < 20:
-            return f"数据不足，无法计算股票 {symbol} 的波动率"
+            return ToolReport.failure(f"数据不足，无法计算股票 {symbol} 的波动率")
         
         # 计算日收益率
         df['returns'] = df['收盘'].pct_change()
@@ -57,43 +58,43 @@ def calculate_volatility(symbol: str, period: int = 60) -> str:
         rolling_vol = df['returns'].rolling(20).std() * np.sqrt(252)
         current_vol_percentile = (rolling_vol.iloc[-1] < rolling_vol).mean() * 100
         
-        result = f"【股票 {symbol} 波动率分析】\n\n"
-        result += f"【历史波动率】\n"
-        result += f"日波动率: {daily_vol*100:.2f}%\n"
-        result += f"年化波动率: {annual_vol*100:.2f}%\n"
-        result += f"波动率分位数: {current_vol_percentile:.1f}%\n\n"
+        report = ToolReport(f"股票 {symbol} 波动率分析")
+        report.section("历史波动率")
+        report.field("日波动率", f"{daily_vol*100:.2f}", "%")
+        report.field("年化波动率", f"{annual_vol*100:.2f}", "%")
+        report.field("波动率分位数", f"{current_vol_percentile:.1f}", "%")
         
         # 波动率评级
         if annual_vol < 0.20:
-            vol_level = "低波动 ✓"
+            vol_level, icon = "低波动", "✓"
             risk_desc = "股价波动较小，风险相对可控"
         elif annual_vol < 0.35:
-            vol_level = "中等波动"
+            vol_level, icon = "中等波动", ""
             risk_desc = "波动处于正常水平"
         elif annual_vol < 0.50:
-            vol_level = "高波动 ⚠️"
+            vol_level, icon = "高波动", "⚠️"
             risk_desc = "波动较大，需注意风险控制"
         else:
-            vol_level = "极高波动 🚨"
+            vol_level, icon = "极高波动", "🚨"
             risk_desc = "波动极大，高风险品种"
         
-        result += f"【波动率评级】\n"
-        result += f"等级: {vol_level}\n"
-        result += f"说明: {risk_desc}\n\n"
+        report.section("波动率评级")
+        report.field("等级", vol_level, icon=icon)
+        report.field("说明", risk_desc)
         
         # 近期走势
-        result += f"【近期走势】\n"
-        result += f"近5日涨幅: {(df['收盘'].iloc[-1]/df['收盘'].iloc[-6]-1)*100:.2f}%\n"
-        result += f"近20日涨幅: {(df['收盘'].iloc[-1]/df['收盘'].iloc[-21]-1)*100:.2f}%\n"
+        report.section("近期走势")
+        report.field("近5日涨幅", f"{(df['收盘'].iloc[-1]/df['收盘'].iloc[-6]-1)*100:.2f}", "%")
+        report.field("近20日涨幅", f"{(df['收盘'].iloc[-1]/df['收盘'].iloc[-21]-1)*100:.2f}", "%")
         
-        return result
+        return report
         
     except Exception as e:
-        return f"波动率计算失败: {str(e)}"
+        return ToolReport.failure(f"波动率计算失败: {str(e)}")
 
 
 @tool
-def calculate_beta(symbol: str, benchmark: str = "000300", period: int = 120) -> str:
+def calculate_beta(symbol: str, benchmark: str = "000300", period: int = 120) -> ToolReport:
     """
     计算股票的贝塔系数。
     
@@ -111,18 +112,17 @@ def calculate_beta(symbol: str, benchmark: str = "000300", period: int = 120) ->
         贝塔系数分析报告
     """
     try:
-        end_date = datetime.datetime.now().strftime("%Y%m%d")
         start_date = (datetime.datetime.now() - datetime.timedelta(days=period + 30)).strftime("%Y%m%d")
         
         # 获取个股数据
-        stock_df = ak.stock_zh_a_hist(symbol=symbol, start_date=start_date, end_date=end_date, adjust="qfq")
+        stock_df = get_stock_hist(symbol, days=period + 30)
         
-        # 获取指数数据
-        index_df = ak.stock_zh_index_daily(symbol=f"sh{benchmark}")
-        index_df = index_df[index_df['date'] >= start_date]
+        # 获取指数数据（与个股无关，按基准窗口缓存）
+        index_df = get_index_daily(f"sh{benchmark}")
+        index_df = index_df[pd.to_datetime(index_df['date']) >= pd.Timestamp(start_date)]
         
         if stock_df.empty or index_df.empty:
-            return f"数据不足，无法计算贝塔系数"
+            return ToolReport.failure(f"数据不足，无法计算贝塔系数")
         
         # 计算收益率
         stock_returns = stock_df['收盘'].pct_change().dropna()
@@ -141,40 +141,40 @@ def calculate_beta(symbol: str, benchmark: str = "000300", period: int = 120) ->
         # 计算相关系数
         correlation = np.corrcoef(stock_returns, index_returns)[0][1]
         
-        result = f"【股票 {symbol} 贝塔系数分析】\n\n"
-        result += f"【贝塔系数】\n"
-        result += f"Beta: {beta:.2f}\n"
-        result += f"与大盘相关性: {correlation:.2f}\n\n"
+        report = ToolReport(f"股票 {symbol} 贝塔系数分析")
+        report.section("贝塔系数")
+        report.field("Beta", f"{beta:.2f}")
+        report.field("与大盘相关性", f"{correlation:.2f}")
         
         # 贝塔评级
         if beta > 1.5:
-            beta_type = "高贝塔 (进攻型) 🚀"
+            beta_type, icon = "高贝塔 (进攻型)", "🚀"
             risk_desc = "波动显著大于市场，适合牛市"
         elif beta > 1.0:
-            beta_type = "中高贝塔"
+            beta_type, icon = "中高贝塔", ""
             risk_desc = "波动略大于市场"
         elif beta > 0.7:
-            beta_type = "中等贝塔"
+            beta_type, icon = "中等贝塔", ""
             risk_desc = "波动与市场接近"
         elif beta > 0.3:
-            beta_type = "低贝塔 (防守型) 🛡️"
+            beta_type, icon = "低贝塔 (防守型)", "🛡️"
             risk_desc = "波动小于市场，适合熊市防守"
         else:
-            beta_type = "极低贝塔"
+            beta_type, icon = "极低贝塔", ""
             risk_desc = "与市场相关性很低"
         
-        result += f"【贝塔评级】\n"
-        result += f"类型: {beta_type}\n"
-        result += f"说明: {risk_desc}\n"
+        report.section("贝塔评级")
+        report.field("类型", beta_type, icon=icon)
+        report.field("说明", risk_desc)
         
-        return result
+        return report
         
     except Exception as e:
-        return f"贝塔系数计算失败: {str(e)}"
+        return ToolReport.failure(f"贝塔系数计算失败: {str(e)}")
 
 
 @tool
-def calculate_max_drawdown(symbol: str, period: int = 252) -> str:
+def calculate_max_drawdown(symbol: str, period: int = 252) -> ToolReport:
     """
     计算股票的最大回撤。
     
@@ -188,13 +188,10 @@ def calculate_max_drawdown(symbol: str, period: int = 252) -> str:
         最大回撤分析报告
     """
     try:
-        end_date = datetime.datetime.now().strftime("%Y%m%d")
-        start_date = (datetime.datetime.now() - datetime.timedelta(days=period + 30)).strftime("%Y%m%d")
-        
-        df = ak.stock_zh_a_hist(symbol=symbol, start_date=start_date, end_date=end_date, adjust="qfq")
+        df = get_stock_hist(symbol, days=period + 30)
         
         if df.empty or len(df) < 20:
-            return f"数据不足，无法计算最大回撤"
+            return ToolReport.failure(f"数据不足，无法计算最大回撤")
         
         prices = df['收盘'].values
         
@@ -209,39 +206,39 @@ def calculate_max_drawdown(symbol: str, period: int = 252) -> str:
         end_idx = np.argmax(drawdown)
         start_idx = np.argmax(prices[:end_idx+1]) if end_idx > 0 else 0
         
-        result = f"【股票 {symbol} 最大回撤分析】\n\n"
-        result += f"【最大回撤】\n"
-        result += f"最大回撤幅度: {max_drawdown*100:.2f}%\n"
-        result += f"最高点: {prices[start_idx]:.2f}元\n"
-        result += f"最低点: {prices[end_idx]:.2f}元\n"
-        result += f"回撤持续天数: {end_idx - start_idx}天\n\n"
+        report = ToolReport(f"股票 {symbol} 最大回撤分析")
+        report.section("最大回撤")
+        report.field("最大回撤幅度", f"{max_drawdown*100:.2f}", "%")
+        report.field("最高点", f"{prices[start_idx]:.2f}", "元")
+        report.field("最低点", f"{prices[end_idx]:.2f}", "元")
+        report.field("回撤持续天数", end_idx - start_idx, "天")
         
         # 回撤评级
         if max_drawdown < 0.15:
-            dd_level = "小幅回撤 ✓"
+            dd_level, icon = "小幅回撤", "✓"
             risk_desc = "回撤较小，风险控制良好"
         elif max_drawdown < 0.30:
-            dd_level = "中等回撤"
+            dd_level, icon = "中等回撤", ""
             risk_desc = "回撤处于正常范围"
         elif max_drawdown < 0.50:
-            dd_level = "大幅回撤 ⚠️"
+            dd_level, icon = "大幅回撤", "⚠️"
             risk_desc = "经历过较大回撤，需注意风险"
         else:
-            dd_level = "巨幅回撤 🚨"
+            dd_level, icon = "巨幅回撤", "🚨"
             risk_desc = "回撤超过50%，风险极高"
         
-        result += f"【回撤评级】\n"
-        result += f"等级: {dd_level}\n"
-        result += f"说明: {risk_desc}\n"
+        report.section("回撤评级")
+        report.field("等级", dd_level, icon=icon)
+        report.field("说明", risk_desc)
         
-        return result
+        return report
         
     except Exception as e:
-        return f"最大回撤计算失败: {str(e)}"
+        return ToolReport.failure(f"最大回撤计算失败: {str(e)}")
 
 
 @tool
-def calculate_sharpe_ratio(symbol: str, risk_free_rate: float = 0.02, period: int = 252) -> str:
+def calculate_sharpe_ratio(symbol: str, risk_free_rate: float = 0.02, period: int = 252) -> ToolReport:
     """
     计算股票的夏普比率。
     
@@ -257,13 +254,10 @@ def calculate_sharpe_ratio(symbol: str, risk_free_rate: float = 0.02, period: in
         夏普比率分析报告
     """
     try:
-        end_date = datetime.datetime.now().strftime("%Y%m%d")
-        start_date = (datetime.datetime.now() - datetime.timedelta(days=period + 30)).strftime("%Y%m%d")
-        
-        df = ak.stock_zh_a_hist(symbol=symbol, start_date=start_date, end_date=end_date, adjust="qfq")
+        df = get_stock_hist(symbol, days=period + 30)
         
         if df.empty or len(df) < 60:
-            return f"数据不足，无法计算夏普比率"
+            return ToolReport.failure(f"数据不足，无法计算夏普比率")
         
         # 计算收益率
         returns = df['收盘'].pct_change().dropna()
@@ -277,42 +271,42 @@ def calculate_sharpe_ratio(symbol: str, risk_free_rate: float = 0.02, period: in
         # 夏普比率
         sharpe = (annual_return - risk_free_rate) / annual_vol if annual_vol != 0 else 0
         
-        result = f"【股票 {symbol} 夏普比率分析】\n\n"
-        result += f"【风险调整收益】\n"
-        result += f"年化收益率: {annual_return*100:.2f}%\n"
-        result += f"年化波动率: {annual_vol*100:.2f}%\n"
-        result += f"无风险利率: {risk_free_rate*100:.2f}%\n"
-        result += f"夏普比率: {sharpe:.2f}\n\n"
+        report = ToolReport(f"股票 {symbol} 夏普比率分析")
+        report.section("风险调整收益")
+        report.field("年化收益率", f"{annual_return*100:.2f}", "%")
+        report.field("年化波动率", f"{annual_vol*100:.2f}", "%")
+        report.field("无风险利率", f"{risk_free_rate*100:.2f}", "%")
+        report.field("夏普比率", f"{sharpe:.2f}")
         
         # 夏普评级
         if sharpe > 2.0:
-            sharpe_level = "优秀 ⭐⭐⭐"
+            sharpe_level, icon = "优秀", "⭐⭐⭐"
             desc = "风险调整后收益非常出色"
         elif sharpe > 1.0:
-            sharpe_level = "良好 ⭐⭐"
+            sharpe_level, icon = "良好", "⭐⭐"
             desc = "风险调整后收益较好"
         elif sharpe > 0.5:
-            sharpe_level = "一般 ⭐"
+            sharpe_level, icon = "一般", "⭐"
             desc = "风险调整后收益一般"
         elif sharpe > 0:
-            sharpe_level = "较差"
+            sharpe_level, icon = "较差", ""
             desc = "收益未能很好补偿风险"
         else:
-            sharpe_level = "负收益 ⚠️"
+            sharpe_level, icon = "负收益", "⚠️"
             desc = "收益为负，不如持有现金"
         
-        result += f"【夏普评级】\n"
-        result += f"等级: {sharpe_level}\n"
-        result += f"说明: {desc}\n"
+        report.section("夏普评级")
+        report.field("等级", sharpe_level, icon=icon)
+        report.field("说明", desc)
         
-        return result
+        return report
         
     except Exception as e:
-        return f"夏普比率计算失败: {str(e)}"
+        return ToolReport.failure(f"夏普比率计算失败: {str(e)}")
 
 
 @tool
-def calculate_var(symbol: str, confidence: float = 0.95, period: int = 60) -> str:
+def calculate_var(symbol: str, confidence: float = 0.95, period: int = 60) -> ToolReport:
     """
     计算风险价值(VaR)。
     
@@ -327,13 +321,10 @@ def calculate_var(symbol: str, confidence: float = 0.95, period: int = 60) -> st
         VaR分析报告
     """
     try:
-        end_date = datetime.datetime.now().strftime("%Y%m%d")
-        start_date = (datetime.datetime.now() - datetime.timedelta(days=period + 30)).strftime("%Y%m%d")
-        
-        df = ak.stock_zh_a_hist(symbol=symbol, start_date=start_date, end_date=end_date, adjust="qfq")
+        df = get_stock_hist(symbol, days=period + 30)
         
         if df.empty or len(df) < 30:
-            return f"数据不足，无法计算VaR"
+            return ToolReport.failure(f"数据不足，无法计算VaR")
         
         # 计算日收益率
         returns = df['收盘'].pct_change().dropna()
@@ -351,22 +342,22 @@ def calculate_var(symbol: str, confidence: float = 0.95, period: int = 60) -> st
         # 当前价格
         current_price = df['收盘'].iloc[-1]
         
-        result = f"【股票 {symbol} 风险价值(VaR)分析】\n\n"
-        result += f"当前价格: {current_price:.2f}元\n\n"
-        result += f"【每日VaR (历史模拟法)】\n"
-        result += f"95%置信度VaR: {abs(var_95)*100:.2f}%\n"
-        result += f"  - 意味着有95%的把握，单日亏损不超过{abs(var_95)*100:.2f}%\n"
-        result += f"  - 约等于: {current_price * abs(var_95):.2f}元/股\n\n"
-        result += f"99%置信度VaR: {abs(var_99)*100:.2f}%\n"
-        result += f"  - 意味着有99%的把握，单日亏损不超过{abs(var_99)*100:.2f}%\n\n"
+        report = ToolReport(f"股票 {symbol} 风险价值(VaR)分析")
+        report.field("当前价格", f"{current_price:.2f}", "元")
+        report.section("每日VaR (历史模拟法)")
+        report.field("95%置信度VaR", f"{abs(var_95)*100:.2f}", "%")
+        report.note(f"  - 意味着有95%的把握，单日亏损不超过{abs(var_95)*100:.2f}%")
+        report.field("95%VaR金额", f"{current_price * abs(var_95):.2f}", "元/股", indent=1)
+        report.field("99%置信度VaR", f"{abs(var_99)*100:.2f}", "%")
+        report.note(f"  - 意味着有99%的把握，单日亏损不超过{abs(var_99)*100:.2f}%")
         
-        result += f"【风险提示】\n"
+        report.section("风险提示")
         if abs(var_95) > 0.05:
-            result += f"⚠️ 日VaR较高，单日可能出现较大波动\n"
+            report.text("日VaR较高，单日可能出现较大波动", icon="⚠️")
         else:
-            result += f"✓ 日VaR处于正常水平\n"
+            report.text("日VaR处于正常水平", icon="✓")
         
-        return result
+        return report
         
     except Exception as e:
-        return f"VaR计算失败: {str(e)}"
+        return ToolReport.failure(f"VaR计算失败: {str(e)}")
@@ -8,15 +8,19 @@ Sentiment Analysis Tools
 - 市场情绪追踪
 """
 
-import akshare as ak
+from .singleflight import ak
 import pandas as pd
 from langchain_core.tools import tool
-from typing import Optional
+from typing import Optional, Tuple
 import datetime
 
+from .market_context import get_index_daily, get_market_report
+from .news_cache import fetch_stock_news
+from .rendering import ToolReport
+
 
 @tool
-def analyze_social_media_sentiment(symbol: str) -> str:
+def analyze_social_media_sentiment(symbol: str) -> ToolReport:
     """
     分析社交媒体上关于该股票的情感倾向。
     
@@ -36,10 +40,10 @@ def analyze_social_media_sentiment(symbol: str) -> str:
         try:
             # 这里使用新闻数据作为情绪的代理指标
             # 实际应用中可以接入微博、雪球等API
-            news_df = ak.stock_news_em(symbol=symbol)
+            news_df = fetch_stock_news(symbol)
             
             if news_df.empty:
-                return f"未找到股票 {symbol} 的社交媒体数据"
+                return ToolReport.failure(f"未找到股票 {symbol} 的社交媒体数据")
             
             # 简化的情绪分析
             positive_words = ['看好', '买入', '持有', '上涨', '利好', '机会', '强势', '突破']
@@ -65,51 +69,51 @@ def analyze_social_media_sentiment(symbol: str) -> str:
             
             total = positive_count + negative_count + neutral_count
             
-            result = f"【股票 {symbol} 社交媒体情感分析】\n\n"
-            result += f"分析样本数: {total}\n\n"
-            result += f"情感分布:\n"
-            result += f"  看多: {positive_count} ({positive_count/total*100:.1f}%)\n"
-            result += f"  看空: {negative_count} ({negative_count/total*100:.1f}%)\n"
-            result += f"  中性: {neutral_count} ({neutral_count/total*100:.1f}%)\n\n"
+            report = ToolReport(f"股票 {symbol} 社交媒体情感分析")
+            report.field("分析样本数", total)
+            report.group("情感分布")
+            report.field("看多", f"{positive_count} ({positive_count/total*100:.1f}%)", indent=1)
+            report.field("看空", f"{negative_count} ({negative_count/total*100:.1f}%)", indent=1)
+            report.field("中性", f"{neutral_count} ({neutral_count/total*100:.1f}%)", indent=1)
             
             # 计算情绪指数 (0-100)
             sentiment_index = (positive_count - negative_count) / total * 50 + 50
             
-            result += f"【情绪指数】\n"
-            result += f"综合情绪: {sentiment_index:.1f}/100\n"
+            report.section("情绪指数")
+            report.field("综合情绪", f"{sentiment_index:.1f}/100")
             
             if sentiment_index > 65:
-                mood = "乐观 😊"
+                mood, emoji = "乐观", "😊"
                 interpretation = "市场情绪偏乐观，散户看多情绪浓厚"
             elif sentiment_index > 45:
-                mood = "中性 😐"
+                mood, emoji = "中性", "😐"
                 interpretation = "市场情绪相对平稳，多空分歧不大"
             else:
-                mood = "悲观 😟"
+                mood, emoji = "悲观", "😟"
                 interpretation = "市场情绪偏悲观，散户看空情绪较强"
             
-            result += f"情绪判断: {mood}\n"
-            result += f"解读: {interpretation}\n\n"
+            report.field("情绪判断", mood, icon=emoji)
+            report.field("解读", interpretation)
             
-            result += f"【投资启示】\n"
+            report.section("投资启示")
             if sentiment_index > 75:
-                result += "⚠️ 情绪过度乐观，需警惕追高风险\n"
+                report.text("情绪过度乐观，需警惕追高风险", icon="⚠️")
             elif sentiment_index < 25:
-                result += "💡 情绪过度悲观，可能存在反弹机会\n"
+                report.text("情绪过度悲观，可能存在反弹机会", icon="💡")
             else:
-                result += "✓ 情绪处于合理区间\n"
+                report.text("情绪处于合理区间", icon="✓")
             
-            return result
+            return report
             
         except Exception as e:
-            return f"社交媒体情感分析失败: {str(e)}"
+            return ToolReport.failure(f"社交媒体情感分析失败: {str(e)}")
     
     except Exception as e:
-        return f"社交媒体数据获取失败: {str(e)}"
+        return ToolReport.failure(f"社交媒体数据获取失败: {str(e)}")
 
 
 @tool
-def get_public_sentiment_score(symbol: str) -> str:
+def get_public_sentiment_score(symbol: str) -> ToolReport:
     """
     计算公众情绪评分。
     
@@ -126,10 +130,10 @@ def get_public_sentiment_score(symbol: str) -> str:
     """
     try:
         # 获取新闻数据作为情绪代理
-        news_df = ak.stock_news_em(symbol=symbol)
+        news_df = fetch_stock_news(symbol)
         
         if news_df.empty:
-            return f"无法获取股票 {symbol} 的情绪数据"
+            return ToolReport.failure(f"无法获取股票 {symbol} 的情绪数据")
         
         # 情绪关键词权重
         strong_positive = ['大涨', '暴涨', '创新高', '重大利好', '强烈推荐']
@@ -157,8 +161,8 @@ def get_public_sentiment_score(symbol: str) -> str:
         # 限制在0-10之间
         score = max(0, min(10, score))
         
-        result = f"【股票 {symbol} 公众情绪评分】\n\n"
-        result += f"情绪评分: {score:.1f}/10\n\n"
+        report = ToolReport(f"股票 {symbol} 公众情绪评分")
+        report.field("情绪评分", f"{score:.1f}/10")
         
         # 评分解读
         if score >= 8:
@@ -182,25 +186,29 @@ def get_public_sentiment_score(symbol: str) -> str:
             emoji = "😱"
             warning = "💡 情绪冰点，关注反转信号"
         
-        result += f"情绪等级: {level} {emoji}\n"
-        result += f"风险提示: {warning}\n\n"
+        report.field("情绪等级", level, icon=emoji)
+        report.field("风险提示", warning)
         
-        result += f"【评分说明】\n"
-        result += f"0-2分: 极度悲观 | 2-4分: 悲观 | 4-6分: 中性\n"
-        result += f"6-8分: 乐观 | 8-10分: 极度乐观\n\n"
+        report.section("评分说明")
+        report.note(
+            "0-2分: 极度悲观 | 2-4分: 悲观 | 4-6分: 中性\n"
+            "6-8分: 乐观 | 8-10分: 极度乐观"
+        )
         
-        result += f"【建议】\n"
-        result += f"情绪是重要的市场指标，但不应作为唯一决策依据。\n"
-        result += f"建议结合基本面、技术面进行综合判断。"
+        report.section("建议")
+        report.note(
+            "情绪是重要的市场指标，但不应作为唯一决策依据。\n"
+            "建议结合基本面、技术面进行综合判断。"
+        )
         
-        return result
+        return report
         
     except Exception as e:
-        return f"公众情绪评分失败: {str(e)}"
+        return ToolReport.failure(f"公众情绪评分失败: {str(e)}")
 
 
 @tool
-def track_market_mood() -> str:
+def track_market_mood() -> ToolReport:
     """
     追踪整体市场情绪。
     
@@ -212,13 +220,23 @@ def track_market_mood() -> str:
     Example:
         >>> result = track_market_mood.invoke({})
     """
+    from src.config import get_settings
+
+    # 与个股无关，按时间窗口缓存（默认5分钟）
+    return get_market_report("market_mood", _build_market_mood_report, get_settings().market_mood_ttl)
+
+
+def _build_market_mood_report() -> Tuple[ToolReport, bool]:
+    """生成市场整体情绪报告，返回 (报告, 数据是否完整)"""
+    complete = True
+    sh_index = pd.DataFrame()
     try:
-        result = "【A股市场整体情绪追踪】\n\n"
+        report = ToolReport("A股市场整体情绪追踪")
         
         # 获取市场指数数据
         try:
             # 上证指数
-            sh_index = ak.stock_zh_index_daily(symbol="sh000001")
+            sh_index = get_index_daily("sh000001")
             
             if not sh_index.empty:
                 latest = sh_index.iloc[-1]
@@ -227,43 +245,43 @@ def track_market_mood() -> str:
                 change = latest['close'] - prev['close']
                 change_pct = (change / prev['close']) * 100
                 
-                result += f"【上证指数】\n"
-                result += f"最新收盘: {latest['close']:.2f}\n"
-                result += f"涨跌幅: {change_pct:+.2f}%\n\n"
+                report.section("上证指数")
+                report.field("最新收盘", f"{latest['close']:.2f}")
+                report.field("涨跌幅", f"{change_pct:+.2f}%")
                 
                 # 计算短期涨跌情况
                 recent_5 = sh_index.tail(5)
                 up_days = (recent_5['close'].diff() > 0).sum()
                 
-                result += f"【近5日表现】\n"
-                result += f"上涨天数: {up_days}/5\n"
+                report.section("近5日表现")
+                report.field("上涨天数", f"{up_days}/5")
                 
                 # 市场情绪判断
                 if change_pct > 1:
-                    mood = "强势上涨 🚀"
+                    mood, icon = "强势上涨", "🚀"
                     sentiment = "乐观"
                 elif change_pct > 0:
-                    mood = "温和上涨 📈"
+                    mood, icon = "温和上涨", "📈"
                     sentiment = "偏乐观"
                 elif change_pct > -1:
-                    mood = "温和下跌 📉"
+                    mood, icon = "温和下跌", "📉"
                     sentiment = "偏谨慎"
                 else:
-                    mood = "大幅下跌 ⚠️"
+                    mood, icon = "大幅下跌", "⚠️"
                     sentiment = "谨慎"
                 
-                result += f"当日表现: {mood}\n"
-                result += f"市场情绪: {sentiment}\n\n"
+                report.field("当日表现", mood, icon=icon)
+                report.field("市场情绪", sentiment)
         except:
-            result += "【上证指数】 数据获取失败\n\n"
+            complete = False
+            report.section("上证指数", "数据获取失败")
         
-        # 涨跌家数分析
-        try:
-            result += f"【市场广度】\n"
-            result += f"涨跌家数比是衡量市场情绪的重要指标\n"
-            result += f"建议关注涨停板数量、跌停板数量等数据\n\n"
-        except:
-            pass
+        # 涨跌家数分析（暂无数据，只有说明）
+        report.section("市场广度")
+        report.note(
+            "涨跌家数比是衡量市场情绪的重要指标\n"
+            "建议关注涨停板数量、跌停板数量等数据"
+        )
         
         # 成交量分析
         try:
@@ -273,8 +291,8 @@ def track_market_mood() -> str:
                 
                 vol_ratio = latest_vol / avg_vol
                 
-                result += f"【成交量】\n"
-                result += f"量比: {vol_ratio:.2f}\n"
+                report.section("成交量")
+                report.field("量比", f"{vol_ratio:.2f}")
                 
                 if vol_ratio > 1.5:
                     vol_mood = "放量 (资金活跃)"
@@ -283,16 +301,18 @@ def track_market_mood() -> str:
                 else:
                     vol_mood = "缩量 (观望情绪浓)"
                 
-                result += f"量能判断: {vol_mood}\n\n"
+                report.field("量能判断", vol_mood)
         except:
             pass
         
-        result += f"【投资建议】\n"
-        result += f"• 市场情绪影响短期走势\n"
-        result += f"• 极端情绪往往是转折信号\n"
-        result += f"• 建议结合技术面和基本面判断\n"
+        report.section("投资建议")
+        report.note(
+            "• 市场情绪影响短期走势\n"
+            "• 极端情绪往往是转折信号\n"
+            "• 建议结合技术面和基本面判断"
+        )
         
-        return result
+        return report, complete
         
     except Exception as e:
-        return f"市场情绪追踪失败: {str(e)}"
+        return ToolReport.failure(f"市场情绪追踪失败: {str(e)}"), False
@@ -0,0 +1,113 @@
+"""
+Singleflight Request Coalescing
+akshare 请求合并
+
+对比分析并行分析多只股票、多个用户同时分析同一只热门股票时，
+会在同一时刻发出完全相同的 akshare 请求（如上证指数日线、PMI、财经日历）。
+本模块将"接口名 + 参数"相同的并发调用合并为一次真实请求，所有调用方共享其结果。
+
+工具模块通过 `from .singleflight import ak` 替代 `import akshare as ak` 使用，
+调用方式与 akshare 完全一致。合并基于线程同步，
+对分析师线程池和 asyncio.to_thread 中的调用同样生效。
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+import akshare as _akshare
+
+
+class _Call:
+    """一次进行中的请求"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """相同 key 的并发调用只执行一次"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        执行 fn，若已有相同 key 的调用在进行中则等待并共享其结果
+
+        Args:
+            key: 请求标识
+            fn: 无参调用
+
+        Returns:
+            fn 的返回值（异常同样会传递给所有等待者）
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if leader:
+            try:
+                call.value = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.event.set()
+        else:
+            call.event.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    @property
+    def in_flight(self) -> int:
+        """当前进行中的请求数"""
+        with self._lock:
+            return len(self._calls)
+
+
+def _private_copy(value: Any) -> Any:
+    """共享结果可能被调用方就地修改（如 df['MA5'] = ...），每个调用方拿到独立副本"""
+    copy = getattr(value, "copy", None)
+    return copy() if callable(copy) else value
+
+
+class CoalescedAkshare:
+    """akshare 模块代理：函数调用经过 SingleFlight 合并，其余属性原样返回"""
+
+    def __init__(self, module: Any = _akshare):
+        self._module = module
+        self._flight = SingleFlight()
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._module, name)
+        if not callable(attr):
+            return attr
+
+        def coalesced(*args, **kwargs):
+            try:
+                key = (name, args, tuple(sorted(kwargs.items())))
+                hash(key)
+            except TypeError:
+                return attr(*args, **kwargs)
+            return _private_copy(self._flight.do(key, lambda: attr(*args, **kwargs)))
+
+        coalesced.__name__ = name
+        return coalesced
+
+    @property
+    def in_flight(self) -> int:
+        """当前进行中的 akshare 请求数"""
+        return self._flight.in_flight
+
+
+# 全局 akshare 代理
+ak = CoalescedAkshare()
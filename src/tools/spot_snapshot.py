@@ -0,0 +1,164 @@
+"""
+Spot Snapshot Service
+全市场实时行情快照服务
+
+ak.stock_zh_a_spot_em() 每次返回约5000行的全市场行情，下载很慢。
+本模块在后台线程中定时刷新一份进程级快照（交易时段频繁刷新、非交易时段很少刷新），
+按股票代码建立索引供各工具 O(1) 查询最新价、换手率、市盈率等字段。
+快照只保留用到的列并使用紧凑的数据类型，内存占用有界。
+"""
+
+import datetime
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .singleflight import ak
+
+
+# 保留的数值列（其余列丢弃）
+SPOT_NUMERIC_COLUMNS = ['最新价', '涨跌幅', '换手率', '量比', '市盈率-动态', '市净率', '总市值', '流通市值']
+
+
+def is_trading_time(now: Optional[datetime.datetime] = None) -> bool:
+    """是否处于A股交易时段（含集合竞价前后的少量缓冲）"""
+    now = now or datetime.datetime.now()
+    if now.weekday() >= 5:
+        return False
+    hm = now.hour * 100 + now.minute
+    return 915 <= hm <= 1135 or 1255 <= hm <= 1505
+
+
+class SpotSnapshotService:
+    """全市场行情快照，后台定时刷新"""
+
+    def __init__(self, trading_interval: float = 30, idle_interval: float = 1800):
+        """
+        Args:
+            trading_interval: 交易时段刷新间隔（秒）
+            idle_interval: 非交易时段刷新间隔（秒）
+        """
+        self.trading_interval = trading_interval
+        self.idle_interval = idle_interval
+        self._frame: Optional[pd.DataFrame] = None
+        self._updated_at: float = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """启动后台刷新线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="spot-snapshot", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台刷新线程"""
+        self._stop.set()
+
+    def refresh(self) -> None:
+        """立即下载并替换快照"""
+        frame = _compact(ak.stock_zh_a_spot_em())
+        with self._lock:
+            self._frame = frame
+            self._updated_at = time.time()
+
+    def get_quote(self, symbol: str) -> Optional[Dict[str, float]]:
+        """
+        查询单只股票的最新行情
+
+        首次调用时同步加载快照并启动后台刷新。
+
+        Args:
+            symbol: 股票代码（6位数字）
+
+        Returns:
+            {'名称': ..., '最新价': ..., ...}；快照中没有该股票时返回 None
+        """
+        if self._frame is None:
+            with self._refresh_lock:
+                if self._frame is None:
+                    self.refresh()
+            self.start()
+        frame = self._frame
+        if frame is None or symbol not in frame.index:
+            return None
+        row = frame.loc[symbol]
+        quote = {'名称': row['名称']}
+        for column in SPOT_NUMERIC_COLUMNS:
+            if column in frame.columns:
+                value = row[column]
+                quote[column] = None if pd.isna(value) else _float32_value(value)
+        return quote
+
+    @property
+    def age(self) -> float:
+        """快照距上次刷新的秒数"""
+        return time.time() - self._updated_at if self._updated_at else float("inf")
+
+    def _interval(self) -> float:
+        return self.trading_interval if is_trading_time() else self.idle_interval
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            wait = self._interval() - self.age
+            if wait > 0:
+                self._stop.wait(min(wait, self.trading_interval))
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[WARN] 全市场行情快照刷新失败: {e}")
+                self._stop.wait(self.trading_interval)
+
+
+def _compact(df: pd.DataFrame) -> pd.DataFrame:
+    """只保留用到的列，数值列转 float32，按代码建立索引"""
+    columns = ['代码', '名称'] + [c for c in SPOT_NUMERIC_COLUMNS if c in df.columns]
+    df = df[columns].copy()
+    for column in SPOT_NUMERIC_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(np.float32)
+    df['代码'] = df['代码'].astype(str)
+    return df.drop_duplicates('代码').set_index('代码')
+
+
+def _float32_value(value: float) -> float:
+    """
+    float32 数值转 Python float，保留 float32 的有效位数（7 位）
+
+    直接 float() 会带出 25.299999237060547 这样的二进制误差，进入工具输出和LLM提示词。
+    """
+    return float(f"{float(value):.7g}")
+
+
+_spot_service: Optional[SpotSnapshotService] = None
+_spot_service_lock = threading.Lock()
+
+
+def get_spot_service() -> SpotSnapshotService:
+    """获取全局行情快照服务实例（单例模式）"""
+    global _spot_service
+    if _spot_service is None:
+        from src.config import get_settings
+
+        settings = get_settings()
+        with _spot_service_lock:
+            if _spot_service is None:
+                _spot_service = SpotSnapshotService(
+                    trading_interval=settings.spot_refresh_trading,
+                    idle_interval=settings.spot_refresh_idle
+                )
+    return _spot_service
+
+
+def get_spot_quote(symbol: str) -> Optional[Dict[str, float]]:
+    """查询单只股票的最新行情（见 SpotSnapshotService.get_quote）"""
+    return get_spot_service().get_quote(symbol)
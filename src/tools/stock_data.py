@@ -8,14 +8,20 @@ Stock Data Tools
 - get_stock_technical_indicators: 计算技术指标
 - get_industry_comparison: 行业对比分析
 - analyze_stock_comprehensive: 综合分析
+
+所有工具返回 ToolReport：str() 为给人看的文本，compact() 为给LLM的紧凑文本。
 """
 
-import akshare as ak
+from .singleflight import ak
 import pandas as pd
 from langchain_core.tools import tool
 import datetime
 from typing import Optional
 
+from .market_data import get_stock_hist
+from .news_cache import fetch_stock_news
+from .rendering import ToolReport
+
 
 def get_current_date() -> str:
     """获取今天的日期字符串"""
@@ -38,7 +44,7 @@ def get_date_range(days: int = 30) -> tuple:
 
 
 @tool
-def get_stock_history(symbol: str) -> str:
+def get_stock_history(symbol: str) -> ToolReport:
     """
     获取中国A股股票的近期历史行情数据。
     
@@ -59,35 +65,19 @@ def get_stock_history(symbol: str) -> str:
     
     for attempt in range(max_retries):
         try:
-            # 设定开始时间为 1 个月前
-            start_date = (datetime.datetime.now() - datetime.timedelta(days=30)).strftime("%Y%m%d")
-            end_date = get_current_date()
-
-            # 调用 AkShare 接口：stock_zh_a_hist (A股日频率数据)
-            # period="daily" 日线
-            # adjust="qfq" 前复权 (分析价格趋势通常用前复权)
-            df = ak.stock_zh_a_hist(
-                symbol=symbol, 
-                period="daily", 
-                start_date=start_date, 
-                end_date=end_date, 
-                adjust="qfq"
-            )
+            # 取最近 1 个月的前复权日线（分析期间从共享行情快照切片）
+            df = get_stock_hist(symbol, days=30)
             
             if df.empty:
-                return f"未找到股票 {symbol} 的数据。\n\n可能原因:\n- 股票代码不正确\n- 该股票已退市\n- 数据源暂时不可用\n\n请确认股票代码格式为6位数字（如 600519）"
+                return ToolReport.failure(
+                    f"未找到股票 {symbol} 的数据（股票代码不正确、已退市或数据源暂时不可用）",
+                    ["确认股票代码格式为6位数字（如 600519）"]
+                )
 
-            # 数据清洗
-            df = df[['日期', '开盘', '收盘', '最高', '最低', '成交量']]
-            
             # 只取最近 10 天
-            recent_data = df.tail(10).copy()
-            
-            # 插入 id 列作为第一列
-            recent_data.insert(0, 'id', range(1, len(recent_data) + 1))
-            
-            # 转换为 Markdown
-            return recent_data.to_markdown(index=False)
+            columns = ['日期', '开盘', '收盘', '最高', '最低', '成交量']
+            recent_data = df[columns].tail(10)
+            return ToolReport().table(columns, recent_data.values.tolist())
 
         except Exception as e:
             if attempt < max_retries - 1:
@@ -97,11 +87,14 @@ def get_stock_history(symbol: str) -> str:
                 continue
             else:
                 # 最后一次尝试失败，返回详细错误信息
-                return f"获取股票 {symbol} 数据失败（已重试{max_retries}次）\n\n错误信息: {str(e)}\n\n建议:\n- 检查网络连接\n- 确认股票代码格式正确（6位数字）\n- 稍后重试"
+                return ToolReport.failure(
+                    f"获取股票 {symbol} 数据失败（已重试{max_retries}次）: {str(e)}",
+                    ["检查网络连接", "确认股票代码格式正确（6位数字）", "稍后重试"]
+                )
 
 
 @tool
-def get_stock_news(symbol: str, max_news: int = 10) -> str:
+def get_stock_news(symbol: str, max_news: int = 10) -> ToolReport:
     """
     获取指定股票的最新新闻资讯。
     
@@ -123,32 +116,35 @@ def get_stock_news(symbol: str, max_news: int = 10) -> str:
     for attempt in range(max_retries):
         try:
             # 使用 AkShare 获取个股新闻
-            df = ak.stock_news_em(symbol=symbol)
+            df = fetch_stock_news(symbol)
             
             if df.empty:
-                return f"暂无股票 {symbol} 的新闻数据。\n\n可能原因:\n- 该股票近期没有相关新闻\n- 数据源暂时不可用\n- 股票代码可能不正确\n\n建议:\n- 访问东方财富网等财经网站查看新闻\n- 确认股票代码格式正确"
+                return ToolReport.failure(
+                    f"暂无股票 {symbol} 的新闻数据（近期没有相关新闻或数据源暂时不可用）",
+                    ["访问东方财富网等财经网站查看新闻", "确认股票代码格式正确"]
+                )
             
             # 取最新的 max_news 条
-            recent_news = df.head(max_news).copy()
-            
-            # 格式化输出
-            news_list = []
-            for idx, row in recent_news.iterrows():
-                news_item = f"【{row.get('发布时间', 'N/A')}】{row.get('新闻标题', 'N/A')}\n来源: {row.get('新闻来源', 'N/A')}"
-                news_list.append(news_item)
-            
-            return "\n\n".join(news_list)
+            recent_news = df.head(max_news)
+            rows = [
+                [row.get('发布时间', 'N/A'), row.get('新闻标题', 'N/A'), row.get('新闻来源', 'N/A')]
+                for _, row in recent_news.iterrows()
+            ]
+            return ToolReport().table(['发布时间', '新闻标题', '来源'], rows)
         
         except Exception as e:
             if attempt < max_retries - 1:
                 time.sleep(1)
                 continue
             else:
-                return f"获取股票 {symbol} 新闻失败（已重试{max_retries}次）\n\n错误: {str(e)}\n\n建议:\n- 检查网络连接\n- 访问财经网站手动查看新闻\n- 稍后重试"
+                return ToolReport.failure(
+                    f"获取股票 {symbol} 新闻失败（已重试{max_retries}次）: {str(e)}",
+                    ["检查网络连接", "访问财经网站手动查看新闻", "稍后重试"]
+                )
 
 
 @tool
-def get_stock_technical_indicators(symbol: str) -> str:
+def get_stock_technical_indicators(symbol: str) -> ToolReport:
     """
     计算股票的技术指标（MA5, MA10, MA20 均线, MACD, RSI等）。
     
@@ -156,18 +152,17 @@ def get_stock_technical_indicators(symbol: str) -> str:
         symbol: 股票代码（6位数字）
         
     Returns:
-        包含技术指标的分析文本
+        包含技术指标的分析报告
         
     Example:
         >>> result = get_stock_technical_indicators.invoke({"symbol": "600519"})
     """
     try:
         # 获取历史数据
-        start_date, end_date = get_date_range(90)  # 获取90天数据用于计算指标
-        df = ak.stock_zh_a_hist(symbol=symbol, start_date=start_date, end_date=end_date, adjust="qfq")
+        df = get_stock_hist(symbol, days=90)  # 获取90天数据用于计算指标
         
         if df.empty:
-            return f"无法获取股票 {symbol} 的技术指标数据"
+            return ToolReport.failure(f"无法获取股票 {symbol} 的技术指标数据")
         
         # 计算均线
         df['MA5'] = df['收盘'].rolling(window=5).mean()
@@ -197,87 +192,81 @@ def get_stock_technical_indicators(symbol: str) -> str:
         latest = df.iloc[-1]
         prev = df.iloc[-2]
         
-        result = f"【股票 {symbol} 技术指标分析】\n\n"
+        report = ToolReport(f"股票 {symbol} 技术指标分析")
         
         # 均线系统
-        result += "【均线系统】\n"
-        result += f"当前价格: {latest['收盘']:.2f}元\n"
-        result += f"MA5:  {latest['MA5']:.2f}元\n"
-        result += f"MA10: {latest['MA10']:.2f}元\n"
-        result += f"MA20: {latest['MA20']:.2f}元\n"
-        result += f"MA60: {latest['MA60']:.2f}元\n\n"
+        report.section("均线系统")
+        report.field("当前价格", f"{latest['收盘']:.2f}", "元")
+        report.field("MA5", f"{latest['MA5']:.2f}", "元")
+        report.field("MA10", f"{latest['MA10']:.2f}", "元")
+        report.field("MA20", f"{latest['MA20']:.2f}", "元")
+        report.field("MA60", f"{latest['MA60']:.2f}", "元")
         
         # 均线形态判断
-        result += "【均线形态】\n"
+        report.section("均线形态")
         if latest['MA5'] > latest['MA10'] > latest['MA20']:
-            result += "✓ 多头排列 (短期均线在上，趋势向上)\n"
+            report.text("多头排列 (短期均线在上，趋势向上)", icon="✓")
             ma_signal = "看多"
         elif latest['MA5'] < latest['MA10'] < latest['MA20']:
-            result += "✗ 空头排列 (短期均线在下，趋势向下)\n"
+            report.text("空头排列 (短期均线在下，趋势向下)", icon="✗")
             ma_signal = "看空"
         else:
-            result += "○ 均线纠缠 (方向不明确)\n"
+            report.text("均线纠缠 (方向不明确)", icon="○")
             ma_signal = "观望"
         
         # 价格与均线关系
         if latest['收盘'] > latest['MA5']:
-            result += "• 价格在MA5上方\n"
+            report.text("价格在MA5上方", icon="•")
         else:
-            result += "• 价格在MA5下方\n"
-        
-        result += "\n"
+            report.text("价格在MA5下方", icon="•")
         
         # MACD指标
-        result += "【MACD指标】\n"
-        result += f"DIF:  {latest['DIF']:.3f}\n"
-        result += f"DEA:  {latest['DEA']:.3f}\n"
-        result += f"MACD: {latest['MACD']:.3f}\n\n"
+        report.section("MACD指标")
+        report.field("DIF", f"{latest['DIF']:.3f}")
+        report.field("DEA", f"{latest['DEA']:.3f}")
+        report.field("MACD", f"{latest['MACD']:.3f}")
         
         # MACD信号判断
-        result += "【MACD信号】\n"
+        report.section("MACD信号")
         if latest['DIF'] > latest['DEA'] and prev['DIF'] <= prev['DEA']:
-            result += "🚀 金叉 (DIF上穿DEA，买入信号)\n"
+            report.text("金叉 (DIF上穿DEA，买入信号)", icon="🚀")
             macd_signal = "强烈看多"
         elif latest['DIF'] < latest['DEA'] and prev['DIF'] >= prev['DEA']:
-            result += "⚠️ 死叉 (DIF下穿DEA，卖出信号)\n"
+            report.text("死叉 (DIF下穿DEA，卖出信号)", icon="⚠️")
             macd_signal = "看空"
         elif latest['DIF'] > latest['DEA']:
-            result += "✓ DIF在DEA上方 (多头)\n"
+            report.text("DIF在DEA上方 (多头)", icon="✓")
             macd_signal = "看多"
         else:
-            result += "✗ DIF在DEA下方 (空头)\n"
+            report.text("DIF在DEA下方 (空头)", icon="✗")
             macd_signal = "看空"
         
         if latest['MACD'] > 0:
-            result += "• MACD柱为正 (动能向上)\n"
+            report.text("MACD柱为正 (动能向上)", icon="•")
         else:
-            result += "• MACD柱为负 (动能向下)\n"
-        
-        result += "\n"
+            report.text("MACD柱为负 (动能向下)", icon="•")
         
         # RSI指标
-        result += "【RSI指标 (14日)】\n"
-        result += f"当前RSI: {latest['RSI']:.2f}\n\n"
+        report.section("RSI指标 (14日)")
+        report.field("当前RSI", f"{latest['RSI']:.2f}")
         
         # RSI判断
-        result += "【RSI信号】\n"
+        report.section("RSI信号")
         if latest['RSI'] > 70:
-            result += "⚠️ 超买区域 (RSI>70，可能面临回调)\n"
+            report.text("超买区域 (RSI>70，可能面临回调)", icon="⚠️")
             rsi_signal = "超买警告"
         elif latest['RSI'] > 50:
-            result += "✓ 强势区域 (RSI>50，多方占优)\n"
+            report.text("强势区域 (RSI>50，多方占优)", icon="✓")
             rsi_signal = "偏多"
         elif latest['RSI'] > 30:
-            result += "○ 弱势区域 (RSI<50，空方占优)\n"
+            report.text("弱势区域 (RSI<50，空方占优)", icon="○")
             rsi_signal = "偏空"
         else:
-            result += "💡 超卖区域 (RSI<30，可能存在反弹机会)\n"
+            report.text("超卖区域 (RSI<30，可能存在反弹机会)", icon="💡")
             rsi_signal = "超卖机会"
         
-        result += "\n"
-        
         # 综合技术评分
-        result += "【综合技术信号】\n"
+        report.section("综合技术信号")
         
         signals = {
             '均线': ma_signal,
@@ -286,7 +275,7 @@ def get_stock_technical_indicators(symbol: str) -> str:
         }
         
         for indicator, signal in signals.items():
-            result += f"• {indicator}: {signal}\n"
+            report.field(indicator, signal)
         
         # 简单的评分系统
         score = 0
@@ -297,23 +286,23 @@ def get_stock_technical_indicators(symbol: str) -> str:
         if '多' in rsi_signal or '机会' in rsi_signal:
             score += 2
         
-        result += f"\n技术面评分: {score}/8分\n"
+        report.field("技术面评分", f"{score}/8分")
         
         if score >= 6:
-            result += "综合判断: 技术面看多 📈\n"
+            report.field("综合判断", "技术面看多", icon="📈")
         elif score >= 3:
-            result += "综合判断: 技术面中性 ○\n"
+            report.field("综合判断", "技术面中性", icon="○")
         else:
-            result += "综合判断: 技术面看空 📉\n"
+            report.field("综合判断", "技术面看空", icon="📉")
         
-        return result
+        return report
         
     except Exception as e:
-        return f"技术指标计算失败: {str(e)}"
+        return ToolReport.failure(f"技术指标计算失败: {str(e)}")
 
 
 @tool
-def get_industry_comparison(symbol: str) -> str:
+def get_industry_comparison(symbol: str) -> ToolReport:
     """
     获取股票所属行业的表现对比。
     
@@ -333,27 +322,26 @@ def get_industry_comparison(symbol: str) -> str:
         stock_info = ak.stock_individual_info_em(symbol=symbol)
         
         if stock_info.empty:
-            return "无法获取股票基本信息。"
+            return ToolReport.failure("无法获取股票基本信息。")
         
         # 提取关键信息
         info_dict = dict(zip(stock_info['item'], stock_info['value']))
         
-        result = f"""股票基本信息:
-- 股票名称: {info_dict.get('股票简称', 'N/A')}
-- 所属行业: {info_dict.get('行业', 'N/A')}
-- 总市值: {info_dict.get('总市值', 'N/A')}
-- 流通市值: {info_dict.get('流通市值', 'N/A')}
-- 市盈率: {info_dict.get('市盈率-动态', 'N/A')}
-- 市净率: {info_dict.get('市净率', 'N/A')}
-"""
-        return result
+        report = ToolReport().group("股票基本信息")
+        report.field("股票名称", info_dict.get('股票简称'), indent=1)
+        report.field("所属行业", info_dict.get('行业'), indent=1)
+        report.field("总市值", info_dict.get('总市值'), indent=1)
+        report.field("流通市值", info_dict.get('流通市值'), indent=1)
+        report.field("市盈率", info_dict.get('市盈率-动态'), indent=1)
+        report.field("市净率", info_dict.get('市净率'), indent=1)
+        return report
         
     except Exception as e:
-        return f"获取行业信息失败: {str(e)}"
+        return ToolReport.failure(f"获取行业信息失败: {str(e)}")
 
 
 @tool
-def analyze_stock_comprehensive(symbol: str) -> str:
+def analyze_stock_comprehensive(symbol: str) -> ToolReport:
     """
     综合分析工具：一次性获取股票的历史数据、技术指标、基本面信息。
     这是一个高级工具，适合需要全面了解某只股票时使用。
@@ -369,42 +357,32 @@ def analyze_stock_comprehensive(symbol: str) -> str:
     """
     # print(f"\n[工具调用] 正在进行 {symbol} 的综合分析...")
     
-    results = []
-    results.append("=" * 50)
-    results.append("综合分析报告")
-    results.append("=" * 50)
+    report = ToolReport("综合分析报告")
     
     # 1. 基本信息
     try:
         stock_info = ak.stock_individual_info_em(symbol=symbol)
         info_dict = dict(zip(stock_info['item'], stock_info['value']))
-        results.append(f"\n📊 股票: {info_dict.get('股票简称', symbol)}")
-        results.append(f"行业: {info_dict.get('行业', 'N/A')}")
+        report.field("股票", info_dict.get('股票简称', symbol), icon="📊")
+        report.field("行业", info_dict.get('行业'))
     except:
-        results.append(f"\n📊 股票代码: {symbol}")
+        report.field("股票代码", symbol, icon="📊")
     
     # 2. 最新行情
     try:
-        start_date, end_date = get_date_range(5)
-        df = ak.stock_zh_a_hist(
-            symbol=symbol, 
-            period="daily", 
-            start_date=start_date, 
-            end_date=end_date, 
-            adjust="qfq"
-        )
+        df = get_stock_hist(symbol, days=5)
         if not df.empty:
             latest = df.iloc[-1]
-            results.append(f"\n💰 最新价格: {latest['收盘']:.2f} 元")
-            results.append(f"成交量: {latest['成交量']} 手")
+            report.field("最新价格", f"{latest['收盘']:.2f}", " 元", icon="💰")
+            report.field("成交量", latest['成交量'], " 手")
     except:
         pass
     
-    return "\n".join(results)
+    return report
 
 
 @tool
-def get_northbound_flow(symbol: str) -> str:
+def get_northbound_flow(symbol: str) -> ToolReport:
     """
     获取个股北向资金（沪深股通）近期净买入情况
     北向资金是外资机构的重要风向标，持续净买入为强烈看涨信号
@@ -413,10 +391,9 @@ def get_northbound_flow(symbol: str) -> str:
         symbol: 股票代码（如 '600519'）
     
     Returns:
-        北向资金净流入数据的Markdown格式描述
+        北向资金净流入数据报告
     """
-    results = []
-    results.append(f"=== {symbol} 北向资金（陆股通）动态 ===\n")
+    report = ToolReport(f"{symbol} 北向资金（陆股通）动态")
     
     try:
         # 尝试获取全市场北向资金汇总数据（每日净买入额）
@@ -424,46 +401,43 @@ def get_northbound_flow(symbol: str) -> str:
         if df is not None and not df.empty:
             # 取最近10个交易日
             recent = df.tail(10)
-            results.append("| 日期 | 北向净买入（亿元）| 趋势 |")
-            results.append("|------|-----------------|------|")
+            rows = []
+            vals = []
             for _, row in recent.iterrows():
                 try:
                     val = float(str(row.iloc[1]).replace(',', ''))
-                    trend = "📈 净流入" if val > 0 else "📉 净流出"
-                    results.append(f"| {row.iloc[0]} | {val:.2f} | {trend} |")
                 except Exception:
-                    pass
+                    continue
+                vals.append(val)
+                rows.append([row.iloc[0], f"{val:.2f}", "📈 净流入" if val > 0 else "📉 净流出"])
+            report.table(["日期", "北向净买入（亿元）", "趋势"], rows)
             
             # 统计总趋势
-            try:
-                vals = [float(str(r.iloc[1]).replace(',', '')) 
-                        for _, r in recent.iterrows()]
+            if vals:
                 total = sum(vals)
                 pos_days = sum(1 for v in vals if v > 0)
-                results.append(f"\n近10日汇总:")
-                results.append(f"  合计净流入: {total:.2f} 亿元")
-                results.append(f"  净流入天数: {pos_days}/10 天")
+                report.group("近10日汇总")
+                report.field("合计净流入", f"{total:.2f}", " 亿元", indent=1)
+                report.field("净流入天数", f"{pos_days}/10", " 天", indent=1)
                 if total > 50:
-                    results.append("  ⭐ 北向资金持续大幅净买入——外资看好信号明显")
+                    report.text("北向资金持续大幅净买入——外资看好信号明显", icon="⭐", indent=1)
                 elif total > 0:
-                    results.append("  ✅ 北向资金小幅净买入——外资态度偏积极")
+                    report.text("北向资金小幅净买入——外资态度偏积极", icon="✅", indent=1)
                 elif total > -50:
-                    results.append("  ⚠️ 北向资金小幅净卖出——外资态度偏谨慎")
+                    report.text("北向资金小幅净卖出——外资态度偏谨慎", icon="⚠️", indent=1)
                 else:
-                    results.append("  🚨 北向资金大幅净卖出——外资明显撤离")
-            except Exception:
-                pass
+                    report.text("北向资金大幅净卖出——外资明显撤离", icon="🚨", indent=1)
         else:
-            results.append("北向资金数据暂无，可能为非陆股通标的或数据源限制。")
+            report.text("北向资金数据暂无，可能为非陆股通标的或数据源限制。")
     except Exception as e:
-        results.append(f"获取北向资金数据失败（可能为非陆股通标的）: {str(e)[:80]}")
-        results.append("提示: 北向资金数据仅覆盖沪深股通合资格个股。")
+        report.text(f"获取北向资金数据失败（可能为非陆股通标的）: {str(e)[:80]}")
+        report.note("提示: 北向资金数据仅覆盖沪深股通合资格个股。")
     
-    return "\n".join(results)
+    return report
 
 
 @tool
-def get_dragon_tiger_board(symbol: str) -> str:
+def get_dragon_tiger_board(symbol: str) -> ToolReport:
     """
     获取个股近期龙虎榜登榜情况（游资/机构动向的重要信号）
     龙虎榜反映了主力资金的介入程度，是判断市场关注度的重要参考
@@ -472,52 +446,51 @@ def get_dragon_tiger_board(symbol: str) -> str:
         symbol: 股票代码（如 '600519'）
     
     Returns:
-        龙虎榜登榜情况的Markdown格式描述
+        龙虎榜登榜情况报告
     """
-    results = []
-    results.append(f"=== {symbol} 龙虎榜数据 ===\n")
+    report = ToolReport(f"{symbol} 龙虎榜数据")
     
     try:
         # 获取个股龙虎榜统计（近期登榜情况）
         df = ak.stock_lhb_stock_statistic_em(symbol=symbol, period="近一月")
         if df is not None and not df.empty:
-            results.append(f"📋 近一月龙虎榜上榜次数: {len(df)} 次\n")
-            results.append("| 上榜日期 | 上榜原因 | 净买入（万元）|")
-            results.append("|---------|---------|--------------|")
+            report.field("近一月龙虎榜上榜次数", len(df), " 次", icon="📋")
+            rows = []
             for _, row in df.head(5).iterrows():
                 try:
                     date_val = str(row.get('上榜日期', row.iloc[0]))
                     reason = str(row.get('上榜原因', row.iloc[1] if len(row) > 1 else 'N/A'))[:20]
                     # 净买入金额
                     net_val = str(row.get('净买入', row.iloc[3] if len(row) > 3 else 'N/A'))
-                    results.append(f"| {date_val} | {reason} | {net_val} |")
+                    rows.append([date_val, reason, net_val])
                 except Exception:
                     pass
+            report.table(["上榜日期", "上榜原因", "净买入（万元）"], rows)
             
-            results.append(f"\n龙虎榜解读:")
+            report.group("龙虎榜解读")
             if len(df) >= 3:
-                results.append("  ⚡ 近期多次上榜，主力资金关注度高，短线波动性较大")
-                results.append("  投资启示: 需判断是游资炒作还是机构建仓，结合成交量分析")
+                report.text("近期多次上榜，主力资金关注度高，短线波动性较大", icon="⚡", indent=1)
+                report.note("  投资启示: 需判断是游资炒作还是机构建仓，结合成交量分析")
             elif len(df) >= 1:
-                results.append("  📌 近期有上榜记录，存在主力资金介入迹象")
+                report.text("近期有上榜记录，存在主力资金介入迹象", icon="📌", indent=1)
             else:
-                results.append("  ✅ 近期未上榜，走势相对稳健，无明显游资炒作痕迹")
+                report.text("近期未上榜，走势相对稳健，无明显游资炒作痕迹", icon="✅", indent=1)
         else:
-            results.append("近一月无龙虎榜上榜记录。")
-            results.append("✅ 股价走势相对平稳，未受到游资异常关注。")
+            report.text("近一月无龙虎榜上榜记录。")
+            report.text("股价走势相对平稳，未受到游资异常关注。", icon="✅")
     except Exception as e:
         # 尝试备用接口
         try:
             df2 = ak.stock_lhb_detail_em(symbol=symbol)
             if df2 is not None and not df2.empty:
-                results.append(f"近期龙虎榜记录: {len(df2)} 条")
+                report.field("近期龙虎榜记录", len(df2), " 条")
             else:
-                results.append("近期无龙虎榜记录（数据正常，未受异常关注）。")
+                report.text("近期无龙虎榜记录（数据正常，未受异常关注）。")
         except Exception:
-            results.append(f"龙虎榜数据获取失败: {str(e)[:80]}")
-            results.append("提示: 该股票可能近期没有上榜记录，属于正常情况。")
+            report.text(f"龙虎榜数据获取失败: {str(e)[:80]}")
+            report.note("提示: 该股票可能近期没有上榜记录，属于正常情况。")
     
-    return "\n".join(results)
+    return report
 
 
 # 测试代码
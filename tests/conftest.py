@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 添加仓库根目录到路径以便导入 src / api
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
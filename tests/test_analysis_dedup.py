@@ -0,0 +1,109 @@
+"""/api/analyze 的请求去重与无人观看时取消（流水线使用假的LLM节点）"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import api.main as api_main
+from src.agent.pipeline import AsyncPipelineExecutor, PipelineGraph, PipelineNode
+from src.config import get_settings
+
+
+class FakeSystem:
+    """按顺序经过若干节点的假分析系统，每个节点像辩论一样连续发起多次 LLM 调用"""
+
+    runs = 0
+    llm_calls = 0
+    stages = 4
+    calls_per_stage = 3
+    call_seconds = 0.03
+
+    def __init__(self, **kwargs):
+        pass
+
+    async def arun_pipeline(self, symbol, on_event=None, analyst_team=None, report_id=None,
+                            on_delta=None, on_llm_event=None):
+        FakeSystem.runs += 1
+
+        async def llm_call(inputs):
+            for _ in range(FakeSystem.calls_per_stage):
+                FakeSystem.llm_calls += 1
+                await asyncio.sleep(FakeSystem.call_seconds)
+
+        nodes = [PipelineNode("fundamentals_analyst", func=None, afunc=llm_call, layer=1)]
+        for i in range(1, FakeSystem.stages):
+            nodes.append(PipelineNode(f"stage_{i}", func=None, afunc=llm_call, inputs=[nodes[-1].name], layer=1))
+        await AsyncPipelineExecutor().run(PipelineGraph(nodes), on_event)
+        score = SimpleNamespace(score=6.0)
+        return SimpleNamespace(
+            report_id="r1",
+            analyst_team=SimpleNamespace(fundamentals=score, technical=score, quant=None),
+            researcher_debate=SimpleNamespace(bullish=score, bearish=score, score_diff=0.0),
+            final_decision=SimpleNamespace(
+                recommendation="持有", confidence="中", position_suggestions={},
+                decision=SimpleNamespace(content="")
+            )
+        )
+
+
+@pytest.fixture(autouse=True)
+def fake_system(monkeypatch):
+    FakeSystem.runs = 0
+    FakeSystem.llm_calls = 0
+    monkeypatch.setattr(api_main, "EnhancedMultiAgentSystem", FakeSystem)
+    monkeypatch.setattr(api_main, "_node_event_messages", lambda event, started: [
+        {"type": event.type, "node": event.node}
+    ])
+    monkeypatch.setattr(requests.Session, "get", lambda *args, **kwargs: (_ for _ in ()).throw(OSError("offline")))
+    monkeypatch.setattr(get_settings(), "analysis_abandon_grace", 0.1)
+    api_main._inflight_analyses.clear()
+
+
+def _request():
+    return api_main.AnalyzeRequest(symbol="600519", api_key="test-key")
+
+
+def test_identical_requests_share_one_run_and_replay_history():
+    async def main():
+        first_stream = api_main._shared_analysis(_request())
+        first = [await first_stream.__anext__() for _ in range(4)]
+        # 后加入的请求：先收到"已加入"，再从第一条事件开始回放，之后接收新事件
+        joined, rest = await asyncio.gather(
+            _collect(api_main._shared_analysis(_request())), _collect(first_stream)
+        )
+        return first + rest, joined
+
+    first, joined = asyncio.run(main())
+    assert FakeSystem.runs == 1
+    assert json.loads(joined[0])["step"] == "joined"
+    assert joined[1:] == first
+    assert json.loads(first[-1])["step"] == "complete"
+    assert not api_main._inflight_analyses
+
+
+async def _collect(stream):
+    return [line async for line in stream]
+
+
+def test_last_viewer_leaving_cancels_llm_calls():
+    async def main():
+        stream = api_main._shared_analysis(_request())
+        async for line in stream:
+            if json.loads(line)["type"] == "node_start":
+                break
+        job = next(iter(api_main._inflight_analyses.values()))
+        await stream.aclose()
+        # 等待期（0.1 秒）内无人重新加入：取消
+        await asyncio.sleep(0.15)
+        calls = FakeSystem.llm_calls
+        await asyncio.sleep(FakeSystem.call_seconds * 10)
+        return job, calls
+
+    job, calls = asyncio.run(main())
+    assert job.task.cancelled()
+    assert not api_main._inflight_analyses
+    # 取消后执行中的节点也停止，不再发起新的LLM调用
+    assert FakeSystem.llm_calls == calls < FakeSystem.stages * FakeSystem.calls_per_stage
@@ -0,0 +1,39 @@
+"""分析师结果缓存键区分影响输出的配置"""
+
+import pytest
+
+import src.agent.multi_agent_system_enhanced as mase
+from src.agent.multi_agent_system_enhanced import AgentRole, EnhancedMultiAgentSystem
+
+ROLE = AgentRole.FUNDAMENTALS_ANALYST.value
+
+
+@pytest.fixture(autouse=True)
+def fixed_fingerprint(monkeypatch):
+    monkeypatch.setattr(mase, "analyst_data_fingerprint", lambda symbol: ("2024-06-03", "news"))
+
+
+def _key(**kwargs):
+    config = dict(model="fake", api_key="test-key", base_url="http://localhost")
+    config.update(kwargs)
+    return EnhancedMultiAgentSystem(**config)._analyst_cache_keys("600519")[ROLE]
+
+
+def test_same_configuration_shares_key():
+    assert _key() == _key()
+
+
+@pytest.mark.parametrize("change", [
+    {"base_url": "http://other-provider"},
+    {"temperature": 0.2},
+    {"structured_output": True},
+    {"role_models": {ROLE: {"max_tokens": 256}}},
+])
+def test_output_affecting_settings_change_key(change):
+    assert _key(structured_output=False) != _key(**{"structured_output": False, **change})
+
+
+def test_prompt_budget_changes_key(monkeypatch):
+    before = _key()
+    monkeypatch.setattr(mase.get_settings(), "llm_role_prompt_tokens", f'{{"{ROLE}": 1000}}')
+    assert _key() != before
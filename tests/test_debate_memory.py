@@ -0,0 +1,43 @@
+"""辩论记忆的渲染结果不超过 token 上限"""
+
+import random
+
+from src.agent.debate_memory import DebateState, estimate_tokens, key_points, truncate_to_tokens
+
+_WORDS = ["估值", "营收增长", "毛利率", "北向资金", "放量突破", "PE 35x", "ROE 18%", "MACD", "风险", "政策利好"]
+
+
+def _random_text(rng: random.Random) -> str:
+    """随机生成类似研究员输出的文本：小节标题、编号要点、项目符号、评分和普通段落"""
+    lines = []
+    for _ in range(rng.randint(0, 30)):
+        body = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 40)))
+        lines.append(rng.choice([
+            f"【{rng.choice(['反驳要点', '核心观点', '理由', '结论'])}】",
+            f"{rng.randint(1, 9)}. {body}",
+            f"- {body}",
+            f"评分: {rng.randint(1, 10)}/10",
+            body,
+            "",
+        ]))
+    return "\n".join(lines)
+
+
+def test_rendered_memory_never_exceeds_cap():
+    rng = random.Random(20240603)
+    for _ in range(3000):
+        max_tokens = rng.randint(20, 1000)
+        state = DebateState(_random_text(rng), _random_text(rng), max_tokens)
+        for round_num in range(1, rng.randint(1, 8)):
+            state.record(round_num, _random_text(rng), _random_text(rng))
+        assert estimate_tokens(state.bullish_view()) <= max_tokens
+        assert estimate_tokens(state.bearish_view()) <= max_tokens
+
+
+def test_key_points_and_truncation_respect_cap():
+    rng = random.Random(7)
+    for _ in range(1000):
+        text = _random_text(rng)
+        max_tokens = rng.randint(0, 300)
+        assert estimate_tokens(truncate_to_tokens(text, max_tokens)) <= max_tokens
+        assert estimate_tokens(key_points(text, max_tokens)) <= max_tokens
@@ -0,0 +1,64 @@
+"""LLM 响应缓存在流式调用路径上的读写"""
+
+import asyncio
+import itertools
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from src.agent.llm_cache import LLMResponseCache
+from src.agent.llm_limiter import AdaptiveLimiter
+from src.agent.multi_agent_system_enhanced import AgentRole, EnhancedMultiAgentSystem, _LLMRoute
+
+ANSWER = "基本面稳健 评分 7"
+
+
+class CountingChatModel(GenericFakeChatModel):
+    """记录实际发起的流式请求次数（异步流式默认在线程中调用 _stream）"""
+
+    calls: int = 0
+
+    def _stream(self, *args, **kwargs):
+        self.calls += 1
+        return super()._stream(*args, **kwargs)
+
+
+def _setup(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite"), ttl=3600, max_entries=100)
+    llm = CountingChatModel(messages=itertools.repeat(AIMessage(content=ANSWER)), cache=cache)
+    system = EnhancedMultiAgentSystem(model="fake", api_key="test-key", base_url="http://localhost")
+    deltas = []
+    system._on_delta = lambda role, text: deltas.append(text)
+    route = _LLMRoute("fake", llm, AdaptiveLimiter("test"))
+    prompt = ChatPromptTemplate.from_messages([("system", "你是基本面分析师"), ("human", "分析 600519")])
+    return system, route, prompt, llm, deltas
+
+
+def test_streamed_call_is_served_from_cache_the_second_time(tmp_path):
+    system, route, prompt, llm, deltas = _setup(tmp_path)
+    role = AgentRole.FUNDAMENTALS_ANALYST
+    first = system._attempt_llm(role, prompt, route, lambda: True, lambda: True)
+    assert "".join(deltas) == ANSWER and len(deltas) > 1
+
+    deltas.clear()
+    second = system._attempt_llm(role, prompt, route, lambda: True, lambda: True)
+    assert llm.calls == 1
+    # 命中时整段回答作为一段增量推送
+    assert deltas == [ANSWER]
+    assert first.content == second.content == ANSWER
+
+
+def test_async_streamed_call_is_served_from_cache_the_second_time(tmp_path):
+    system, route, prompt, llm, deltas = _setup(tmp_path)
+    role = AgentRole.FUNDAMENTALS_ANALYST
+
+    async def main():
+        await system._aattempt_llm(role, prompt, route, lambda: True, lambda: True)
+        deltas.clear()
+        return await system._aattempt_llm(role, prompt, route, lambda: True, lambda: True)
+
+    second = asyncio.run(main())
+    assert llm.calls == 1
+    assert deltas == [ANSWER]
+    assert second.content == ANSWER
@@ -0,0 +1,51 @@
+"""hedged_call / ahedged_call 的超时计时与对冲"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.agent.llm_hedging import HedgeLost, ahedged_call, hedged_call
+
+
+def test_queue_wait_does_not_count_against_timeout():
+    def attempt(index, claim, started):
+        time.sleep(0.3)  # 排队等待并发位置
+        if not started():
+            raise HedgeLost()
+        time.sleep(0.05)
+        return index
+
+    assert hedged_call(attempt, timeout=0.2) == 0
+
+
+def test_attempt_granted_after_timeout_is_not_sent():
+    sent = []
+    slot = threading.Event()
+
+    def attempt(index, claim, started):
+        if index == 1:
+            slot.wait()
+        if not started():
+            raise HedgeLost()
+        sent.append(index)
+        time.sleep(0.3)
+        return index
+
+    with pytest.raises(TimeoutError):
+        hedged_call(attempt, timeout=0.1, hedge_delay=0.02)
+    slot.set()
+    time.sleep(0.05)
+    assert sent == [0]
+
+
+def test_async_queue_wait_does_not_count_against_timeout():
+    async def attempt(index, claim, started):
+        await asyncio.sleep(0.3)
+        if not started():
+            raise HedgeLost()
+        await asyncio.sleep(0.05)
+        return index
+
+    assert asyncio.run(ahedged_call(attempt, timeout=0.2)) == 0
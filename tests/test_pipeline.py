@@ -0,0 +1,44 @@
+"""AsyncPipelineExecutor 取消行为"""
+
+import asyncio
+
+import pytest
+
+from src.agent.pipeline import AsyncPipelineExecutor, PipelineGraph, PipelineNode
+
+
+def test_cancel_stops_running_nodes_and_starts_no_new_ones():
+    started = []
+    cancelled = []
+
+    def slow(name):
+        async def afunc(inputs):
+            started.append(name)
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+            return name
+        return afunc
+
+    graph = PipelineGraph([
+        PipelineNode("analyst_a", func=None, afunc=slow("analyst_a"), layer=1),
+        PipelineNode("analyst_b", func=None, afunc=slow("analyst_b"), layer=1),
+        PipelineNode("trader", func=None, afunc=slow("trader"), inputs=["analyst_a", "analyst_b"], layer=3),
+    ])
+    events = []
+
+    async def main():
+        task = asyncio.create_task(AsyncPipelineExecutor().run(graph, events.append))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # run 返回时执行中的节点已全部退出
+        assert sorted(cancelled) == ["analyst_a", "analyst_b"]
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    assert sorted(started) == ["analyst_a", "analyst_b"]
+    assert [e.node for e in events if e.type == "node_start"] == ["analyst_a", "analyst_b"]